@@ -9,6 +9,8 @@ from decimal import Decimal
 
 from orders.models import Order, OrderItem
 from shop.models import Product
+from core.caching import get_cache_metrics, get_view_cache
+from core.db_router import ReplicaReadMixin
 from users.models import CustomUser
 from .serializers import (
     SalesStatsSerializer,
@@ -17,10 +19,10 @@ from .serializers import (
 )
 
 
-class SalesStatsView(APIView):
+class SalesStatsView(ReplicaReadMixin, APIView):
     """
     API endpoint for sales statistics.
-    Requires admin authentication.
+    Requires admin authentication. Reads from a replica when configured.
     """
     permission_classes = [IsAdminUser]
 
@@ -88,10 +90,10 @@ class SalesStatsView(APIView):
         return Response(serializer.data)
 
 
-class ProductPerformanceView(APIView):
+class ProductPerformanceView(ReplicaReadMixin, APIView):
     """
     API endpoint for product performance statistics.
-    Requires admin authentication.
+    Requires admin authentication. Reads from a replica when configured.
     """
     permission_classes = [IsAdminUser]
 
@@ -145,10 +147,10 @@ class ProductPerformanceView(APIView):
         return Response(serializer.data)
 
 
-class UserActivityView(APIView):
+class UserActivityView(ReplicaReadMixin, APIView):
     """
     API endpoint for user activity statistics.
-    Requires admin authentication.
+    Requires admin authentication. Reads from a replica when configured.
     """
     permission_classes = [IsAdminUser]
 
@@ -213,3 +215,21 @@ class UserActivityView(APIView):
 
         serializer = UserActivitySerializer(data)
         return Response(serializer.data)
+
+
+class CacheStatsView(APIView):
+    """
+    API endpoint for view cache statistics.
+    views: hits, stale served, coalesced, ... per cached view (all workers).
+    tiers: local/remote hit ratios of the two-tier cache (answering worker only).
+    Requires admin authentication.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Get cache counters and hit ratios."""
+        view_cache = get_view_cache()
+        return Response({
+            'views': get_cache_metrics(),
+            'tiers': view_cache.get_stats() if hasattr(view_cache, 'get_stats') else None,
+        })
@@ -0,0 +1,297 @@
+"""
+Two-tier cache backend: a bounded in-process LRU in front of another cache.
+
+Hot entries (e.g. the cached catalog views) are served from worker memory
+without a Redis round trip or unpickling. Writes go to both tiers; reads
+fall through to the remote tier on a local miss.
+
+Cross-worker invalidation goes through the remote cache. delete(),
+delete_many() and delete_pattern() append the affected keys (or pattern)
+to a short invalidation log, and every worker drops just those local
+entries when it notices the log grew. Only clear(), a worker too far
+behind the log, or a log entry that already expired empty a whole local
+tier (through a generation counter). Both are polled with one get_many
+at most every GENERATION_CHECK_INTERVAL seconds, which bounds how long a
+worker may serve an invalidated entry.
+
+The remote cache is usually shared with carts, sessions and idempotency
+records, so remote keys are namespaced ('two_tier:<location>:<epoch>:')
+and clear() only drops this namespace: it moves to a new epoch (polled
+with the generation) and deletes the old one's keys when the remote
+cache supports delete_pattern (django-redis); otherwise they expire.
+
+Settings example:
+
+    CACHES['catalog'] = {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'REMOTE_CACHE': 'default',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 30,
+            'GENERATION_CHECK_INTERVAL': 1,
+        },
+    }
+
+Values in the local tier are shared objects, not copies: callers must not
+mutate what get() returns. Hit counters (get_stats) are per process.
+"""
+import fnmatch
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+# Seconds an invalidation log entry is kept; a worker syncing later clears its whole tier
+INVALIDATION_LOG_TIMEOUT = 300
+# Workers further behind the log than this clear their whole tier instead of replaying it
+MAX_INVALIDATION_REPLAY = 100
+
+
+class LocalLRU:
+    """Thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, pattern):
+        with self._lock:
+            for key in [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache(BaseCache):
+    """Cache backend combining a per-process LRU with a shared remote cache."""
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(params)
+        self._remote_alias = options.get('REMOTE_CACHE', 'default')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 30)
+        self._check_interval = options.get('GENERATION_CHECK_INTERVAL', 1)
+        self._generation_key = f"two_tier_generation:{location or 'default'}"
+        self._epoch_key = f"two_tier_epoch:{location or 'default'}"
+        self._log_key = f"two_tier_invalidations:{location or 'default'}"
+        self._key_prefix = f"two_tier:{location or 'default'}"
+        self._epoch = None
+        self._local = LocalLRU(options.get('MAX_ENTRIES', 1000))
+        self._generation = None
+        self._log_position = 0
+        self._checked_at = 0.0
+        self._stats_lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'remote_hits': 0, 'misses': 0}
+
+    @property
+    def remote(self):
+        return caches[self._remote_alias]
+
+    # Local tier bookkeeping
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _local_timeout_for(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _sync_generation(self, force=False):
+        """Apply invalidations made by other workers to the local tier."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self._check_interval:
+            return
+        self._checked_at = now
+        values = self.remote.get_many([self._generation_key, self._epoch_key, self._log_key])
+        generation = values.get(self._generation_key, 0)
+        self._epoch = values.get(self._epoch_key, 0)
+        log_position = values.get(self._log_key, 0)
+        if generation != self._generation:
+            self._local.clear()
+            self._generation = generation
+        elif log_position != self._log_position:
+            self._replay_invalidations(log_position)
+        self._log_position = log_position
+
+    def _log_entry_key(self, position):
+        return f"{self._log_key}:{position}"
+
+    def _replay_invalidations(self, log_position):
+        """Drop the local entries invalidated since the last sync."""
+        missed = range(self._log_position + 1, log_position + 1)
+        entries = {}
+        if 0 < len(missed) <= MAX_INVALIDATION_REPLAY:
+            entries = self.remote.get_many([self._log_entry_key(position) for position in missed])
+        if not missed or len(entries) < len(missed):
+            # Log reset, too far behind, or entries expired (or not written yet)
+            self._local.clear()
+            return
+        for keys, patterns in entries.values():
+            self._drop_local(keys, patterns)
+
+    def _drop_local(self, keys, patterns):
+        for key in keys:
+            self._local.delete(key)
+        for pattern in patterns:
+            self._local.delete_matching(pattern)
+
+    def _log_invalidation(self, keys, patterns):
+        """Append local keys and key patterns to the invalidation log read by other workers."""
+        # add() never resets a counter another worker created meanwhile
+        self.remote.add(self._log_key, 0, None)
+        position = self.remote.incr(self._log_key)
+        self.remote.set(self._log_entry_key(position), (keys, patterns), INVALIDATION_LOG_TIMEOUT)
+        if position == self._log_position + 1:
+            self._log_position = position
+
+    def _remote_key(self, key):
+        """Key of an entry in the remote cache, inside this cache's namespace."""
+        if self._epoch is None:
+            self._sync_generation(force=True)
+        return f"{self._key_prefix}:{self._epoch}:{key}"
+
+    def _bump_generation(self):
+        self._local.clear()
+        try:
+            self._generation = self.remote.incr(self._generation_key)
+        except ValueError:
+            self.remote.set(self._generation_key, 1, None)
+            self._generation = 1
+        self._checked_at = time.monotonic()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def get_stats(self):
+        """
+        Hit counters and ratios for each tier, of this worker process only
+        (other workers keep their own).
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = sum(stats.values())
+        stats['local_hit_ratio'] = round(stats['local_hits'] / total, 4) if total else 0.0
+        stats['remote_hit_ratio'] = round(stats['remote_hits'] / total, 4) if total else 0.0
+        stats['local_entries'] = len(self._local)
+        stats['pid'] = os.getpid()
+        return stats
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        self._sync_generation()
+        local_key = self._local_key(key, version)
+        value = self._local.get(local_key)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+
+        value = self.remote.get(self._remote_key(key), _MISSING, version=version)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('remote_hits')
+        self._local.set(local_key, value, self._local_timeout)
+        return value
+
+    def get_fresh(self, key, default=None, version=None):
+        """Read through to the remote tier and refresh the local copy."""
+        value = self.remote.get(self._remote_key(key), _MISSING, version=version)
+        if value is _MISSING:
+            self._local.delete(self._local_key(key, version))
+            return default
+        self._local.set(self._local_key(key, version), value, self._local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.remote.set(self._remote_key(key), value, timeout=timeout, version=version)
+        self._local.set(self._local_key(key, version), value, self._local_timeout_for(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.remote.add(self._remote_key(key), value, timeout=timeout, version=version)
+        if added:
+            self._local.set(self._local_key(key, version), value, self._local_timeout_for(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.remote.touch(self._remote_key(key), timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters must stay consistent across workers: never cached locally
+        return self.remote.incr(self._remote_key(key), delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def _invalidate(self, keys=(), patterns=()):
+        """Drop local copies here now and on the other workers at their next sync."""
+        keys, patterns = list(keys), list(patterns)
+        self._drop_local(keys, patterns)
+        self._log_invalidation(keys, patterns)
+
+    def delete(self, key, version=None):
+        deleted = self.remote.delete(self._remote_key(key), version=version)
+        self._invalidate(keys=[self._local_key(key, version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.remote.delete_many([self._remote_key(key) for key in keys], version=version)
+        self._invalidate(keys=[self._local_key(key, version) for key in keys])
+
+    def delete_pattern(self, pattern, version=None):
+        """django-redis extension: delete matching remote keys and their local copies."""
+        deleted = self.remote.delete_pattern(self._remote_key(pattern), version=version)
+        self._invalidate(patterns=[self._local_key(pattern, version)])
+        return deleted
+
+    def clear(self):
+        """Drop this cache's entries only, never the rest of the shared remote cache."""
+        old_prefix = self._remote_key('')
+        try:
+            self._epoch = self.remote.incr(self._epoch_key)
+        except ValueError:
+            self.remote.set(self._epoch_key, 1, None)
+            self._epoch = 1
+        self._bump_generation()
+        delete_pattern = getattr(self.remote, 'delete_pattern', None)
+        if delete_pattern is not None:
+            delete_pattern(f"{old_prefix}*")
@@ -0,0 +1,298 @@
+"""
+Response caching for DRF views with cache stampede protection.
+
+Replaces cache_page on hot read endpoints:
+- single-flight: on a miss only the request holding a per-key lock runs the
+  view, concurrent requests wait for its result instead of recomputing it
+- stale-while-revalidate: expired entries are kept for VIEW_CACHE_STALE_TIMEOUT
+  and served to everyone except the request rebuilding them
+- probabilistic early expiration (XFetch): a request may recompute shortly
+  before expiry, with a probability growing with the cost of the view
+- per-view counters (hits, misses, stale served, coalesced, ...), buffered in
+  process memory and added to shared counters in the cache every
+  VIEW_CACHE_METRICS_FLUSH_INTERVAL seconds, so a hit costs no round trip
+
+Entries hold the serialized response data, not the rendered bytes, so one
+entry serves every renderer (JSON, browsable API). They are stored in the
+VIEW_CACHE_ALIAS cache (the two-tier catalog cache); locks and counters
+always live in the shared default cache.
+"""
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import patch_cache_control, patch_response_headers
+from rest_framework.response import Response
+
+logger = logging.getLogger('django')
+
+METRIC_NAMES = (
+    'hits',
+    'misses',
+    'stale_served',
+    'coalesced',
+    'early_recomputes',
+    'recomputes',
+)
+
+# Prefixes of every view decorated with cached_view, for metrics reporting
+_registered_prefixes = set()
+
+# Counts not yet added to the shared counters: {(prefix, name): count}
+_pending_metrics = Counter()
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_view_cache():
+    """Cache holding cached_view entries."""
+    return caches[_setting('VIEW_CACHE_ALIAS', 'default')]
+
+
+def _metric_key(prefix, name):
+    return f"view_cache_metrics:{prefix}:{name}"
+
+
+def incr_metric(prefix, name):
+    """Count an event of a cached view (buffered, see flush_cache_metrics)."""
+    global _last_flush
+    with _pending_lock:
+        _pending_metrics[(prefix, name)] += 1
+        now = time.monotonic()
+        due = now - _last_flush >= _setting('VIEW_CACHE_METRICS_FLUSH_INTERVAL', 10)
+        if due:
+            _last_flush = now
+    if due:
+        flush_cache_metrics()
+
+
+def flush_cache_metrics():
+    """Add the counts buffered by this process to the cache-wide counters."""
+    with _pending_lock:
+        pending = dict(_pending_metrics)
+        _pending_metrics.clear()
+    for (prefix, name), count in pending.items():
+        key = _metric_key(prefix, name)
+        # add() only creates a missing counter, so concurrent flushes never reset it
+        cache.add(key, 0, None)
+        cache.incr(key, count)
+
+
+def get_cache_metrics():
+    """
+    Return {prefix: {metric: count, 'hit_ratio': float}} for every cached view.
+    Counts still buffered by other processes show up at their next flush.
+    """
+    flush_cache_metrics()
+    keys = [
+        _metric_key(prefix, name)
+        for prefix in sorted(_registered_prefixes)
+        for name in METRIC_NAMES
+    ]
+    values = cache.get_many(keys)
+    metrics = {}
+    for prefix in sorted(_registered_prefixes):
+        counters = {name: values.get(_metric_key(prefix, name), 0) for name in METRIC_NAMES}
+        served = counters['hits'] + counters['stale_served'] + counters['coalesced']
+        total = served + counters['misses'] + counters['recomputes'] + counters['early_recomputes']
+        counters['hit_ratio'] = round(served / total, 4) if total else 0.0
+        metrics[prefix] = counters
+    return metrics
+
+
+def reset_cache_metrics():
+    """Clear every counter (used by tests and after deploys)."""
+    with _pending_lock:
+        _pending_metrics.clear()
+    cache.delete_many([
+        _metric_key(prefix, name)
+        for prefix in _registered_prefixes
+        for name in METRIC_NAMES
+    ])
+
+
+def get_cacheable_query_params(view):
+    """
+    Query parameters that can change a view's response: filterset fields,
+    search/ordering parameters, pagination parameters and the optional
+    view.cache_query_params. Anything else (cache busters, tracking tags)
+    is ignored when building the cache key.
+    """
+    names = set(getattr(view, 'cache_query_params', ()))
+    for backend_class in getattr(view, 'filter_backends', ()):
+        backend = backend_class()
+        if hasattr(backend, 'get_filterset_class'):
+            filterset_class = backend.get_filterset_class(view, view.get_queryset())
+            if filterset_class is not None:
+                names.update(filterset_class.base_filters)
+        for attr in ('search_param', 'ordering_param'):
+            if getattr(backend, attr, None):
+                names.add(getattr(backend, attr))
+    paginator = getattr(view, 'paginator', None)
+    for attr in ('page_query_param', 'page_size_query_param'):
+        if getattr(paginator, attr, None):
+            names.add(getattr(paginator, attr))
+    return names
+
+
+def normalize_query_params(query_params, allowed):
+    """
+    Canonical query string: allowed parameters only, blank values and
+    page=1 dropped, keys and values sorted.
+    """
+    items = []
+    for name in sorted(allowed):
+        for value in sorted(query_params.getlist(name)):
+            value = value.strip()
+            if value == '' or (name == 'page' and value == '1'):
+                continue
+            items.append((name, value))
+    return urlencode(items)
+
+
+def make_cache_key(prefix, request, vary_on_headers=(), allowed_params=None):
+    """
+    Cache key for a request: view prefix + path + query + selected headers.
+    With allowed_params, the query string is normalized so equivalent
+    requests share one entry.
+    """
+    if allowed_params is None:
+        parts = [request.get_full_path()]
+    else:
+        parts = [request.path, normalize_query_params(request.GET, allowed_params)]
+    parts.extend(request.META.get(f"HTTP_{header.upper().replace('-', '_')}", '') for header in vary_on_headers)
+    digest = hashlib.md5('\n'.join(parts).encode('utf-8')).hexdigest()
+    return f"view_cache:{prefix}:{digest}"
+
+
+def _should_recompute_early(entry, now, beta):
+    """XFetch: recompute before expiry with probability rising as expiry nears."""
+    return now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['expires']
+
+
+def _wait_for_entry(entry_cache, key, wait_timeout):
+    """Poll for the entry another request is computing."""
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = entry_cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _cached_response(entry, status_label, now):
+    response = Response(entry['data'], status=entry['status'])
+    patch_response_headers(response, cache_timeout=max(0, int(entry['expires'] - now)))
+    response['X-Cache'] = status_label
+    return response
+
+
+def cached_view(prefix, timeout=None, vary_on_headers=(), public=False):
+    """
+    Cache a DRF view method's response data with stampede protection.
+
+    Args:
+        prefix: Name used in cache keys and metrics, e.g. 'product-list'
+        timeout: Freshness lifetime in seconds (default VIEW_CACHE_TIMEOUT)
+        vary_on_headers: Request headers that are part of the cache key
+        public: The response is identical for every user. The key then only
+            uses the path and the normalized cacheable query params (see
+            get_cacheable_query_params), and responses are marked
+            Cache-Control: public.
+
+    Per-user additions must not go into the cached data: a view may define
+    personalize_cached_response(request, response), which is applied to
+    every response (hit or miss) after the shared cache lookup.
+    """
+    _registered_prefixes.add(prefix)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            allowed_params = get_cacheable_query_params(self) if public else None
+            key = make_cache_key(prefix, request, vary_on_headers, allowed_params)
+            response = _get_or_compute(
+                prefix, key, timeout, lambda: view_method(self, request, *args, **kwargs)
+            )
+            if public and response.status_code == 200:
+                patch_cache_control(response, public=True)
+            personalize = getattr(self, 'personalize_cached_response', None)
+            if personalize is not None:
+                response = personalize(request, response)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _get_or_compute(prefix, key, timeout, compute):
+    """Single-flight, stale-while-revalidate lookup of one cache entry."""
+    fresh_timeout = timeout or _setting('VIEW_CACHE_TIMEOUT', 60 * 15)
+    stale_timeout = _setting('VIEW_CACHE_STALE_TIMEOUT', 60 * 5)
+    lock_timeout = _setting('VIEW_CACHE_LOCK_TIMEOUT', 10)
+    beta = _setting('VIEW_CACHE_EARLY_EXPIRATION_BETA', 1.0)
+
+    entry_cache = get_view_cache()
+    lock_key = f"{key}:lock"
+    now = time.time()
+    entry = entry_cache.get(key)
+
+    if entry is not None:
+        if now < entry['expires'] and not _should_recompute_early(entry, now, beta):
+            incr_metric(prefix, 'hits')
+            return _cached_response(entry, 'HIT', now)
+        if not cache.add(lock_key, True, lock_timeout):
+            # Someone else is rebuilding: serve the stale copy meanwhile
+            incr_metric(prefix, 'stale_served')
+            return _cached_response(entry, 'STALE', now)
+        # A local tier may lag behind: another worker may have rebuilt it already
+        latest = getattr(entry_cache, 'get_fresh', entry_cache.get)(key)
+        if latest is not None and now < latest['expires'] and latest['expires'] != entry['expires']:
+            cache.delete(lock_key)
+            incr_metric(prefix, 'hits')
+            return _cached_response(latest, 'HIT', now)
+        incr_metric(prefix, 'recomputes' if now >= entry['expires'] else 'early_recomputes')
+    elif not cache.add(lock_key, True, lock_timeout):
+        entry = _wait_for_entry(entry_cache, key, _setting('VIEW_CACHE_WAIT_TIMEOUT', 5))
+        if entry is not None:
+            incr_metric(prefix, 'coalesced')
+            return _cached_response(entry, 'COALESCED', time.time())
+        # The lock holder is too slow or failed: compute without caching twice
+        incr_metric(prefix, 'misses')
+        return compute()
+    else:
+        incr_metric(prefix, 'misses')
+
+    try:
+        start = time.time()
+        response = compute()
+        finished = time.time()
+        if isinstance(response, Response) and response.status_code == 200:
+            entry_cache.set(key, {
+                'data': response.data,
+                'status': response.status_code,
+                'delta': finished - start,
+                'expires': finished + fresh_timeout,
+            }, fresh_timeout + stale_timeout)
+            patch_response_headers(response, cache_timeout=fresh_timeout)
+            response['X-Cache'] = 'MISS'
+    finally:
+        cache.delete(lock_key)
+    return response
@@ -0,0 +1,140 @@
+"""
+Read-replica database routing.
+
+Writes always go to the primary ('default'). Reads go to the primary too,
+except inside a replica scope opened by ReplicaReadMixin (catalog and
+analytics views) or the use_replica() context manager (admin reporting).
+
+Read-your-writes: after a successful unsafe request, ReplicaPinMiddleware
+pins the client to the primary for REPLICA_PIN_SECONDS with a cookie and,
+for authenticated users, a cache flag (token clients may not keep cookies).
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PREFIX = 'replica'
+PIN_COOKIE_NAME = 'db_pin'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def get_replica_aliases():
+    """Database aliases configured as read replicas."""
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def get_pin_seconds():
+    """How long a client reads from the primary after its own write."""
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def _user_pin_key(user_id):
+    return f"db_pin:user:{user_id}"
+
+
+@contextmanager
+def use_replica():
+    """Send reads issued inside the block to a replica."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def is_pinned_to_primary(request):
+    """Whether the client wrote recently and must read its own writes."""
+    if request.COOKIES.get(PIN_COOKIE_NAME):
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return bool(cache.get(_user_pin_key(user.pk)))
+    return False
+
+
+def pin_to_primary(request, response):
+    """Pin the client that issued a write to the primary for a short time."""
+    seconds = get_pin_seconds()
+    response.set_cookie(PIN_COOKIE_NAME, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(_user_pin_key(user.pk), True, seconds)
+
+
+class ReplicaRouter:
+    """
+    Database router sending opted-in reads to replicas.
+    Listed in settings.DATABASE_ROUTERS.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return DEFAULT_DB_ALIAS
+        replicas = get_replica_aliases()
+        # Reads inside a transaction on the primary must see its uncommitted rows
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    View mixin that routes reads of selected actions to a replica.
+
+    replica_actions: ViewSet actions to route, or None for every safe request.
+    Clients pinned by a recent write keep reading from the primary.
+    """
+
+    replica_actions = None
+
+    def should_use_replica(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or not get_replica_aliases():
+            return False
+        action = getattr(self, 'action', None)
+        if self.replica_actions is not None and action not in self.replica_actions:
+            return False
+        return not is_pinned_to_primary(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.should_use_replica(request):
+            self._replica_token = _use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _use_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Pin clients to the primary right after a successful write."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+            and response.status_code < 400
+            and get_replica_aliases()
+        ):
+            pin_to_primary(request, response)
+        return response
@@ -0,0 +1,138 @@
+"""
+Idempotency-Key support for unsafe API actions.
+
+Clients retrying a POST after a timeout send the same Idempotency-Key
+header. The first request runs normally and its response is stored in the
+default cache (Redis) for IDEMPOTENCY_TTL seconds together with a
+fingerprint of the request; replays get the stored response back without
+running the action again. While the first request is still running, a
+duplicate gets 409 Conflict, and reusing a key for a different request
+gets 422.
+
+Keys are scoped per user and per endpoint. Views can pass
+get_idempotency_key() through to external APIs (e.g. Stripe's
+idempotency_key) so their side effects are deduplicated as well.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Responses that depend on the moment of the request, not on its content
+_NOT_STORED_STATUSES = (
+    status.HTTP_401_UNAUTHORIZED,
+    status.HTTP_403_FORBIDDEN,
+    status.HTTP_409_CONFLICT,
+    status.HTTP_429_TOO_MANY_REQUESTS,
+)
+
+
+def get_idempotency_ttl():
+    """Seconds a stored response can be replayed (settings.IDEMPOTENCY_TTL)."""
+    return getattr(settings, 'IDEMPOTENCY_TTL', 60 * 60 * 24)
+
+
+def request_fingerprint(request):
+    """Hash of the method, path and parsed body of a request."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}\n{request.path}\n{body}".encode('utf-8')).hexdigest()
+
+
+def _storage_key(request, key):
+    user_id = request.user.pk if request.user.is_authenticated else 'anonymous'
+    path = hashlib.md5(request.path.encode('utf-8')).hexdigest()
+    return f"idempotency:{user_id}:{path}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+
+class _IdempotentResponse(Exception):
+    """Short-circuits an action with a stored or conflict response."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class IdempotencyMixin:
+    """
+    View mixin honouring the Idempotency-Key header on selected actions.
+
+    idempotent_actions: ViewSet actions (or lowercase HTTP methods for
+    plain APIViews) where the header is honoured.
+    """
+
+    idempotent_actions = ()
+
+    def get_idempotency_key(self, request):
+        """The client's Idempotency-Key header, if any."""
+        return request.headers.get(IDEMPOTENCY_HEADER) or None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._idempotency = None
+        action = getattr(self, 'action', None) or request.method.lower()
+        key = self.get_idempotency_key(request)
+        if key is None or action not in self.idempotent_actions:
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            raise _IdempotentResponse(Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            ))
+
+        storage_key = _storage_key(request, key)
+        fingerprint = request_fingerprint(request)
+        stored = cache.get(storage_key)
+        if stored is None:
+            lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 30)
+            if cache.add(f"{storage_key}:lock", True, lock_timeout):
+                # Re-check: the first request may have finished in between
+                stored = cache.get(storage_key)
+                if stored is None:
+                    self._idempotency = (storage_key, fingerprint)
+                    return
+                cache.delete(f"{storage_key}:lock")
+            else:
+                raise _IdempotentResponse(Response(
+                    {'error': f'A request with this {IDEMPOTENCY_HEADER} is already in progress'},
+                    status=status.HTTP_409_CONFLICT
+                ))
+
+        if stored['fingerprint'] != fingerprint:
+            raise _IdempotentResponse(Response(
+                {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            ))
+        response = Response(stored['data'], status=stored['status'])
+        response[REPLAYED_HEADER] = 'true'
+        raise _IdempotentResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _IdempotentResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        pending = getattr(self, '_idempotency', None)
+        if pending is not None:
+            self._idempotency = None
+            storage_key, fingerprint = pending
+            try:
+                if (
+                    isinstance(response, Response)
+                    and response.status_code < 500
+                    and response.status_code not in _NOT_STORED_STATUSES
+                ):
+                    cache.set(storage_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, get_idempotency_ttl())
+            finally:
+                cache.delete(f"{storage_key}:lock")
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,35 @@
+"""
+Django management command to create upcoming monthly partitions.
+Usage: python manage.py create_partitions [--months-ahead 3]
+
+Run daily (cron) so inserts never hit a month without a partition. Tables of
+settings.PARTITIONED_TABLES that are not partitioned are skipped; see
+core.partitioning.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.partitioning import ensure_monthly_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the coming months for partitioned tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=getattr(settings, 'PARTITION_MONTHS_AHEAD', 3),
+            help='Months of partitions created in advance'
+        )
+
+    def handle(self, *args, **options):
+        created = 0
+        for table in getattr(settings, 'PARTITIONED_TABLES', []):
+            if not is_partitioned(table):
+                self.stdout.write(f"{table}: not partitioned, skipped")
+                continue
+            names = ensure_monthly_partitions(table, options['months_ahead'])
+            created += len(names)
+            self.stdout.write(f"{table}: {', '.join(names) if names else 'up to date'}")
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {created} partitions'))
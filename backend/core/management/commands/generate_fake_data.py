@@ -12,6 +12,7 @@ from django.db import models
 
 from shop.models import Product
 from orders.models import Order, OrderItem
+from orders.numbering import allocate_order_number
 from payments.models import Payment
 
 User = get_user_model()
@@ -103,7 +104,7 @@ class Command(BaseCommand):
             # Create order
             order = Order.objects.create(
                 user=user,
-                order_number=f'ORD-{timezone.now().timestamp():.0f}-{i}',
+                order_number=allocate_order_number(order_date),
                 status=status,
                 payment_status=payment_status,
                 shipping_address=f'{random.randint(1, 999)} Rue Example',
@@ -0,0 +1,134 @@
+"""
+Pagination with approximate row counts, and cursor pagination.
+
+An exact COUNT(*) over a large table dominates the latency of list pages.
+For unfiltered querysets the planner statistics in pg_class.reltuples are
+used; for filtered ones the row estimate of EXPLAIN. Estimates below
+APPROXIMATE_COUNT_THRESHOLD fall back to an exact COUNT(*), so small
+result sets stay precise.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+logger = logging.getLogger('django')
+
+
+def get_count_threshold():
+    """Estimated row count above which the exact COUNT(*) is skipped."""
+    return getattr(settings, 'APPROXIMATE_COUNT_THRESHOLD', 100000)
+
+
+def _table_estimate(queryset):
+    """Row estimate for a whole table from pg_class statistics."""
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 on tables that have never been vacuumed or analyzed
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _plan_estimate(queryset):
+    """Row estimate for a filtered queryset from the planner."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    """
+    Estimate the number of rows a queryset returns without counting them.
+
+    Returns:
+        int estimate, or None when no estimate is available
+        (non-PostgreSQL backend, sliced queryset, missing statistics).
+    """
+    if not isinstance(queryset, QuerySet):
+        return None
+    if connections[queryset.db].vendor != 'postgresql' or queryset.query.is_sliced:
+        return None
+
+    query = queryset.query
+    try:
+        if not query.where and not query.distinct and not query.combinator:
+            return _table_estimate(queryset)
+        return _plan_estimate(queryset)
+    except DatabaseError:
+        logger.warning("Row estimate failed for %s, using exact count", queryset.model.__name__)
+        return None
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator whose count comes from planner estimates on large querysets.
+    Works as a drop-in replacement in DRF paginations and ModelAdmin.paginator.
+    """
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= get_count_threshold():
+            self.count_is_approximate = True
+            return estimate
+        self.count_is_approximate = False
+        return super().count
+
+
+class ApproximateCountPagination(PageNumberPagination):
+    """
+    Page-number pagination that reports whether the count is an estimate.
+
+    With an approximate count the last pages may be shorter than page_size
+    or empty; clients should rely on `next` rather than on `count`.
+    """
+
+    django_paginator_class = ApproximateCountPaginator
+    page_size_query_param = settings.REST_FRAMEWORK.get('PAGE_SIZE_QUERY_PARAM')
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE')
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_approximate': self.page.paginator.count_is_approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_approximate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Newest-first cursor pagination: no COUNT(*) and no OFFSET, so deep
+    pages cost the same as the first one. Needs an index on
+    (created_at, id) within the filtered rows.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = settings.REST_FRAMEWORK.get('PAGE_SIZE_QUERY_PARAM')
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE')
@@ -0,0 +1,234 @@
+"""
+Monthly time partitioning and archival of append-only tables.
+
+Orders, order items and Stripe webhook events are only ever appended to and
+are queried by created_at ranges. Three tools keep them cheap to scan as
+they grow, while the ORM models stay unchanged:
+
+- BRIN indexes on created_at (migrations orders 0004 and payments 0002): a
+  few pages per table instead of a B-tree the size of the data, effective
+  because rows are inserted in created_at order.
+- Monthly RANGE partitions, for tables converted to PARTITION BY RANGE
+  (created_at) by a DBA: ensure_monthly_partitions() creates the partitions
+  of the coming months ahead of time (manage.py create_partitions).
+- Archival (manage.py archive_orders / archive_webhook_events): a month
+  older than the retention period is exported to a gzipped NDJSON file
+  (a new part file when the month was archived before) and the exported
+  rows are deleted in batches through the ORM, so cascades (items,
+  payments, redemptions) still apply. The emptied partitions of that month
+  are then detached and dropped.
+
+Converting the existing tables is left to a DBA: a partitioned table's
+primary and unique keys must include created_at, which the ORM models
+(single-column id, unique order_number) do not express. Everything here
+works on either layout, and the partition helpers are no-ops on tables
+that are not partitioned (and on databases other than PostgreSQL).
+"""
+import gzip
+import os
+from array import array
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+
+
+def month_start(value):
+    """First instant (local time) of the month of a date or datetime."""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return timezone.make_aware(datetime(value.year, value.month, 1))
+
+
+def add_months(month, count):
+    """month (first day of a month) shifted by count months."""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(table):
+    """Whether a table is a PARTITION BY parent (PostgreSQL only)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_monthly_partitions(table, months_ahead=3, start=None):
+    """
+    Create the monthly partitions of a partitioned table up to months_ahead
+    months from now. Existing partitions are kept; unpartitioned tables are
+    left alone.
+
+    Returns:
+        Names of the partitions that were created
+    """
+    if not is_partitioned(table):
+        return []
+    quote = connection.ops.quote_name
+    month = month_start(start or timezone.now())
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            name = partition_name(table, month)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is None:
+                cursor.execute(
+                    f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} "
+                    f"FOR VALUES FROM (%s) TO (%s)",
+                    [month, add_months(month, 1)]
+                )
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def drop_month_partition(table, month):
+    """
+    Detach and drop the partition of a month once archival emptied it.
+
+    Returns:
+        True if the partition was dropped
+    """
+    if not is_partitioned(table):
+        return False
+    quote = connection.ops.quote_name
+    name = partition_name(table, month)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {quote(name)})")
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+        cursor.execute(f"DROP TABLE {quote(name)}")
+    return True
+
+
+def export_ndjson_gz(rows, path):
+    """
+    Write dicts as gzipped NDJSON, atomically (temporary file + link).
+    An existing file is never replaced.
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        FileExistsError: If path already exists
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    temporary_path = f"{path}.tmp"
+    count = 0
+    try:
+        with gzip.open(temporary_path, 'wt', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(encoder.encode(row) + '\n')
+                count += 1
+        # The rows are deleted right after: make the archive durable first
+        with open(temporary_path, 'rb') as archive:
+            os.fsync(archive.fileno())
+        # Unlike rename, link fails instead of replacing an existing archive
+        os.link(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return count
+
+
+def archive_part_path(path):
+    """
+    path if it does not exist yet, else the first free part file next to
+    it: orders-2024-01.ndjson.gz, orders-2024-01.part-2.ndjson.gz, ...
+
+    Rows of a month can be archived by several runs (a run interrupted
+    while deleting, rows that became archivable later); each run writes
+    its own part so earlier archives are never overwritten.
+    """
+    if not os.path.exists(path):
+        return path
+    directory, name = os.path.split(path)
+    stem, separator, extension = name.partition('.')
+    part = 2
+    while True:
+        candidate = os.path.join(directory, f"{stem}.part-{part}{separator}{extension}")
+        if not os.path.exists(candidate):
+            return candidate
+        part += 1
+
+
+def delete_in_batches(queryset, batch_size=1000):
+    """Delete a queryset by primary key batches (short transactions)."""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        queryset.model._default_manager.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def months_to_archive(oldest, keep_months, now=None):
+    """
+    Months (first instants) from the month of oldest up to, excluding, the
+    oldest month kept.
+    """
+    if oldest is None:
+        return []
+    cutoff = add_months(month_start(now or timezone.now()), -keep_months)
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(queryset, month, path, serialize, tables=(), batch_size=1000, chunk_size=2000):
+    """
+    Export the rows of one month, then delete them and drop the emptied
+    partitions.
+
+    Args:
+        queryset: Rows of the month (already filtered on created_at)
+        month: First instant of the month
+        path: Archive file (.ndjson.gz); a part file next to it is used
+            when it already exists (see archive_part_path)
+        serialize: Callable turning a model instance into a dict
+        tables: Partitioned tables whose partition for the month is dropped
+        batch_size: Rows deleted per DELETE
+        chunk_size: Rows fetched per round trip while exporting
+
+    Returns:
+        Tuple (rows exported, rows deleted, archive file or None); no file
+        is written for an empty month
+    """
+    if not queryset.exists():
+        for table in tables:
+            drop_month_partition(table, month)
+        return 0, 0, None
+    path = archive_part_path(path)
+    # Only rows that made it into the archive are deleted
+    ids = array('q')
+
+    def exported_rows():
+        for instance in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+            ids.append(instance.pk)
+            yield serialize(instance)
+
+    exported = export_ndjson_gz(exported_rows(), path)
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        deleted += delete_in_batches(queryset.filter(pk__in=ids[start:start + batch_size]), batch_size)
+    for table in tables:
+        drop_month_partition(table, month)
+    return exported, deleted, path
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import time
+from datetime import datetime
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from core.cache_backends import TwoTierCache
+from core.caching import cached_view, get_cache_metrics, make_cache_key, reset_cache_metrics
+from core.db_router import (
+    PIN_COOKIE_NAME,
+    ReplicaPinMiddleware,
+    ReplicaRouter,
+    is_pinned_to_primary,
+    use_replica,
+)
+from core.idempotency import IdempotencyMixin
+from core.pagination import ApproximateCountPaginator, estimate_count
+from core.partitioning import add_months, month_start, months_to_archive, partition_name
+from shop.models import Product
+from users.models import CustomUser
+
+
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'catalog': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {'REMOTE_CACHE': 'default', 'GENERATION_CHECK_INTERVAL': 0},
+    },
+}
+
+
+def create_products(count, start_id=1):
+    """Bulk create simple products for pagination tests"""
+    Product.objects.bulk_create([
+        Product(
+            id=start_id + i,
+            product_display_name=f"Product {i}",
+            gender="Men",
+            master_category="Apparel",
+            sub_category="Topwear",
+            article_type="Tshirts",
+            base_colour="Blue",
+            season="Summer",
+            year=2024,
+            usage="Casual",
+            price=10.00
+        )
+        for i in range(count)
+    ])
+
+
+class ApproximateCountPaginatorTestCase(TestCase):
+    """Tests for the approximate count paginator"""
+
+    def setUp(self):
+        create_products(5)
+
+    def test_small_querysets_use_exact_count(self):
+        """Test that estimates below the threshold fall back to COUNT(*)"""
+        with patch('core.pagination.estimate_count', return_value=3):
+            paginator = ApproximateCountPaginator(Product.objects.all(), 2)
+            self.assertEqual(paginator.count, 5)
+            self.assertFalse(paginator.count_is_approximate)
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=1000)
+    def test_large_querysets_use_estimate(self):
+        """Test that estimates above the threshold skip COUNT(*)"""
+        with patch('core.pagination.estimate_count', return_value=250000):
+            paginator = ApproximateCountPaginator(Product.objects.all(), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 250000)
+            self.assertTrue(paginator.count_is_approximate)
+
+    def test_lists_are_not_estimated(self):
+        """Test that plain lists are counted exactly"""
+        self.assertIsNone(estimate_count([1, 2, 3]))
+        self.assertEqual(ApproximateCountPaginator([1, 2, 3], 2).count, 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL planner statistics')
+    def test_filtered_estimate_from_explain(self):
+        """Test that filtered querysets are estimated through EXPLAIN"""
+        estimate = estimate_count(Product.objects.filter(gender='Men'))
+        self.assertIsInstance(estimate, int)
+        self.assertGreaterEqual(estimate, 0)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ApproximateCountPaginationTestCase(TestCase):
+    """Tests for the paginated API response format"""
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['catalog'].clear()
+        self.client = APIClient()
+        create_products(3)
+
+    def test_response_reports_exact_count(self):
+        """Test that small lists report an exact count"""
+        response = self.client.get(reverse('product-list'), {'gender': 'Men'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_is_approximate'])
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=10)
+    def test_response_reports_approximate_count(self):
+        """Test that estimated counts are flagged in the response"""
+        with patch('core.pagination.estimate_count', return_value=120000):
+            response = self.client.get(reverse('product-list'), {'gender': 'Men', 'page': 1})
+        self.assertEqual(response.data['count'], 120000)
+        self.assertTrue(response.data['count_is_approximate'])
+        self.assertEqual(len(response.data['results']), 3)
+
+
+@patch('core.db_router.get_replica_aliases', return_value=['replica1'])
+class ReplicaRouterTestCase(TransactionTestCase):
+    """
+    Tests for read-replica routing and read-your-writes pinning.
+    TransactionTestCase so reads are not wrapped in the test transaction.
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_default_to_primary(self, _aliases):
+        """Test that reads outside a replica scope use the primary"""
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_replica_scope_routes_reads(self, _aliases):
+        """Test that reads inside use_replica() go to a replica"""
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_writes_and_transactions_use_primary(self, _aliases):
+        """Test that writes, and reads inside an open transaction, stay on the primary"""
+        with use_replica():
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_migrations_only_on_primary(self, _aliases):
+        """Test that replicas are never migrated"""
+        self.assertTrue(self.router.allow_migrate('default', 'shop'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'shop'))
+
+    def test_write_pins_client_to_primary(self, _aliases):
+        """Test that a successful write sets the pin cookie and user flag"""
+        from django.http import HttpResponse
+
+        user = CustomUser.objects.create_user(
+            username='pinned', email='pinned@example.com', password='testpass123'
+        )
+        request = self.factory.post('/api/orders/orders/')
+        request.user = user
+        response = ReplicaPinMiddleware(lambda req: HttpResponse(status=201))(request)
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+        follow_up = self.factory.get('/api/orders/orders/my_orders/')
+        follow_up.user = user
+        self.assertTrue(is_pinned_to_primary(follow_up))
+
+    def test_failed_write_does_not_pin(self, _aliases):
+        """Test that rejected writes do not pin the client"""
+        from django.http import HttpResponse
+
+        request = self.factory.post('/api/orders/orders/')
+        response = ReplicaPinMiddleware(lambda req: HttpResponse(status=400))(request)
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+
+class _CountingView:
+    """Minimal view whose method counts how often it really runs"""
+
+    def __init__(self):
+        self.calls = 0
+
+    @cached_view('test-view', timeout=60)
+    def list(self, request):
+        self.calls += 1
+        return Response({'calls': self.calls})
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CachedViewTestCase(TestCase):
+    """Tests for stampede-protected view caching"""
+
+    def setUp(self):
+        from django.core.cache import cache, caches
+
+        # Locks and metrics live in the default cache, which clearing the
+        # catalog cache leaves alone
+        cache.clear()
+        caches['catalog'].clear()
+        reset_cache_metrics()
+        self.view = _CountingView()
+        self.request = APIRequestFactory().get('/test/?page=1')
+
+    def _key(self):
+        return make_cache_key('test-view', self.request)
+
+    def _expire_entry(self):
+        from django.core.cache import caches
+
+        entry = dict(caches['catalog'].get(self._key()), expires=0)
+        caches['catalog'].set(self._key(), entry)
+
+    def test_miss_then_hit(self):
+        """Test that the second request is served from the cache"""
+        first = self.view.list(self.request)
+        second = self.view.list(self.request)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, {'calls': 1})
+        self.assertEqual(self.view.calls, 1)
+
+    def test_stale_served_while_rebuilding(self):
+        """Test that expired entries are served while another request holds the lock"""
+        from django.core.cache import cache
+
+        self.view.list(self.request)
+        self._expire_entry()
+        cache.add(f"{self._key()}:lock", True)
+
+        response = self.view.list(self.request)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(self.view.calls, 1)
+
+    def test_expired_entry_recomputed_by_lock_winner(self):
+        """Test that the request acquiring the lock rebuilds the entry"""
+        from django.core.cache import cache
+
+        self.view.list(self.request)
+        self._expire_entry()
+
+        response = self.view.list(self.request)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.view.calls, 2)
+        self.assertIsNone(cache.get(f"{self._key()}:lock"))
+
+    def test_concurrent_miss_is_coalesced(self):
+        """Test that a cold miss waits for the request already computing the entry"""
+        from django.core.cache import cache
+
+        cache.add(f"{self._key()}:lock", True)
+        entry = {'data': {'calls': 0}, 'status': 200, 'delta': 0.1, 'expires': time.time() + 60}
+        with patch('core.caching._wait_for_entry', return_value=entry):
+            response = self.view.list(self.request)
+        self.assertEqual(response['X-Cache'], 'COALESCED')
+        self.assertEqual(self.view.calls, 0)
+
+    @override_settings(VIEW_CACHE_EARLY_EXPIRATION_BETA=10 ** 9)
+    def test_probabilistic_early_expiration(self):
+        """Test that a large beta recomputes fresh entries early"""
+        self.view.list(self.request)
+        self.view.list(self.request)
+        self.assertEqual(self.view.calls, 2)
+
+    def test_metrics(self):
+        """Test that hits and misses are counted"""
+        self.view.list(self.request)
+        self.view.list(self.request)
+        metrics = get_cache_metrics()['test-view']
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['hits'], 1)
+        self.assertEqual(metrics['hit_ratio'], 0.5)
+
+    @override_settings(VIEW_CACHE_METRICS_FLUSH_INTERVAL=3600)
+    def test_metrics_buffered_in_process(self):
+        """Test that hits are counted in memory and added to the shared counters on flush"""
+        from django.core.cache import cache
+
+        self.view.list(self.request)
+        with patch.object(cache, 'incr', wraps=cache.incr) as incr:
+            for _ in range(5):
+                self.view.list(self.request)
+        incr.assert_not_called()
+
+        self.assertEqual(get_cache_metrics()['test-view']['hits'], 5)
+        self.assertEqual(get_cache_metrics()['test-view']['hits'], 5)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TwoTierCacheTestCase(TestCase):
+    """Tests for the in-process LRU in front of the shared cache"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        params = {'OPTIONS': {'REMOTE_CACHE': 'default', 'MAX_ENTRIES': 2, 'GENERATION_CHECK_INTERVAL': 0}}
+        # Two instances stand in for two worker processes
+        self.worker_a = TwoTierCache('catalog', params)
+        self.worker_b = TwoTierCache('catalog', params)
+
+    def test_local_and_remote_hits(self):
+        """Test that a value written by one worker is read remotely once, then locally"""
+        self.worker_a.set('product', {'id': 1})
+        self.assertEqual(self.worker_b.get('product'), {'id': 1})
+        self.assertEqual(self.worker_b.get('product'), {'id': 1})
+        self.assertIsNone(self.worker_b.get('missing'))
+
+        stats = self.worker_b.get_stats()
+        self.assertEqual(stats['remote_hits'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_local_tier_is_bounded(self):
+        """Test that the least recently used entry is evicted"""
+        for key in ['a', 'b', 'c']:
+            self.worker_a.set(key, key)
+        self.assertEqual(self.worker_a.get_stats()['local_entries'], 2)
+
+    def test_invalidation_reaches_other_workers(self):
+        """Test that a delete on one worker drops the local copy on the others"""
+        self.worker_a.set('product', 'old')
+        self.assertEqual(self.worker_b.get('product'), 'old')
+
+        self.worker_a.delete('product')
+        self.assertIsNone(self.worker_b.get('product'))
+
+    def test_invalidation_keeps_unrelated_local_entries(self):
+        """Test that deletes only drop the affected local copies on other workers"""
+        for key in ['view_cache:product-list:1', 'view_cache:brand-list:1']:
+            self.worker_a.set(key, 'old')
+            self.worker_b.get(key)
+
+        self.worker_a.delete_pattern('view_cache:product-*')
+        self.assertIsNone(self.worker_b.get('view_cache:product-list:1'))
+        self.assertEqual(self.worker_b.get('view_cache:brand-list:1'), 'old')
+        self.assertEqual(self.worker_b.get_stats()['local_hits'], 1)
+
+        self.worker_a.delete('view_cache:brand-list:1')
+        self.assertIsNone(self.worker_b.get('view_cache:brand-list:1'))
+
+    def test_expired_invalidation_log_clears_local_tier(self):
+        """Test that a worker that missed log entries drops its whole local tier"""
+        from django.core.cache import cache
+
+        self.worker_a.set('product', 'old')
+        self.worker_a.set('other', 'old')
+        self.assertEqual(self.worker_b.get('other'), 'old')
+
+        self.worker_a.delete('product')
+        # The log entry expired before worker B synced
+        cache.delete('two_tier_invalidations:catalog:1')
+        self.assertEqual(self.worker_b.get('other'), 'old')
+        self.assertEqual(self.worker_b.get_stats()['remote_hits'], 2)
+        self.assertEqual(self.worker_b.get_stats()['local_hits'], 0)
+
+    def test_clear_keeps_other_remote_entries(self):
+        """Test that clear() drops catalog entries on every worker, not the shared cache"""
+        from django.core.cache import cache
+
+        cache.set('cart:42', {'600': 1})
+        self.worker_a.set('product', 'old')
+        self.assertEqual(self.worker_b.get('product'), 'old')
+
+        self.worker_a.clear()
+        self.assertIsNone(self.worker_a.get('product'))
+        self.assertIsNone(self.worker_b.get('product'))
+        self.assertEqual(cache.get('cart:42'), {'600': 1})
+
+        self.worker_b.set('product', 'new')
+        self.assertEqual(self.worker_a.get('product'), 'new')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PublicCatalogCacheTestCase(TestCase):
+    """Tests for the shared public catalog cache"""
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['catalog'].clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.user = CustomUser.objects.create_user(
+            username='shopper', email='shopper@example.com', password='testpass123'
+        )
+        create_products(3)
+
+    def test_one_entry_shared_by_all_users(self):
+        """Test that anonymous and authenticated users share the same cached page"""
+        first = self.client.get(self.list_url, {'gender': 'Men'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        self.client.force_authenticate(user=self.user)
+        second = self.client.get(self.list_url, {'gender': 'Men'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertIn('public', second['Cache-Control'])
+
+    def test_equivalent_queries_share_an_entry(self):
+        """Test that param order, blank and unknown params and page=1 are normalized"""
+        self.client.get(self.list_url, {'gender': 'Men', 'usage': 'Casual'})
+        response = self.client.get(
+            f"{self.list_url}?usage=Casual&season=&page=1&gender=Men&_=12345"
+        )
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_different_filters_use_different_entries(self):
+        """Test that meaningful params still change the key"""
+        self.client.get(self.list_url, {'gender': 'Men'})
+        response = self.client.get(self.list_url, {'gender': 'Women'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+
+class _IdempotentView(IdempotencyMixin, APIView):
+    """Minimal view counting how often the POST handler really runs"""
+    permission_classes = [AllowAny]
+    idempotent_actions = ('post',)
+    calls = 0
+
+    def post(self, request):
+        type(self).calls += 1
+        return Response({'calls': type(self).calls, 'echo': request.data}, status=201)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class IdempotencyMixinTestCase(TestCase):
+    """Tests for Idempotency-Key handling"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        _IdempotentView.calls = 0
+        self.view = _IdempotentView.as_view()
+        self.factory = APIRequestFactory()
+
+    def _post(self, data, key='key-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.view(self.factory.post('/idempotent/', data, format='json', **headers))
+
+    def test_replay_returns_stored_response(self):
+        """Test that a retried request is answered from the stored response"""
+        first = self._post({'amount': 1})
+        second = self._post({'amount': 1})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(_IdempotentView.calls, 1)
+
+    def test_without_key_every_request_runs(self):
+        """Test that requests without the header are not deduplicated"""
+        self._post({'amount': 1}, key=None)
+        self._post({'amount': 1}, key=None)
+        self.assertEqual(_IdempotentView.calls, 2)
+
+    def test_key_reused_for_different_request(self):
+        """Test that a key cannot be reused with another payload"""
+        self._post({'amount': 1})
+        response = self._post({'amount': 2})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(_IdempotentView.calls, 1)
+
+    def test_concurrent_duplicate_conflicts(self):
+        """Test that a duplicate of a request still running gets 409"""
+        from django.core.cache import cache
+        from core.idempotency import _storage_key
+
+        request = self.factory.post('/idempotent/', {'amount': 1}, format='json')
+        request.user = AnonymousUser()
+        cache.add(f"{_storage_key(request, 'key-1')}:lock", True)
+
+        response = self._post({'amount': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(_IdempotentView.calls, 0)
+
+
+class PartitioningTestCase(TestCase):
+    """Tests for the monthly partition helpers"""
+
+    def test_month_arithmetic(self):
+        """Test month starts, shifts across years and partition names"""
+        month = month_start(timezone.make_aware(datetime(2025, 11, 17, 15, 30)))
+        self.assertEqual(month, timezone.make_aware(datetime(2025, 11, 1)))
+        self.assertEqual(add_months(month, 2), timezone.make_aware(datetime(2026, 1, 1)))
+        self.assertEqual(add_months(month, -11), timezone.make_aware(datetime(2024, 12, 1)))
+        self.assertEqual(partition_name('orders_order', month), 'orders_order_y2025m11')
+
+    def test_months_to_archive(self):
+        """Test every month before the retention window is archived"""
+        now = timezone.make_aware(datetime(2026, 3, 10))
+        oldest = timezone.make_aware(datetime(2025, 12, 31, 23, 0))
+
+        self.assertEqual(
+            months_to_archive(oldest, keep_months=1, now=now),
+            [timezone.make_aware(datetime(2025, 12, 1)), timezone.make_aware(datetime(2026, 1, 1))]
+        )
+        self.assertEqual(months_to_archive(oldest, keep_months=3, now=now), [])
+        self.assertEqual(months_to_archive(None, keep_months=1, now=now), [])
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
     "payments",
     "shop",
     "analytics",
+    "promotions",
+    "outbox",
     
 
 ]
@@ -60,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_router.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
@@ -97,6 +100,24 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma-separated host[:port] list. Catalog and analytics
+# reads are routed there by core.db_router; writes stay on "default".
+# DATABASE_REPLICA_NAME allows a second database on the same local server.
+for index, replica in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(","))):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    DATABASES[f"replica{index + 1}"] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get("DATABASE_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        "HOST": replica_host,
+        "PORT": replica_port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after its own write
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 10))
+
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
@@ -148,13 +169,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.ApproximateCountPagination',
     'PAGE_SIZE': 20,
     'PAGE_SIZE_QUERY_PARAM': 'page_size',
     'MAX_PAGE_SIZE': 100,
     'EXCEPTION_HANDLER': 'core.exceptions.custom_exception_handler',
 }
 
+# Paginated lists and admin changelists switch from COUNT(*) to planner
+# estimates (pg_class.reltuples / EXPLAIN) above this many rows
+APPROXIMATE_COUNT_THRESHOLD = int(os.environ.get('APPROXIMATE_COUNT_THRESHOLD', 100000))
+
 # Stripe Configuration
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
@@ -190,12 +215,20 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
+    'x-cart-id',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+# Response headers readable by the frontend (core.idempotency, orders.cart)
+CORS_EXPOSE_HEADERS = [
+    'idempotent-replayed',
+    'x-cart-id',
+]
+
 # Cache Configuration (Redis)
 CACHES = {
     'default': {
@@ -212,7 +245,19 @@ CACHES = {
         },
         'KEY_PREFIX': 'ecommerce',
         'TIMEOUT': 300,  # Default 5 minutes
-    }
+    },
+    # Per-worker LRU in front of Redis for hot catalog responses
+    'catalog': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'catalog',
+        'OPTIONS': {
+            'REMOTE_CACHE': 'default',
+            'MAX_ENTRIES': int(os.environ.get('CATALOG_LOCAL_CACHE_ENTRIES', 1000)),
+            'LOCAL_TIMEOUT': 30,
+            'GENERATION_CHECK_INTERVAL': 1,  # Max seconds a worker serves invalidated entries
+        },
+        'TIMEOUT': 300,
+    },
 }
 
 # Logging Configuration
@@ -225,3 +270,87 @@ RATELIMIT_VIEW = '100/h'  # Default rate limit
 
 # Payment Configuration
 DEMO_MODE = True  # Set to False in production to use real Stripe payments
+
+# Streaming exports: rows fetched per server-side cursor round trip
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Default tax rate applied to discounted cart lines (orders.pricing), e.g. '0.20'
+ORDER_TAX_RATE = os.environ.get('ORDER_TAX_RATE', '0')
+
+# Tax and discount rules compiled by the pricing engine (format in orders/pricing.py)
+PRICING_RULES = {
+    'tax_rates': {},
+    'category_tax_rates': {},
+    'line_discounts': [],
+    'threshold_discounts': [],
+}
+
+# Server-side carts (orders.cart): Redis hashes expiring after CART_TTL
+# seconds without changes
+CART_TTL = int(os.environ.get('CART_TTL', 60 * 60 * 24 * 30))
+
+# Idempotency-Key handling (core.idempotency): how long responses can be
+# replayed and how long a duplicate waits on a request still running
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 60 * 60 * 24))
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+# Max product IDs per GET /api/shop/products/batch/ request
+PRODUCT_BATCH_MAX_IDS = int(os.environ.get('PRODUCT_BATCH_MAX_IDS', 100))
+
+# Max quantity of one cart or order line (larger requests get a 400, carts are capped)
+ORDER_MAX_LINE_QUANTITY = int(os.environ.get('ORDER_MAX_LINE_QUANTITY', 999))
+# Max distinct products in one cart or order
+ORDER_MAX_LINES = int(os.environ.get('ORDER_MAX_LINES', 100))
+
+# Max orders per POST /api/orders/orders/bulk_transition/ request
+ORDER_BULK_TRANSITION_MAX_IDS = int(os.environ.get('ORDER_BULK_TRANSITION_MAX_IDS', 500))
+
+# Lifetime of a user's cached first page of orders (list, my_orders); writes invalidate it
+ORDER_LIST_CACHE_TIMEOUT = int(os.environ.get('ORDER_LIST_CACHE_TIMEOUT', 300))
+
+# Max orders returned by the support order search (admin and /api/orders/orders/search/)
+ORDER_SEARCH_LIMIT = int(os.environ.get('ORDER_SEARCH_LIMIT', 50))
+
+# Transactional outbox: sinks the relay (manage.py run_outbox_relay) publishes to
+OUTBOX_SINKS = [
+    {
+        'BACKEND': 'outbox.sinks.NDJSONFileSink',
+        'OPTIONS': {'path': os.environ.get('OUTBOX_NDJSON_PATH', os.path.join(BASE_DIR, 'logs', 'changes.ndjson'))},
+    },
+]
+if os.environ.get('OUTBOX_REDIS_STREAM'):
+    OUTBOX_SINKS.append({'BACKEND': 'outbox.sinks.RedisStreamSink', 'OPTIONS': {'stream': os.environ['OUTBOX_REDIS_STREAM']}})
+if os.environ.get('OUTBOX_HTTP_URL'):
+    OUTBOX_SINKS.append({'BACKEND': 'outbox.sinks.HTTPSink', 'OPTIONS': {'url': os.environ['OUTBOX_HTTP_URL']}})
+OUTBOX_RELAY_BATCH_SIZE = 500
+OUTBOX_RELAY_POLL_INTERVAL = 1.0
+# Failed deliveries (of the event alone) before it is dead-lettered; 0 retries forever
+OUTBOX_RELAY_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_RELAY_MAX_ATTEMPTS', 20))
+# Published events are purged after this many days (0 keeps them)
+OUTBOX_RETENTION_DAYS = 7
+
+# Monthly partitions and archival of append-only tables (core.partitioning)
+PARTITIONED_TABLES = ['orders_order', 'orders_orderitem', 'payments_stripewebhookevent']
+PARTITION_MONTHS_AHEAD = 3
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT', os.path.join(BASE_DIR, 'archive'))
+ORDER_ARCHIVE_KEEP_MONTHS = 24
+WEBHOOK_EVENT_ARCHIVE_KEEP_MONTHS = 6
+
+# Cached catalog views (core.caching.cached_view)
+VIEW_CACHE_ALIAS = 'catalog'
+VIEW_CACHE_STALE_TIMEOUT = 60 * 5  # Stale copies served while one request rebuilds
+VIEW_CACHE_LOCK_TIMEOUT = 10  # Max seconds a rebuild holds the per-key lock
+VIEW_CACHE_WAIT_TIMEOUT = 5  # Max seconds a cold miss waits for the rebuilding request
+VIEW_CACHE_EARLY_EXPIRATION_BETA = 1.0  # > 1 favours earlier recomputation
+VIEW_CACHE_METRICS_FLUSH_INTERVAL = 10  # Seconds between flushes of a process's hit/miss counts
+
+# Catalog cache warm-up (python manage.py warm_catalog_cache)
+CATALOG_WARM_HOST = os.environ.get('CATALOG_WARM_HOST', 'localhost:8000')
+CATALOG_WARM_SECURE = os.environ.get('CATALOG_WARM_SECURE', 'False') == 'True'
+CATALOG_WARM_HEADERS = {'HTTP_ACCEPT': 'application/json, text/plain, */*'}
+CATALOG_WARM_URLS = []  # Extra hot URLs, e.g. '/api/shop/products/?usage=Sports'
+CATALOG_WARM_TOP_PRODUCTS = 50
+CATALOG_WARM_WORKERS = 4
+# Re-warm automatically (in a background thread) after catalog writes
+CATALOG_WARM_ON_INVALIDATION = os.environ.get('CATALOG_WARM_ON_INVALIDATION', 'False') == 'True'
+CATALOG_WARM_DELAY = 5  # Seconds; writes within this window share one warm-up
@@ -0,0 +1,129 @@
+"""
+Accounting export: one row per order line, joined with its order and payment.
+
+Rows are read through a server-side cursor in (order created_at, order id,
+item id) order and streamed by core.exports, so memory stays constant
+whatever the date range. Every row carries an opaque `cursor` token; an
+interrupted export restarts with after=<cursor of the last complete row>
+and picks up exactly after it (keyset pagination, no OFFSET).
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.exports import get_chunk_size, streaming_export_response
+
+from .models import OrderItem
+
+ACCOUNTING_FIELDS = [
+    'cursor',
+    'order_id', 'order_number', 'order_created_at', 'order_status', 'payment_status',
+    'user_email', 'shipping_country',
+    'total_amount', 'discount_amount', 'tax_amount', 'final_amount',
+    'item_id', 'product_id', 'product_name', 'quantity', 'price_per_unit', 'total_price',
+    'payment_intent_id', 'payment_amount', 'payment_currency', 'payment_method',
+    'payment_state', 'paid_at',
+]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(created_at, order_id, item_id):
+    """Resume token of a row: '<created_at epoch microseconds>-<order id>-<item id>'."""
+    return f"{(created_at - _EPOCH) // _MICROSECOND}-{order_id}-{item_id}"
+
+
+def decode_cursor(token):
+    """
+    Parse a resume token.
+
+    Returns:
+        Tuple (created_at, order_id, item_id)
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        microseconds, order_id, item_id = (int(part) for part in token.split('-'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid export cursor '{token}'")
+    return _EPOCH + microseconds * _MICROSECOND, order_id, item_id
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def accounting_queryset(date_from=None, date_to=None, after=None):
+    """
+    Order lines of orders created between two dates (both inclusive, local
+    time), in export order, as dicts without the cursor column.
+
+    Args:
+        date_from: First day exported, or None
+        date_to: Last day exported, or None
+        after: Decoded cursor (created_at, order_id, item_id) to resume after
+    """
+    items = OrderItem.objects.all()
+    if date_from:
+        items = items.filter(order__created_at__gte=_day_start(date_from))
+    if date_to:
+        items = items.filter(order__created_at__lt=_day_start(date_to + timedelta(days=1)))
+    if after:
+        created_at, order_id, item_id = after
+        items = items.filter(
+            Q(order__created_at__gt=created_at)
+            | Q(order__created_at=created_at, order_id__gt=order_id)
+            | Q(order__created_at=created_at, order_id=order_id, id__gt=item_id)
+        )
+    return items.order_by('order__created_at', 'order_id', 'id').values(
+        'order_id', 'product_id', 'product_name', 'quantity', 'price_per_unit', 'total_price',
+        item_id=F('id'),
+        order_number=F('order__order_number'),
+        order_created_at=F('order__created_at'),
+        order_status=F('order__status'),
+        payment_status=F('order__payment_status'),
+        user_email=F('order__user__email'),
+        shipping_country=F('order__shipping_country'),
+        total_amount=F('order__total_amount'),
+        discount_amount=F('order__discount_amount'),
+        tax_amount=F('order__tax_amount'),
+        final_amount=F('order__final_amount'),
+        payment_intent_id=F('order__payment__stripe_payment_intent_id'),
+        payment_amount=F('order__payment__amount'),
+        payment_currency=F('order__payment__currency'),
+        payment_method=F('order__payment__payment_method'),
+        payment_state=F('order__payment__status'),
+        paid_at=F('order__payment__paid_at'),
+    )
+
+
+def iter_accounting_rows(date_from=None, date_to=None, after=None, chunk_size=None):
+    """Stream accounting rows (with their cursor) through a server-side cursor."""
+    rows = accounting_queryset(date_from, date_to, after).iterator(
+        chunk_size=chunk_size or get_chunk_size()
+    )
+    for row in rows:
+        row['cursor'] = encode_cursor(row['order_created_at'], row['order_id'], row['item_id'])
+        yield row
+
+
+def accounting_export_response(date_from=None, date_to=None, after=None, export_format='csv', compress=False):
+    """
+    StreamingHttpResponse of the accounting export.
+
+    Raises:
+        ValueError: If export_format is not supported
+    """
+    filename = '_'.join(
+        ['accounting'] + [day.isoformat() for day in (date_from, date_to) if day]
+    )
+    return streaming_export_response(
+        iter_accounting_rows(date_from, date_to, after),
+        ACCOUNTING_FIELDS,
+        filename,
+        export_format=export_format,
+        compress=compress
+    )
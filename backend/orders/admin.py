@@ -1,13 +1,23 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest
+from django.urls import path
+from core.pagination import ApproximateCountPaginator
+from .accounting import accounting_export_response
 from .models import Order, OrderItem
+from .search import search_orders
+from .serializers import OrderExportSerializer
+from .transitions import UPDATED, bulk_transition
 
 
 class OrderItemInline(admin.TabularInline):
     """Inline admin for OrderItems within Order admin"""
     model = OrderItem
     extra = 0
-    readonly_fields = ['total_price', 'created_at']
-    fields = ['product', 'quantity', 'price_per_unit', 'total_price']
+    readonly_fields = ['product_name', 'total_price', 'created_at']
+    fields = ['product', 'product_name', 'quantity', 'price_per_unit', 'total_price']
+    raw_id_fields = ['product']
 
 
 @admin.register(Order)
@@ -16,8 +26,15 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user', 'status', 'payment_status', 'final_amount', 'created_at']
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_number', 'user__username', 'user__email']
-    readonly_fields = ['order_number', 'total_amount', 'final_amount', 'created_at', 'updated_at', 'shipped_at', 'delivered_at']
+    # States only change through the transition actions (compare-and-set, outbox event)
+    readonly_fields = [
+        'order_number', 'status', 'payment_status', 'total_amount', 'final_amount',
+        'created_at', 'updated_at', 'shipped_at', 'delivered_at'
+    ]
     ordering = ['-created_at']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['mark_confirmed', 'mark_shipped', 'mark_delivered', 'mark_cancelled']
     
     fieldsets = (
         ('Order Information', {
@@ -35,13 +52,76 @@ class OrderAdmin(admin.ModelAdmin):
     )
     
     inlines = [OrderItemInline]
+    
+    def _transition(self, request, queryset, target):
+        results = bulk_transition(list(queryset.values_list('id', flat=True)), target)
+        updated = sum(1 for _, outcome, _ in results if outcome == UPDATED)
+        self.message_user(request, f'{updated} of {len(results)} orders marked as {target}.')
+    
+    @admin.action(description='Mark as confirmed')
+    def mark_confirmed(self, request, queryset):
+        self._transition(request, queryset, 'confirmed')
+    
+    @admin.action(description='Mark as shipped')
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, 'shipped')
+    
+    @admin.action(description='Mark as delivered')
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, 'delivered')
+    
+    @admin.action(description='Cancel (pending orders only)')
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, 'cancelled')
+    
+    def get_urls(self):
+        """Add the accounting export next to the changelist"""
+        urls = [
+            path(
+                'accounting-export/',
+                self.admin_site.admin_view(self.accounting_export_view),
+                name='orders_order_accounting_export'
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def accounting_export_view(self, request):
+        """
+        Stream the accounting export (same query parameters as
+        /api/orders/orders/export/: date_from, date_to, export_format, gzip, after).
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        serializer = OrderExportSerializer(data=request.GET)
+        if not serializer.is_valid():
+            return HttpResponseBadRequest(str(serializer.errors))
+        params = serializer.validated_data
+        return accounting_export_response(
+            params.get('date_from'),
+            params.get('date_to'),
+            params.get('after'),
+            export_format=params['export_format'],
+            compress=params['gzip']
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through the indexed lookup of orders/search.py instead of
+        ORed ILIKE '%term%' over the joined user table.
+        """
+        if not search_term.strip():
+            return queryset, False
+        orders, _ = search_orders(search_term, getattr(settings, 'ORDER_SEARCH_LIMIT', 50))
+        return queryset.filter(id__in=[order.id for order in orders]), False
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     """Admin interface for OrderItem management"""
-    list_display = ['order', 'product', 'quantity', 'price_per_unit', 'total_price']
+    list_display = ['order', 'product_name', 'quantity', 'price_per_unit', 'total_price']
     list_filter = ['order__status', 'created_at']
-    search_fields = ['order__order_number', 'product__product_display_name']
-    readonly_fields = ['total_price', 'created_at', 'updated_at']
+    search_fields = ['order__order_number', 'product_name']
+    readonly_fields = ['product_name', 'product_image', 'product_article_type', 'total_price', 'created_at', 'updated_at']
+    list_select_related = ['order__user']
+    raw_id_fields = ['order', 'product']
     ordering = ['-created_at']
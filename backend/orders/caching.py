@@ -0,0 +1,50 @@
+"""
+Per-user cache of the first page of order lists (list and my_orders).
+
+Entries are keyed by a per-user version counter kept in the shared cache.
+Writes to a user's orders bump it after their transaction commits, so
+readers switch to a new key and never re-cache data read before the
+commit; entries of old versions simply expire.
+
+Writes made through the ORM are caught by the Order/OrderItem signals
+(orders/models.py). Bulk paths that bypass signals (UPDATE in
+orders.transitions, bulk_update in orders.services) call
+invalidate_order_lists themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(user_id):
+    return f"orders:list_version:{user_id}"
+
+
+def get_cache_timeout():
+    """Lifetime of a cached first page (settings.ORDER_LIST_CACHE_TIMEOUT)."""
+    return getattr(settings, 'ORDER_LIST_CACHE_TIMEOUT', 300)
+
+
+def get_order_list_version(user_id):
+    return cache.get(_version_key(user_id), 0)
+
+
+def first_page_cache_key(user_id, action, page_size):
+    """Cache key of a user's first page for one view action and page size."""
+    return f"orders:first_page:{user_id}:v{get_order_list_version(user_id)}:{action}:{page_size}"
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        key = _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def invalidate_order_lists(user_ids):
+    """Drop the cached first pages of these users once the transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
@@ -0,0 +1,183 @@
+"""
+Server-side shopping carts stored in Redis.
+
+Each cart is a Redis hash (product_id -> quantity) keyed by user id or, for
+anonymous visitors, by a random cart id the client sends back in the
+X-Cart-Id header. Line updates are single hash commands, every write
+refreshes the CART_TTL expiry, and at login the anonymous cart is merged
+into the user's cart atomically by a Lua script. Adds and merges cap each
+line at ORDER_MAX_LINE_QUANTITY and a cart at ORDER_MAX_LINES distinct
+products, so a cart always stays priceable.
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .pricing import get_max_line_quantity, get_max_lines
+
+CART_ID_HEADER = 'X-Cart-Id'
+_CART_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Adds ARGV[2] to line ARGV[1] of KEYS[1], capped at ARGV[3], refreshes
+# the TTL (ARGV[4]) and returns the new quantity; -1 if the line is new
+# and the cart already has ARGV[5] lines
+_ADD_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 and redis.call('HLEN', KEYS[1]) >= tonumber(ARGV[5]) then
+    return -1
+end
+local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if quantity > tonumber(ARGV[3]) then
+    quantity = tonumber(ARGV[3])
+    redis.call('HSET', KEYS[1], ARGV[1], quantity)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return quantity
+"""
+
+# Sets line ARGV[1] of KEYS[1] to ARGV[2], refreshes the TTL (ARGV[3]);
+# returns -1 instead if the line is new and the cart already has ARGV[4] lines
+_SET_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 and redis.call('HLEN', KEYS[1]) >= tonumber(ARGV[4]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return tonumber(ARGV[2])
+"""
+
+# Adds every line of KEYS[1] to KEYS[2] (capped at ARGV[2] units and ARGV[3]
+# lines), deletes KEYS[1], refreshes the TTL (ARGV[1]), returns the lines merged
+_MERGE_SCRIPT = """
+local lines = redis.call('HGETALL', KEYS[1])
+local max_quantity = tonumber(ARGV[2])
+local max_lines = tonumber(ARGV[3])
+local merged = 0
+for i = 1, #lines, 2 do
+    if redis.call('HEXISTS', KEYS[2], lines[i]) == 1 or redis.call('HLEN', KEYS[2]) < max_lines then
+        if redis.call('HINCRBY', KEYS[2], lines[i], lines[i + 1]) > max_quantity then
+            redis.call('HSET', KEYS[2], lines[i], max_quantity)
+        end
+        merged = merged + 1
+    end
+end
+redis.call('DEL', KEYS[1])
+if merged > 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+return merged
+"""
+
+# Deletes each line ARGV[i] of KEYS[1] whose quantity is still ARGV[i + 1]
+_REMOVE_ORDERED_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+"""
+
+
+class CartFullError(ValueError):
+    """A new line would exceed ORDER_MAX_LINES."""
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def get_cart_ttl():
+    """Seconds a cart survives without any change (settings.CART_TTL)."""
+    return getattr(settings, 'CART_TTL', 60 * 60 * 24 * 30)
+
+
+def _key_prefix():
+    return getattr(settings, 'CART_KEY_PREFIX', 'cart')
+
+
+def user_cart_key(user_id):
+    return f"{_key_prefix()}:user:{user_id}"
+
+
+def anonymous_cart_key(cart_id):
+    return f"{_key_prefix()}:anon:{cart_id}"
+
+
+def new_cart_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_cart_id(cart_id):
+    return bool(cart_id) and bool(_CART_ID_RE.match(cart_id))
+
+
+def get_cart(key):
+    """Return the cart lines as {product_id: quantity}."""
+    lines = _redis().hgetall(key)
+    # Lines written before the cap existed are capped on read
+    max_quantity = get_max_line_quantity()
+    return {int(product_id): min(int(quantity), max_quantity) for product_id, quantity in lines.items()}
+
+
+def _cart_full():
+    return CartFullError(f"A cart holds at most {get_max_lines()} products")
+
+
+def add_line(key, product_id, quantity):
+    """
+    Add quantity to a line (creating it) and return the new, capped quantity.
+
+    Raises:
+        CartFullError: If the line is new and the cart is full
+    """
+    new_quantity = _redis().eval(
+        _ADD_SCRIPT, 1, key, product_id, quantity, get_max_line_quantity(), get_cart_ttl(), get_max_lines()
+    )
+    if new_quantity < 0:
+        raise _cart_full()
+    return new_quantity
+
+
+def set_line(key, product_id, quantity):
+    """
+    Set a line's quantity; 0 removes the line.
+
+    Raises:
+        CartFullError: If the line is new and the cart is full
+    """
+    if quantity <= 0:
+        remove_lines(key, [product_id])
+        return
+    if _redis().eval(_SET_SCRIPT, 1, key, product_id, quantity, get_cart_ttl(), get_max_lines()) < 0:
+        raise _cart_full()
+
+
+def remove_lines(key, product_ids):
+    if product_ids:
+        _redis().hdel(key, *product_ids)
+
+
+def clear_cart(key):
+    _redis().delete(key)
+
+
+def remove_ordered_lines(key, lines):
+    """
+    Remove the lines of an order placed from the cart ({product_id: quantity}
+    as read at checkout). Lines added or changed since then are kept.
+    """
+    if lines:
+        args = [value for product_id, quantity in lines.items() for value in (product_id, quantity)]
+        _redis().eval(_REMOVE_ORDERED_SCRIPT, 1, key, *args)
+
+
+def merge_carts(source_key, target_key):
+    """
+    Move every line of source_key into target_key (quantities are added,
+    up to ORDER_MAX_LINE_QUANTITY) in one atomic step. New lines beyond
+    ORDER_MAX_LINES are dropped. Returns the number of merged lines.
+    """
+    return _redis().eval(
+        _MERGE_SCRIPT, 2, source_key, target_key, get_cart_ttl(), get_max_line_quantity(), get_max_lines()
+    )
@@ -0,0 +1,122 @@
+"""
+Django management command to benchmark order number allocation under
+concurrent inserts.
+Usage: python manage.py benchmark_order_numbers [--threads 8] [--orders 2000] [--scheme both]
+
+Each thread inserts orders one transaction at a time, like checkout does,
+with either the sequence-backed allocator or the former random hex
+numbers. Benchmark orders are deleted at the end.
+"""
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection, transaction
+
+from orders.models import Order
+from orders.numbering import allocate_order_number
+
+BENCHMARK_USERNAME = 'order-number-benchmark'
+
+SCHEMES = {
+    'sequence': lambda: allocate_order_number(),
+    'uuid': lambda: f"ORD-{uuid.uuid4().hex[:8].upper()}",
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order number allocation with concurrent order inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writers')
+        parser.add_argument('--orders', type=int, default=2000, help='Orders inserted per scheme')
+        parser.add_argument(
+            '--scheme',
+            choices=['sequence', 'uuid', 'both'],
+            default='both',
+            help='Allocator to benchmark (uuid is the former random scheme)'
+        )
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCHMARK_USERNAME,
+            defaults={'email': f'{BENCHMARK_USERNAME}@example.com'}
+        )
+        schemes = ['sequence', 'uuid'] if options['scheme'] == 'both' else [options['scheme']]
+
+        try:
+            for scheme in schemes:
+                self._run(scheme, user, options['threads'], options['orders'])
+        finally:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+
+    def _run(self, scheme, user, threads, orders):
+        allocate = SCHEMES[scheme]
+        per_thread = max(1, orders // max(1, threads))
+
+        def worker(_):
+            latencies, numbers, collisions = [], [], 0
+            try:
+                for _ in range(per_thread):
+                    start = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            order = Order.objects.create(
+                                user=user,
+                                order_number=allocate(),
+                                shipping_address='1 Benchmark Street',
+                                shipping_city='Paris',
+                                shipping_postal_code='75001',
+                                shipping_country='France',
+                            )
+                        numbers.append(order.order_number)
+                    except IntegrityError:
+                        collisions += 1
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                # Each worker thread opens its own database connection
+                connection.close()
+            return latencies, numbers, collisions
+
+        index_size_before = self._order_number_index_size()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            results = list(executor.map(worker, range(max(1, threads))))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for result in results for latency in result[0]]
+        numbers = [number for result in results for number in result[1]]
+        collisions = sum(result[2] for result in results)
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        self.stdout.write(
+            f"{scheme:>8}: {len(numbers)} orders in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:.0f}/s), "
+            f"p50 {statistics.median(latencies) * 1000 if latencies else 0:.2f} ms, "
+            f"p99 {p99 * 1000:.2f} ms, "
+            f"collisions {collisions}, duplicates {len(numbers) - len(set(numbers))}"
+        )
+        if index_size_before is not None:
+            growth = self._order_number_index_size() - index_size_before
+            self.stdout.write(f"{'':>8}  order_number index growth: {growth / 1024:.0f} kB")
+        Order.objects.filter(user=user).delete()
+
+    def _order_number_index_size(self):
+        """Size of the order_number unique index (PostgreSQL only)."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT pg_relation_size(indexrelid)
+                FROM pg_index
+                JOIN pg_attribute ON attrelid = indrelid AND attnum = ANY(indkey)
+                WHERE indrelid = %s::regclass AND attname = 'order_number'
+                LIMIT 1
+            """, [Order._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,86 @@
+"""
+Django management command to benchmark the pricing engine.
+Usage: python manage.py benchmark_pricing [--iterations 2000] [--lines 1 --lines 100]
+
+Prices in-memory carts (no database access) against a rule set with
+country taxes, category taxes, line and threshold discounts.
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from orders.pricing import PricingEngine
+from shop.models import Product
+
+BENCHMARK_RULES = {
+    'tax_rates': {'*': '0.20', 'Germany': '0.19'},
+    'category_tax_rates': {'France': {'Personal Care': '0.055'}},
+    'line_discounts': [
+        {'field': 'master_category', 'value': 'Footwear', 'rate': '0.10'},
+        {'field': 'article_type', 'value': 'Watches', 'rate': '0.15'},
+    ] + [
+        {'field': 'product', 'value': product_id, 'rate': '0.05'}
+        for product_id in range(0, 10000, 7)
+    ],
+    'threshold_discounts': [
+        {'min_subtotal': '100.00', 'rate': '0.05'},
+        {'min_subtotal': '250.00', 'rate': '0.10'},
+    ],
+}
+
+CATEGORIES = [
+    ('Apparel', 'Topwear', 'Tshirts'),
+    ('Footwear', 'Shoes', 'Casual Shoes'),
+    ('Accessories', 'Watches', 'Watches'),
+    ('Personal Care', 'Fragrance', 'Perfume and Body Mist'),
+]
+
+
+def build_cart(size):
+    """Unsaved products spread over categories, with quantities 1-3."""
+    lines = []
+    for index in range(size):
+        master, sub, article_type = CATEGORIES[index % len(CATEGORIES)]
+        product = Product(
+            id=index,
+            product_display_name=f"Product {index}",
+            master_category=master,
+            sub_category=sub,
+            article_type=article_type,
+            price=Decimal('9.99') + index,
+        )
+        lines.append((product.price, index % 3 + 1, product))
+    return lines
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cart pricing for small and large carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Carts priced per size')
+        parser.add_argument(
+            '--lines',
+            type=int,
+            action='append',
+            default=None,
+            help='Cart size to benchmark (repeatable, default: 1 and 100)'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        engine = PricingEngine(BENCHMARK_RULES)
+        self.stdout.write(f"Rules compiled in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        iterations = max(1, options['iterations'])
+        for size in options['lines'] or [1, 100]:
+            cart = build_cart(size)
+            engine.price(cart, 'France')  # warm-up
+            start = time.perf_counter()
+            for _ in range(iterations):
+                engine.price(cart, 'France')
+            per_cart = (time.perf_counter() - start) / iterations
+            self.stdout.write(
+                f"{size:>4} lines: {per_cart * 1e6:8.1f} µs/cart, "
+                f"{per_cart * 1e6 / size:6.2f} µs/line, {1 / per_cart:8.0f} carts/s"
+            )
@@ -0,0 +1,26 @@
+"""
+Django management command to re-apply the pricing rules to open orders.
+Usage: python manage.py reprice_orders [--status pending] [--status confirmed]
+"""
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.services import reprice_orders
+
+
+class Command(BaseCommand):
+    help = 'Recompute discounts, taxes and totals of unpaid orders with the current pricing rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            action='append',
+            default=None,
+            help='Order status to reprice (repeatable, default: pending)'
+        )
+
+    def handle(self, *args, **options):
+        statuses = options['status'] or ['pending']
+        orders = Order.objects.filter(status__in=statuses, payment_status='pending')
+        updated = reprice_orders(orders)
+        self.stdout.write(self.style.SUCCESS(f'✓ Repriced {updated} orders'))
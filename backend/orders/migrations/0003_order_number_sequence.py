@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Same values as orders.numbering.SEQUENCE_NAME / BLOCK_SIZE
+SEQUENCE_NAME = 'orders_order_number_seq'
+BLOCK_SIZE = 50
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Existing order numbers use other formats: the counter can start at 1
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME} INCREMENT BY {BLOCK_SIZE}")
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_alter_order_id_alter_orderitem_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
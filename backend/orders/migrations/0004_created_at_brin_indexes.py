@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+# Rows are appended in created_at order: BRIN summaries stay tight
+BRIN_INDEXES = [
+    ('orders_order_created_brin', 'orders_order'),
+    ('orders_orderitem_created_brin', 'orders_orderitem'),
+]
+
+
+def create_month_partitions(schema_editor, table, months_ahead=3):
+    """
+    Frozen copy of core.partitioning.ensure_monthly_partitions(): create the
+    monthly partitions up to months_ahead months from now. No-op unless the
+    table was converted to PARTITION BY RANGE (created_at).
+    """
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+        )
+        if cursor.fetchone() is None:
+            return
+        now = timezone.localtime()
+        month = timezone.make_aware(datetime(now.year, now.month, 1))
+        for _ in range(months_ahead + 1):
+            index = month.year * 12 + month.month
+            next_month = month.replace(year=index // 12, month=index % 12 + 1)
+            name = f"{table}_y{month.year:04d}m{month.month:02d}"
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is None:
+                cursor.execute(
+                    f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} "
+                    f"FOR VALUES FROM (%s) TO (%s)",
+                    [month, next_month]
+                )
+            month = next_month
+
+
+def create_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in BRIN_INDEXES:
+        # CONCURRENTLY: no write lock on tables that may already be large
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+            f"USING brin (created_at) WITH (pages_per_range = 32)"
+        )
+        # No-op unless the table was converted to PARTITION BY RANGE (created_at)
+        create_month_partitions(schema_editor, table, months_ahead=3)
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in BRIN_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('orders', '0003_order_number_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
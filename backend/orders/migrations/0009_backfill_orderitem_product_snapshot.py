@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 10000
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('shop', 'Product')
+    product = Product.objects.filter(id=OuterRef('product_id'))
+    last_id = OrderItem.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    # One UPDATE per id range: short transactions on large tables
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        OrderItem.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE, product__isnull=False, product_name=''
+        ).update(
+            product_name=Subquery(product.values('product_display_name')[:1]),
+            # Products without an image store NULL
+            product_image=Coalesce(Subquery(product.values('image')[:1]), Value('')),
+            product_article_type=Subquery(product.values('article_type')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('orders', '0008_orderitem_product_snapshot'),
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_snapshot, migrations.RunPython.noop),
+    ]
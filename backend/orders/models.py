@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from users.models import CustomUser
 from shop.models import Product
+from .caching import invalidate_order_lists
+from .pricing import compute_final_amount
 
 
 class Order(models.Model):
@@ -52,25 +56,45 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # Keyset order of the accounting export (orders/accounting.py)
+            models.Index(fields=['created_at', 'id'], name='orders_created_id_idx'),
+            # Cursor pages of a user's orders (list, my_orders)
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.order_number} - {self.user.username}"
     
     def calculate_final_amount(self):
         """Calculate final amount: total - discount + tax"""
-        from decimal import Decimal
-        self.final_amount = Decimal(str(self.total_amount)) - Decimal(str(self.discount_amount)) + Decimal(str(self.tax_amount))
+        self.final_amount = compute_final_amount(self.total_amount, self.discount_amount, self.tax_amount)
         return self.final_amount
 
 
+def product_snapshot(product):
+    """OrderItem snapshot fields of a product, captured at purchase time"""
+    return {
+        'product_name': product.product_display_name,
+        'product_image': product.image.name or '',
+        'product_article_type': product.article_type,
+    }
+
+
 class OrderItem(models.Model):
     """
     OrderItem model representing individual products in an order.
-    Links products to orders with quantity and pricing.
+    Links products to orders with quantity and pricing, and keeps a
+    snapshot of the product so orders render without the live catalog.
     """
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     
+    # Product snapshot (see product_snapshot)
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_image = models.CharField(max_length=100, blank=True, default='')
+    product_article_type = models.CharField(max_length=100, blank=True, default='')
+    
     quantity = models.PositiveIntegerField(default=1)
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -83,10 +107,32 @@ class OrderItem(models.Model):
         verbose_name_plural = 'Order Items'
     
     def __str__(self):
-        return f"{self.product.product_display_name} (Order #{self.order.order_number})"
+        return f"{self.product_name or 'Deleted product'} (Order #{self.order.order_number})"
     
     def save(self, *args, **kwargs):
-        """Calculate total_price before saving"""
+        """Calculate total_price and snapshot the product before saving"""
         self.total_price = self.quantity * self.price_per_unit
+        if self.product_id and not self.product_name:
+            for field, value in product_snapshot(self.product).items():
+                setattr(self, field, value)
         super().save(*args, **kwargs)
 
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_list_cache(sender, instance, **kwargs):
+    """Signal handler: drop the cached order list pages of the order's user"""
+    invalidate_order_lists([instance.user_id])
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_order_list_cache_for_item(sender, instance, **kwargs):
+    """Signal handler: items edited on their own change the listed item_count"""
+    if OrderItem.order.is_cached(instance):
+        user_id = instance.order.user_id
+    else:
+        # None when the order went first (cascade): its own signal invalidated
+        user_id = Order.objects.filter(pk=instance.order_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_order_lists([user_id])
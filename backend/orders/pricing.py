@@ -0,0 +1,294 @@
+"""
+Pricing engine shared by order creation, cart quotes and bulk repricing.
+
+settings.PRICING_RULES is compiled once per process into lookup tables:
+
+    PRICING_RULES = {
+        # Tax rate by shipping country ('*' = any other country)
+        'tax_rates': {'*': '0', 'France': '0.20'},
+        # Per-category overrides: {country or '*': {master_category: rate}}
+        'category_tax_rates': {'France': {'Personal Care': '0.055'}},
+        # Line discounts matched on master_category, sub_category,
+        # article_type or product (id); the best matching rate wins
+        'line_discounts': [
+            {'field': 'master_category', 'value': 'Footwear', 'rate': '0.10'},
+        ],
+        # Cart discount once the subtotal reaches min_subtotal (best one wins)
+        'threshold_discounts': [
+            {'min_subtotal': '100.00', 'rate': '0.05'},
+        ],
+    }
+
+Promotions (promotions app) add per-line rates on top of these rules: a
+line gets the best of its rule and promotion rates, never both.
+
+Without a '*' tax rate, settings.ORDER_TAX_RATE is the default. Rates are
+stored as basis points and amounts as integer cents, so a cart is priced
+in a single vectorized NumPy pass with exact, half-up rounded arithmetic:
+line discounts, then the threshold discount on what remains, then tax on
+the discounted amount of each line.
+"""
+import bisect
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from promotions.services import match_promotions
+from shop.models import Product
+
+CENT = Decimal('0.01')
+BASIS_POINTS = 10000
+ANY_COUNTRY = '*'
+LINE_DISCOUNT_FIELDS = ('product', 'master_category', 'sub_category', 'article_type')
+
+
+def to_money(value):
+    """Decimal rounded to the cent (accepts Decimal, int, float or str)."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_cents(value):
+    return int(to_money(value) * 100)
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def to_basis_points(rate):
+    """'0.055' -> 550; finer rates are rejected rather than rounded."""
+    points = Decimal(str(rate)) * BASIS_POINTS
+    if points != points.to_integral_value() or not 0 <= points <= BASIS_POINTS:
+        raise ImproperlyConfigured(f"Invalid pricing rate {rate!r}: use a fraction with at most 4 decimals")
+    return int(points)
+
+
+def _country_key(country):
+    return (country or '').strip().lower()
+
+
+def _apply_rate(cents, basis_points):
+    """Half-up rounded cents * rate, element-wise on non-negative arrays."""
+    return (cents * basis_points + BASIS_POINTS // 2) // BASIS_POINTS
+
+
+class PricingEngine:
+    """Pricing rules compiled into lookup tables."""
+
+    def __init__(self, rules):
+        tax_rates = dict(rules.get('tax_rates', {}))
+        self.default_tax = to_basis_points(
+            tax_rates.pop(ANY_COUNTRY, getattr(settings, 'ORDER_TAX_RATE', '0'))
+        )
+        self.country_tax = {_country_key(country): to_basis_points(rate) for country, rate in tax_rates.items()}
+
+        self.category_tax = {}
+        for country, categories in rules.get('category_tax_rates', {}).items():
+            country_key = ANY_COUNTRY if country == ANY_COUNTRY else _country_key(country)
+            for category, rate in categories.items():
+                self.category_tax[(country_key, category)] = to_basis_points(rate)
+
+        self.line_discounts = {}
+        for rule in rules.get('line_discounts', []):
+            if rule['field'] not in LINE_DISCOUNT_FIELDS:
+                raise ImproperlyConfigured(f"Unknown line discount field {rule['field']!r}")
+            key = (rule['field'], rule['value'])
+            self.line_discounts[key] = max(self.line_discounts.get(key, 0), to_basis_points(rule['rate']))
+
+        # Best rate reachable at each threshold, for a bisect lookup
+        thresholds = sorted(
+            (to_cents(rule['min_subtotal']), to_basis_points(rule['rate']))
+            for rule in rules.get('threshold_discounts', [])
+        )
+        self.threshold_cents = [cents for cents, _ in thresholds]
+        self.threshold_rates = []
+        for _, rate in thresholds:
+            self.threshold_rates.append(max(rate, self.threshold_rates[-1] if self.threshold_rates else 0))
+
+    def line_discount_rate(self, product):
+        if product is None or not self.line_discounts:
+            return 0
+        return max(
+            self.line_discounts.get(('product', product.id), 0),
+            self.line_discounts.get(('master_category', product.master_category), 0),
+            self.line_discounts.get(('sub_category', product.sub_category), 0),
+            self.line_discounts.get(('article_type', product.article_type), 0),
+        )
+
+    def tax_rate(self, product, country_key):
+        if product is not None and self.category_tax:
+            category = product.master_category
+            rate = self.category_tax.get((country_key, category), self.category_tax.get((ANY_COUNTRY, category)))
+            if rate is not None:
+                return rate
+        return self.country_tax.get(country_key, self.default_tax)
+
+    def threshold_rate(self, subtotal_cents):
+        index = bisect.bisect_right(self.threshold_cents, subtotal_cents)
+        return self.threshold_rates[index - 1] if index else 0
+
+    def price(self, lines, country=None, line_discount_rates=None):
+        """
+        Price cart lines in one pass.
+
+        Args:
+            lines: Sequence of (unit_price, quantity, product or None)
+            country: Shipping country for tax rates (default rate if None)
+            line_discount_rates: Optional extra discount rate per line, in
+                basis points (promotions); the best rate of a line applies
+
+        Returns:
+            Dict of per-line cent arrays (unit, gross, line_discount,
+            discount, tax) and
+            cent totals (total, discount, tax, final)
+        """
+        country_key = _country_key(country)
+        unit = np.fromiter((to_cents(price) for price, _, _ in lines), dtype=np.int64, count=len(lines))
+        quantity = np.fromiter((quantity for _, quantity, _ in lines), dtype=np.int64, count=len(lines))
+        discount_rate = np.fromiter(
+            (self.line_discount_rate(product) for _, _, product in lines), dtype=np.int64, count=len(lines)
+        )
+        if line_discount_rates is not None:
+            discount_rate = np.maximum(discount_rate, np.asarray(line_discount_rates, dtype=np.int64))
+        tax_rate = np.fromiter(
+            (self.tax_rate(product, country_key) for _, _, product in lines), dtype=np.int64, count=len(lines)
+        )
+
+        gross = unit * quantity
+        total = int(gross.sum())
+        line_discount = _apply_rate(gross, discount_rate)
+        net = gross - line_discount
+        discount = line_discount + _apply_rate(net, self.threshold_rate(total))
+        tax = _apply_rate(gross - discount, tax_rate)
+
+        discount_total = int(discount.sum())
+        tax_total = int(tax.sum())
+        return {
+            'unit': unit,
+            'gross': gross,
+            'line_discount': line_discount,
+            'discount': discount,
+            'tax': tax,
+            'total': total,
+            'discount_total': discount_total,
+            'tax_total': tax_total,
+            'final': total - discount_total + tax_total,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_pricing_engine():
+    """Engine compiled from settings.PRICING_RULES (once per process)."""
+    return PricingEngine(getattr(settings, 'PRICING_RULES', {}))
+
+
+def get_max_line_quantity():
+    """
+    Largest quantity of a cart or order line (settings.ORDER_MAX_LINE_QUANTITY).
+    Bounds the int64 cents arithmetic of PricingEngine.
+    """
+    return getattr(settings, 'ORDER_MAX_LINE_QUANTITY', 999)
+
+
+def get_max_lines():
+    """Largest number of distinct products in a cart or order (settings.ORDER_MAX_LINES)."""
+    return getattr(settings, 'ORDER_MAX_LINES', 100)
+
+
+@receiver(setting_changed)
+def _reset_pricing_engine(setting, **kwargs):
+    if setting in ('PRICING_RULES', 'ORDER_TAX_RATE'):
+        get_pricing_engine.cache_clear()
+
+
+def fetch_products(product_ids):
+    """
+    Load the products of a cart in one query.
+
+    Returns:
+        Tuple (products by id, sorted list of missing ids)
+    """
+    product_ids = set(product_ids)
+    products = Product.objects.in_bulk(product_ids)
+    missing = sorted(product_ids - set(products))
+    return products, missing
+
+
+def compute_final_amount(total_amount, discount_amount, tax_amount):
+    """final = total - discount + tax, rounded to the cent."""
+    return to_money(to_money(total_amount) - to_money(discount_amount) + to_money(tax_amount))
+
+
+def price_cart(items, products, country=None, coupon_code=None):
+    """
+    Price cart lines against current product prices and promotions.
+
+    Args:
+        items: Sequence of dicts with product_id and quantity
+        products: Dict of Product by id (see fetch_products)
+        country: Shipping country used for tax rates
+        coupon_code: Coupon entered by the customer, if any
+
+    Returns:
+        Dict with lines (product_id, product_name, quantity, unit_price,
+        line_total, discount_amount, tax_amount), total_amount,
+        discount_amount, tax_amount, final_amount and promotions (the
+        promotions that won at least one line, with their discount)
+
+    Raises:
+        PromotionError: the coupon cannot be applied
+    """
+    engine = get_pricing_engine()
+    cart_products = [products[item['product_id']] for item in items]
+    engine_lines = [(product.price, item['quantity'], product) for item, product in zip(items, cart_products)]
+
+    # A promotion only counts for a line where it beats the pricing rules
+    line_promotions = [
+        promotion if promotion is not None and to_basis_points(promotion.rate) > engine.line_discount_rate(product)
+        else None
+        for promotion, product in zip(match_promotions(engine_lines, coupon_code), cart_products)
+    ]
+    result = engine.price(
+        engine_lines,
+        country,
+        [to_basis_points(promotion.rate) if promotion is not None else 0 for promotion in line_promotions]
+    )
+
+    promotion_cents = {}
+    for promotion, line_discount in zip(line_promotions, result['line_discount']):
+        if promotion is not None:
+            entry = promotion_cents.setdefault(promotion.pk, [promotion, 0])
+            entry[1] += int(line_discount)
+
+    lines = [
+        {
+            'product_id': product.id,
+            'product_name': product.product_display_name,
+            'quantity': item['quantity'],
+            'unit_price': from_cents(unit),
+            'line_total': from_cents(gross),
+            'discount_amount': from_cents(discount),
+            'tax_amount': from_cents(tax),
+        }
+        for item, product, unit, gross, discount, tax in zip(
+            items, cart_products, result['unit'], result['gross'], result['discount'], result['tax']
+        )
+    ]
+    return {
+        'lines': lines,
+        'total_amount': from_cents(result['total']),
+        'discount_amount': from_cents(result['discount_total']),
+        'tax_amount': from_cents(result['tax_total']),
+        'final_amount': from_cents(result['final']),
+        'promotions': [
+            {'promotion': promotion, 'discount_amount': from_cents(cents)}
+            for promotion, cents in promotion_cents.values()
+        ],
+    }
@@ -0,0 +1,58 @@
+"""
+Indexed order lookup for support staff (admin search and the search API).
+
+A plain `search_fields` search ORs ILIKE '%q%' across orders and users,
+which no index can serve. Instead:
+
+1. An exact order number is looked up through its unique index and
+   returned alone.
+2. Otherwise, queries of at least MIN_PARTIAL_LENGTH characters run two
+   index-backed queries: orders whose number contains the text, and
+   orders of users whose email or username contains it. The pg_trgm GIN
+   indexes on UPPER(order_number), UPPER(email) and UPPER(username)
+   (orders migration 0005, users migration 0002) match the
+   UPPER(col::text) LIKE UPPER('%q%') that icontains generates.
+
+Each query fetches limit + 1 newest rows, so has_more is known without a
+COUNT.
+"""
+from django.db.models import Q
+
+from .models import Order
+from .services import with_item_count
+
+# Trigrams need three characters; shorter fragments would scan the index
+MIN_PARTIAL_LENGTH = 3
+
+
+def search_orders(query, limit=20):
+    """
+    Find orders by order number, user email or username.
+
+    Args:
+        query: Search text (exact order number or a fragment)
+        limit: Maximum number of orders returned
+
+    Returns:
+        Tuple (orders newest first, has_more)
+    """
+    query = query.strip()
+    if not query:
+        return [], False
+    orders = with_item_count(Order.objects.select_related('user'))
+
+    exact = list(orders.filter(order_number__in={query, query.upper()}))
+    if exact or len(query) < MIN_PARTIAL_LENGTH:
+        return exact, False
+
+    by_number = list(orders.filter(order_number__icontains=query).order_by('-id')[:limit + 1])
+    # A join, not a capped list of matching users: a fragment shared by many
+    # users (an email domain) must still reach the newest orders of all of them
+    by_user = list(
+        orders.filter(Q(user__email__icontains=query) | Q(user__username__icontains=query))
+        .order_by('-id')[:limit + 1]
+    )
+
+    merged = {order.id: order for order in by_number + by_user}
+    results = sorted(merged.values(), key=lambda order: order.id, reverse=True)
+    return results[:limit], len(results) > limit
@@ -1,16 +1,49 @@
+from django.conf import settings
 from rest_framework import serializers
+from core.exports import EXPORT_FORMATS
+from .accounting import decode_cursor
 from .models import Order, OrderItem
-from shop.models import Product
+from .pricing import get_max_line_quantity, get_max_lines
+from .transitions import ORDER_PAYMENT_TRANSITIONS, ORDER_TRANSITIONS
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Serializer for OrderItem model - represents individual products in an order"""
-    product_name = serializers.CharField(source='product.product_display_name', read_only=True)
     
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'quantity', 'price_per_unit', 'total_price', 'created_at']
-        read_only_fields = ['id', 'total_price', 'created_at']
+        fields = [
+            'id', 'product', 'product_name', 'product_image', 'product_article_type',
+            'quantity', 'price_per_unit', 'total_price', 'created_at'
+        ]
+        read_only_fields = [
+            'id', 'product_name', 'product_image', 'product_article_type', 'total_price', 'created_at'
+        ]
+
+
+def validate_line_count(items):
+    """Reject carts and orders with more than settings.ORDER_MAX_LINES lines"""
+    max_lines = get_max_lines()
+    if len(items) > max_lines:
+        raise serializers.ValidationError(f"At most {max_lines} lines per order")
+    return items
+
+
+def validate_line_quantity(quantity):
+    """Reject quantities above settings.ORDER_MAX_LINE_QUANTITY"""
+    max_quantity = get_max_line_quantity()
+    if quantity > max_quantity:
+        raise serializers.ValidationError(f"At most {max_quantity} units per line")
+    return quantity
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    """One cart line to price"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    
+    def validate_quantity(self, quantity):
+        return validate_line_quantity(quantity)
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -18,32 +51,139 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     items = serializers.ListField(
         child=serializers.DictField(),
         write_only=True,
+        required=False,
         help_text="List of items with product_id and quantity"
     )
+    from_cart = serializers.BooleanField(
+        default=False,
+        write_only=True,
+        help_text="Order the lines of the user's server-side cart instead of items"
+    )
+    coupon_code = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        write_only=True,
+        help_text="Promotion code entered by the customer"
+    )
     
     class Meta:
         model = Order
         fields = [
-            'items', 'shipping_address', 'shipping_city',
+            'items', 'from_cart', 'coupon_code', 'shipping_address', 'shipping_city',
             'shipping_postal_code', 'shipping_country'
         ]
     
     def validate_items(self, items):
-        """Validate that items list is not empty and contains valid products"""
+        """
+        Validate that items list is not empty and every line is well formed.
+        Product existence is checked by the view with the single product
+        fetch it also uses for pricing.
+        """
         if not items:
             raise serializers.ValidationError("Order must contain at least one item")
+        validate_line_count(items)
         
         for item in items:
             if 'product_id' not in item or 'quantity' not in item:
                 raise serializers.ValidationError("Each item must have product_id and quantity")
-            
-            if not Product.objects.filter(id=item['product_id']).exists():
-                raise serializers.ValidationError(f"Product {item['product_id']} does not exist")
-            
-            if item['quantity'] < 1:
-                raise serializers.ValidationError("Quantity must be at least 1")
         
-        return items
+        lines = QuoteItemSerializer(data=items, many=True)
+        if not lines.is_valid():
+            raise serializers.ValidationError(lines.errors)
+        return lines.validated_data
+    
+    def validate(self, attrs):
+        """Exactly one source of lines: items or the server-side cart"""
+        if not attrs.get('from_cart') and 'items' not in attrs:
+            raise serializers.ValidationError({'items': "This field is required."})
+        return attrs
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    """Bulk status change: order IDs and the status to move them to"""
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.ChoiceField(choices=list(ORDER_TRANSITIONS))
+    
+    def validate_order_ids(self, order_ids):
+        max_ids = getattr(settings, 'ORDER_BULK_TRANSITION_MAX_IDS', 500)
+        if len(order_ids) > max_ids:
+            raise serializers.ValidationError(f"At most {max_ids} orders per request")
+        return order_ids
+
+
+class OrderExportSerializer(serializers.Serializer):
+    """Query parameters of the accounting export"""
+    date_from = serializers.DateField(required=False, help_text="First order day exported (inclusive)")
+    date_to = serializers.DateField(required=False, help_text="Last order day exported (inclusive)")
+    export_format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    gzip = serializers.BooleanField(default=False)
+    after = serializers.CharField(
+        required=False,
+        help_text="cursor of the last row received, to resume an interrupted export"
+    )
+    
+    def validate_after(self, after):
+        try:
+            return decode_cursor(after)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return data
+
+
+class OrderQuoteSerializer(serializers.Serializer):
+    """Serializer for cart quotes - validates lines without touching the database"""
+    items = QuoteItemSerializer(many=True, allow_empty=False)
+    country = serializers.CharField(required=False, help_text="Shipping country used for tax rates")
+    coupon_code = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Promotion code entered by the customer"
+    )
+    
+    def validate_items(self, items):
+        return validate_line_count(items)
+
+
+class QuoteLineSerializer(serializers.Serializer):
+    """Priced cart line"""
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField()
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class AppliedPromotionSerializer(serializers.Serializer):
+    """Promotion applied to a quote, with the discount it grants"""
+    id = serializers.IntegerField(source='promotion.id')
+    name = serializers.CharField(source='promotion.name')
+    code = serializers.CharField(source='promotion.code', allow_null=True)
+    discount_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Cart totals computed by the pricing engine (orders.pricing.price_cart)"""
+    lines = QuoteLineSerializer(many=True)
+    promotions = AppliedPromotionSerializer(many=True)
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    final_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartLineSerializer(serializers.Serializer):
+    """Cart line update: quantity is added on create and set on update (0 removes)"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    
+    def validate_quantity(self, quantity):
+        return validate_line_quantity(quantity)
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -65,11 +205,10 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderUpdateSerializer(serializers.ModelSerializer):
-    """Serializer for updating order status"""
-    class Meta:
-        model = Order
-        fields = ['status', 'payment_status']
+class OrderUpdateSerializer(serializers.Serializer):
+    """Status changes, applied through the state machine (orders.transitions)"""
+    status = serializers.ChoiceField(choices=list(ORDER_TRANSITIONS), required=False)
+    payment_status = serializers.ChoiceField(choices=list(ORDER_PAYMENT_TRANSITIONS), required=False)
 
 
 class OrderListSerializer(serializers.ModelSerializer):
@@ -85,5 +224,10 @@ class OrderListSerializer(serializers.ModelSerializer):
         ]
     
     def get_item_count(self, obj):
-        """Get total number of items in order"""
+        """
+        Get total number of items in order.
+        Uses the item_count annotation (see with_item_count) when present.
+        """
+        if hasattr(obj, 'item_count'):
+            return obj.item_count
         return obj.items.count()
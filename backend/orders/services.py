@@ -0,0 +1,83 @@
+"""
+Order services: bulk repricing with the pricing engine, item counts of
+order lists.
+"""
+import logging
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import invalidate_order_lists
+from .models import Order, OrderItem
+from .pricing import from_cents, get_pricing_engine
+
+logger = logging.getLogger('orders')
+
+REPRICED_FIELDS = ['total_amount', 'discount_amount', 'tax_amount', 'final_amount']
+
+
+def with_item_count(orders):
+    """
+    Annotate orders with item_count, their number of lines.
+
+    A correlated subquery rather than Count('items') + GROUP BY: it only
+    runs for the rows of the page that is actually fetched.
+    """
+    items = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return orders.annotate(item_count=Coalesce(Subquery(items), 0))
+
+
+def reprice_orders(orders, batch_size=500):
+    """
+    Recompute the amounts of orders with the current pricing rules.
+
+    Items keep the unit price they were ordered at; discounts and taxes
+    are re-evaluated. Changed orders are saved with bulk_update. Orders
+    with redeemed promotions are skipped: their discount was granted at
+    checkout and is not re-evaluated.
+
+    Args:
+        orders: Order queryset
+        batch_size: Orders loaded and updated per batch
+
+    Returns:
+        Number of orders whose amounts changed
+    """
+    engine = get_pricing_engine()
+    changed = []
+    updated = 0
+    orders = orders.filter(promotion_redemptions__isnull=True)
+    for order in orders.prefetch_related('items__product').iterator(chunk_size=batch_size):
+        result = engine.price(
+            [(item.price_per_unit, item.quantity, item.product) for item in order.items.all()],
+            order.shipping_country
+        )
+        amounts = {
+            'total_amount': from_cents(result['total']),
+            'discount_amount': from_cents(result['discount_total']),
+            'tax_amount': from_cents(result['tax_total']),
+            'final_amount': from_cents(result['final']),
+        }
+        if all(getattr(order, field) == value for field, value in amounts.items()):
+            continue
+        for field, value in amounts.items():
+            setattr(order, field, value)
+        changed.append(order)
+        if len(changed) >= batch_size:
+            Order.objects.bulk_update(changed, REPRICED_FIELDS)
+            invalidate_order_lists(order.user_id for order in changed)
+            updated += len(changed)
+            changed = []
+
+    if changed:
+        Order.objects.bulk_update(changed, REPRICED_FIELDS)
+        invalidate_order_lists(order.user_id for order in changed)
+        updated += len(changed)
+    logger.info(f"Repriced {updated} orders")
+    return updated
@@ -1,13 +1,39 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf, skipUnless
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from decimal import Decimal
+from django_redis import get_redis_connection
 
 from users.models import CustomUser
 from shop.models import Product
 from orders.models import Order, OrderItem
+from orders.numbering import BLOCK_SIZE, _allocator, allocate_order_number
+from orders.pricing import PricingEngine, get_pricing_engine, price_cart
+from orders.search import search_orders
+from orders.services import reprice_orders
+from orders.transitions import mark_order_paid, transition_order, transition_payment
+from outbox.models import OutboxEvent
+from payments.models import Payment, Refund
+from payments.services import StripeWebhookService
+from promotions.models import Promotion, PromotionRedemption
+from promotions.services import get_promotion_index, reset_promotion_index
 
 
 class OrderModelTestCase(TestCase):
@@ -388,3 +414,1375 @@ class OrderAPITestCase(TestCase):
         response = self.client.post(self.list_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+    def test_create_order_query_count(self):
+        """Test that order creation runs a fixed number of queries whatever the item count"""
+        self.client.force_authenticate(user=self.user)
+        extra_products = [
+            Product.objects.create(
+                id=230 + index,
+                product_display_name=f"Bulk Product {index}",
+                gender="Men",
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=10.00
+            )
+            for index in range(10)
+        ]
+        data = {
+            'items': [{'product_id': product.id, 'quantity': 2} for product in extra_products],
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }
+        
+        # The promotion index is loaded once per process, not per order
+        reset_promotion_index()
+        get_promotion_index()
+        
+        # SAVEPOINT, product fetch, order INSERT, items INSERT, outbox INSERT, RELEASE SAVEPOINT
+        with self.assertNumQueries(6):
+            response = self.client.post(self.list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['items']), 10)
+        self.assertEqual(response.data['final_amount'], '200.00')
+        self.assertEqual(response.data['items'][0]['product_name'], "Bulk Product 0")
+        
+        order = Order.objects.get(order_number=response.data['order_number'])
+        self.assertEqual(order.items.count(), 10)
+        self.assertEqual(order.final_amount, Decimal('200.00'))
+
+    def test_create_order_idempotency_key(self):
+        """Test that a retried checkout with the same Idempotency-Key creates one order"""
+        data = {
+            'items': [{'product_id': 200, 'quantity': 1}],
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }
+        first = self.client.post(self.list_url, data, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.client.post(self.list_url, data, format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['order_number'], first.data['order_number'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+    
+    def test_create_order_unexpected_error_not_replayed(self):
+        """Test that an internal error is a 500 the client can retry under the same key"""
+        data = {
+            'items': [{'product_id': 200, 'quantity': 1}],
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }
+        self.client.raise_request_exception = False
+        with patch('orders.views.allocate_order_number', side_effect=DatabaseError('deadlock detected')):
+            failed = self.client.post(self.list_url, data, format='json', HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(failed.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn(b'deadlock', failed.content)
+        
+        retry = self.client.post(self.list_url, data, format='json', HTTP_IDEMPOTENCY_KEY='checkout-2')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+
+
+class OrderQuoteTestCase(TestCase):
+    """Tests for the cart quote endpoint"""
+    
+    def setUp(self):
+        """Set up products; quotes do not require authentication"""
+        self.client = APIClient()
+        self.url = reverse('order-quote')
+        
+        for product_id, price in [(210, '19.99'), (211, '5.50')]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Quote Product {product_id}",
+                gender="Men",
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=price
+            )
+        self.items = [
+            {'product_id': 210, 'quantity': 3},
+            {'product_id': 211, 'quantity': 2},
+        ]
+    
+    def test_quote_cart(self):
+        """Test line totals and cart totals"""
+        reset_promotion_index()
+        get_promotion_index()
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'items': self.items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        lines = response.data['lines']
+        self.assertEqual([line['line_total'] for line in lines], ['59.97', '11.00'])
+        self.assertEqual(response.data['total_amount'], '70.97')
+        self.assertEqual(response.data['discount_amount'], '0.00')
+        self.assertEqual(response.data['tax_amount'], '0.00')
+        self.assertEqual(response.data['final_amount'], '70.97')
+    
+    @override_settings(ORDER_TAX_RATE='0.20')
+    def test_quote_matches_created_order(self):
+        """Test that the quote and order creation use the same pricing"""
+        quote = self.client.post(self.url, {'items': self.items}, format='json').data
+        self.assertEqual(quote['tax_amount'], '14.19')
+        self.assertEqual(quote['final_amount'], '85.16')
+        
+        user = CustomUser.objects.create_user(
+            username='quoteuser',
+            email='quote@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('order-list'), {
+            'items': self.items,
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for field in ['total_amount', 'discount_amount', 'tax_amount', 'final_amount']:
+            self.assertEqual(response.data[field], quote[field])
+    
+    def test_quote_invalid_lines(self):
+        """Test missing products and invalid quantities"""
+        response = self.client.post(self.url, {'items': [{'product_id': 999, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['missing'], [999])
+        
+        for items in [[], [{'product_id': 210, 'quantity': 0}]]:
+            response = self.client.post(self.url, {'items': items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @override_settings(ORDER_MAX_LINES=1)
+    def test_too_many_lines_rejected(self):
+        """Test that quotes with more distinct lines than ORDER_MAX_LINES get a 400"""
+        response = self.client.post(self.url, {'items': self.items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @override_settings(ORDER_MAX_LINE_QUANTITY=10)
+    def test_quantity_above_max_rejected(self):
+        """Test that oversized quantities get a 400 on quotes and orders, not an overflow"""
+        items = [{'product_id': 210, 'quantity': 10}]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        items = [{'product_id': 210, 'quantity': 2 ** 62}]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        user = CustomUser.objects.create_user(
+            username='bulkbuyer',
+            email='bulk@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('order-list'), {
+            'items': [{'product_id': 210, 'quantity': 11}],
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.filter(user=user).exists())
+
+
+def redis_available():
+    """The cart API needs a real Redis behind the default cache."""
+    try:
+        get_redis_connection('default').ping()
+        return True
+    except Exception:
+        return False
+
+
+@skipUnless(redis_available(), "Redis is not available")
+@override_settings(CART_KEY_PREFIX='test-cart')
+class CartAPITestCase(TestCase):
+    """Tests for the Redis-backed server-side cart"""
+    
+    def setUp(self):
+        """Set up products and an anonymous client"""
+        self.client = APIClient()
+        self.url = reverse('cart-list')
+        self.user = CustomUser.objects.create_user(
+            username='cartuser',
+            email='cart@example.com',
+            password='testpass123'
+        )
+        for product_id, price in [(220, '10.00'), (221, '25.00')]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Cart Product {product_id}",
+                gender="Men",
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=price
+            )
+    
+    def tearDown(self):
+        redis = get_redis_connection('default')
+        for key in redis.scan_iter('test-cart:*'):
+            redis.delete(key)
+    
+    def _anonymous_cart(self):
+        """Create an anonymous cart with two lines and return its id"""
+        response = self.client.post(self.url, {'product_id': 220, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        cart_id = response['X-Cart-Id']
+        self.client.post(self.url, {'product_id': 221}, format='json', HTTP_X_CART_ID=cart_id)
+        return cart_id
+    
+    def test_anonymous_cart(self):
+        """Test that an anonymous cart is identified by its X-Cart-Id"""
+        cart_id = self._anonymous_cart()
+        
+        response = self.client.get(self.url, HTTP_X_CART_ID=cart_id)
+        self.assertEqual(response.data['cart_id'], cart_id)
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in response.data['lines']],
+            [(220, 2), (221, 1)]
+        )
+        self.assertEqual(response.data['final_amount'], '45.00')
+        
+        # Without the header the visitor has an empty cart
+        self.assertEqual(self.client.get(self.url).data['lines'], [])
+    
+    def test_update_and_remove_lines(self):
+        """Test setting quantities, removing lines and clearing"""
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, {'product_id': 220}, format='json')
+        self.client.post(self.url, {'product_id': 220}, format='json')
+        self.client.post(self.url, {'product_id': 221}, format='json')
+        
+        response = self.client.patch(reverse('cart-detail', kwargs={'pk': 220}), {'quantity': 5}, format='json')
+        self.assertEqual(response.data['lines'][0]['quantity'], 5)
+        
+        # Form-encoded bodies work too
+        response = self.client.patch(reverse('cart-detail', kwargs={'pk': 220}), {'quantity': 4}, format='multipart')
+        self.assertEqual(response.data['lines'][0]['quantity'], 4)
+        
+        response = self.client.delete(reverse('cart-detail', kwargs={'pk': 221}))
+        self.assertEqual([line['product_id'] for line in response.data['lines']], [220])
+        
+        response = self.client.post(reverse('cart-clear'))
+        self.assertEqual(response.data['lines'], [])
+    
+    def test_add_unknown_product(self):
+        """Test that unknown products and empty quantities are rejected"""
+        response = self.client.post(self.url, {'product_id': 999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'product_id': 220, 'quantity': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_merge_on_login(self):
+        """Test that logging in merges the anonymous cart into the user's cart"""
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, {'product_id': 220, 'quantity': 1}, format='json')
+        self.client.force_authenticate(user=None)
+        
+        cart_id = self._anonymous_cart()
+        response = self.client.post(reverse('user-login'), {
+            'username': 'cartuser',
+            'password': 'testpass123',
+            'cart_id': cart_id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in response.data['lines']],
+            [(220, 3), (221, 1)]
+        )
+        # The anonymous cart is gone
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url, HTTP_X_CART_ID=cart_id).data['lines'], [])
+    
+    @override_settings(ORDER_MAX_LINE_QUANTITY=5)
+    def test_line_quantity_capped(self):
+        """Test that oversized updates are rejected and adds and merges are capped"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'product_id': 220, 'quantity': 6}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(reverse('cart-detail', kwargs={'pk': 220}), {'quantity': 6}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        self.client.post(self.url, {'product_id': 220, 'quantity': 4}, format='json')
+        response = self.client.post(self.url, {'product_id': 220, 'quantity': 4}, format='json')
+        self.assertEqual(response.data['lines'][0]['quantity'], 5)
+        self.client.force_authenticate(user=None)
+        
+        cart_id = self._anonymous_cart()
+        self.client.post(reverse('user-login'), {
+            'username': 'cartuser',
+            'password': 'testpass123',
+            'cart_id': cart_id
+        }, format='json')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in response.data['lines']],
+            [(220, 5), (221, 1)]
+        )
+    
+    def test_checkout_from_cart(self):
+        """Test creating an order from the server-side cart"""
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, {'product_id': 221, 'quantity': 2}, format='json')
+        
+        response = self.client.post(reverse('order-list'), {
+            'from_cart': True,
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['final_amount'], '50.00')
+        self.assertEqual(self.client.get(self.url).data['lines'], [])
+    
+    def test_checkout_keeps_lines_added_meanwhile(self):
+        """Test that only the ordered lines leave the cart after a from_cart checkout"""
+        from orders import cart
+        from orders.pricing import fetch_products
+        
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, {'product_id': 221, 'quantity': 2}, format='json')
+        
+        def fetch_while_adding(product_ids):
+            # Another tab adds a product while the order is being placed
+            cart.add_line(cart.user_cart_key(self.user.id), 220, 1)
+            return fetch_products(product_ids)
+        
+        with patch('orders.views.fetch_products', side_effect=fetch_while_adding):
+            response = self.client.post(reverse('order-list'), {
+                'from_cart': True,
+                'shipping_address': '123 Test St',
+                'shipping_city': 'Test City',
+                'shipping_postal_code': '12345',
+                'shipping_country': 'Test Country'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in self.client.get(self.url).data['lines']],
+            [(220, 1)]
+        )
+    
+    @override_settings(ORDER_MAX_LINES=1)
+    def test_distinct_lines_capped(self):
+        """Test that a full cart refuses new products but still updates its lines"""
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, {'product_id': 220}, format='json')
+        
+        response = self.client.post(self.url, {'product_id': 221}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(reverse('cart-detail', kwargs={'pk': 221}), {'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.patch(reverse('cart-detail', kwargs={'pk': 220}), {'quantity': 3}, format='json')
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in response.data['lines']],
+            [(220, 3)]
+        )
+
+
+class OrderNumberTestCase(TestCase):
+    """Tests for order number allocation"""
+    
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='numberuser',
+            email='number@example.com',
+            password='testpass123'
+        )
+    
+    def test_numbers_are_unique_and_sortable(self):
+        """Test that allocated numbers never repeat and sort in allocation order"""
+        numbers = [allocate_order_number() for _ in range(BLOCK_SIZE * 2 + 5)]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(sorted(numbers), numbers)
+        self.assertRegex(numbers[0], r'^ORD-\d{8}-\d{8}$')
+    
+    def test_number_uses_given_date(self):
+        """Test that back-dated orders carry their own date"""
+        number = allocate_order_number(timezone.datetime(2025, 3, 1))
+        self.assertTrue(number.startswith('ORD-20250301-'))
+    
+    def test_created_orders_use_allocator(self):
+        """Test that the API assigns allocated numbers"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        Product.objects.create(
+            id=240,
+            product_display_name="Numbered Product",
+            gender="Men",
+            master_category="Apparel",
+            sub_category="Topwear",
+            article_type="Shirts",
+            base_colour="Blue",
+            season="Summer",
+            year=2024,
+            usage="Casual",
+            price=10.00
+        )
+        data = {
+            'items': [{'product_id': 240, 'quantity': 1}],
+            'shipping_address': '123 Test St',
+            'shipping_city': 'Test City',
+            'shipping_postal_code': '12345',
+            'shipping_country': 'Test Country'
+        }
+        first = client.post(reverse('order-list'), data, format='json').data['order_number']
+        second = client.post(reverse('order-list'), data, format='json').data['order_number']
+        self.assertRegex(first, r'^ORD-\d{8}-\d{8}$')
+        self.assertLess(first, second)
+    
+    @skipIf(connection.vendor == 'postgresql', "PostgreSQL allocates from a sequence")
+    def test_fallback_seeded_from_order_numbers(self):
+        """Test that without a sequence the counter continues after existing numbers, not ids"""
+        for order_number in ['ORD-20250101-00000900', 'ORD-20240101-00000950', 'ORD-9F3A2B1C']:
+            Order.objects.create(
+                user=self.user,
+                order_number=order_number,
+                shipping_address='123 Test St',
+                shipping_city='Test City',
+                shipping_postal_code='12345',
+                shipping_country='Test Country'
+            )
+        _allocator.reset()
+        self.addCleanup(_allocator.reset)
+        self.assertTrue(allocate_order_number().endswith('-00000951'))
+
+
+
+class OrderNumberBenchmarkTestCase(TransactionTestCase):
+    """Tests for the concurrent order number benchmark (threads need committed data)"""
+    
+    def test_benchmark_command(self):
+        """Test that the benchmark runs and cleans up after itself"""
+        out = StringIO()
+        call_command('benchmark_order_numbers', '--threads', '1', '--orders', '5', '--scheme', 'sequence', stdout=out)
+        self.assertIn('sequence: 5 orders', out.getvalue())
+        self.assertIn('duplicates 0', out.getvalue())
+        self.assertFalse(Order.objects.filter(user__username='order-number-benchmark').exists())
+
+
+PRICING_TEST_RULES = {
+    'tax_rates': {'*': '0.20', 'Germany': '0.19'},
+    'category_tax_rates': {'France': {'Personal Care': '0.055'}},
+    'line_discounts': [
+        {'field': 'master_category', 'value': 'Footwear', 'rate': '0.10'},
+        {'field': 'product', 'value': 252, 'rate': '0.50'},
+    ],
+    'threshold_discounts': [
+        {'min_subtotal': '100.00', 'rate': '0.05'},
+        {'min_subtotal': '200.00', 'rate': '0.10'},
+    ],
+}
+
+
+@override_settings(PRICING_RULES=PRICING_TEST_RULES)
+class PricingEngineTestCase(TestCase):
+    """Tests for the rule-compiled pricing engine"""
+    
+    def setUp(self):
+        self.products = {}
+        for product_id, master_category, price in [
+            (250, "Apparel", '40.00'),
+            (251, "Footwear", '80.00'),
+            (252, "Apparel", '30.00'),
+            (253, "Personal Care", '10.00'),
+        ]:
+            self.products[product_id] = Product.objects.create(
+                id=product_id,
+                product_display_name=f"Priced Product {product_id}",
+                gender="Men",
+                master_category=master_category,
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=price
+            )
+    
+    def _price(self, lines, country=None):
+        items = [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in lines]
+        return price_cart(items, self.products, country)
+    
+    def test_default_tax_without_discounts(self):
+        """Test the default tax rate on a small cart"""
+        quote = self._price([(250, 1)])
+        self.assertEqual(quote['discount_amount'], Decimal('0.00'))
+        self.assertEqual(quote['tax_amount'], Decimal('8.00'))
+        self.assertEqual(quote['final_amount'], Decimal('48.00'))
+    
+    def test_country_and_category_tax(self):
+        """Test country rates and per-category overrides"""
+        self.assertEqual(self._price([(250, 1)], 'germany')['tax_amount'], Decimal('7.60'))
+        quote = self._price([(253, 1), (250, 1)], 'France')
+        self.assertEqual([line['tax_amount'] for line in quote['lines']], [Decimal('0.55'), Decimal('8.00')])
+    
+    def test_line_and_threshold_discounts(self):
+        """Test that line discounts apply first, then the best reached threshold"""
+        quote = self._price([(251, 2), (252, 1), (250, 2)])
+        # Subtotal 270.00 reaches the 200.00 threshold (10%)
+        self.assertEqual(quote['total_amount'], Decimal('270.00'))
+        footwear, half_price, apparel = quote['lines']
+        self.assertEqual(footwear['discount_amount'], Decimal('30.40'))  # 16.00 + 10% of 144.00
+        self.assertEqual(half_price['discount_amount'], Decimal('16.50'))  # 15.00 + 10% of 15.00
+        self.assertEqual(apparel['discount_amount'], Decimal('8.00'))
+        self.assertEqual(quote['discount_amount'], Decimal('54.90'))
+        self.assertEqual(quote['tax_amount'], Decimal('43.02'))
+        self.assertEqual(quote['final_amount'], Decimal('258.12'))
+    
+    def test_engine_compiled_once(self):
+        """Test that the engine is cached and rebuilt when the rules change"""
+        self.assertIs(get_pricing_engine(), get_pricing_engine())
+        with override_settings(PRICING_RULES={}, ORDER_TAX_RATE='0'):
+            self.assertEqual(self._price([(250, 1)])['tax_amount'], Decimal('0.00'))
+        self.assertEqual(self._price([(250, 1)])['tax_amount'], Decimal('8.00'))
+    
+    def test_invalid_rate_rejected(self):
+        """Test that rates finer than a basis point are refused"""
+        with self.assertRaises(ImproperlyConfigured):
+            PricingEngine({'tax_rates': {'*': '0.12345'}})
+    
+    def test_quote_uses_country(self):
+        """Test that the quote endpoint applies the requested country"""
+        response = APIClient().post(reverse('order-quote'), {
+            'items': [{'product_id': 250, 'quantity': 1}],
+            'country': 'Germany'
+        }, format='json')
+        self.assertEqual(response.data['tax_amount'], '7.60')
+        self.assertEqual(response.data['lines'][0]['tax_amount'], '7.60')
+    
+    def test_reprice_orders(self):
+        """Test that bulk repricing applies the rules to stored order lines"""
+        user = CustomUser.objects.create_user(
+            username='repriceuser',
+            email='reprice@example.com',
+            password='testpass123'
+        )
+        order = Order.objects.create(
+            user=user,
+            order_number="ORD-REPRICE1",
+            shipping_address="123 Test St",
+            shipping_city="Berlin",
+            shipping_postal_code="10115",
+            shipping_country="Germany",
+            total_amount=Decimal('50.00'),
+            final_amount=Decimal('50.00')
+        )
+        OrderItem.objects.create(order=order, product=self.products[250], quantity=1, price_per_unit=Decimal('50.00'))
+        
+        out = StringIO()
+        call_command('reprice_orders', stdout=out)
+        self.assertIn('Repriced 1 orders', out.getvalue())
+        order.refresh_from_db()
+        self.assertEqual(order.tax_amount, Decimal('9.50'))
+        self.assertEqual(order.final_amount, Decimal('59.50'))
+        
+        # Nothing changes on a second run
+        self.assertEqual(reprice_orders(Order.objects.all()), 0)
+    
+    def test_benchmark_command(self):
+        """Test that the pricing benchmark reports both cart sizes"""
+        out = StringIO()
+        call_command('benchmark_pricing', '--iterations', '3', stdout=out)
+        self.assertIn('   1 lines:', out.getvalue())
+        self.assertIn(' 100 lines:', out.getvalue())
+
+
+class OrderBulkTransitionTestCase(TestCase):
+    """Tests for the bulk status transition endpoint"""
+    
+    def setUp(self):
+        """Set up staff user and orders in several statuses"""
+        self.client = APIClient()
+        self.url = reverse('order-bulk-transition')
+        self.staff = CustomUser.objects.create_user(
+            username='warehouse',
+            email='warehouse@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.customer = CustomUser.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='testpass123'
+        )
+        self.orders = {
+            order_status: Order.objects.create(
+                user=self.customer,
+                order_number=allocate_order_number(),
+                status=order_status,
+                shipping_address='1 Warehouse Road',
+                shipping_city='Lyon',
+                shipping_postal_code='69001',
+                shipping_country='France'
+            )
+            for order_status in ['pending', 'confirmed', 'shipped', 'delivered']
+        }
+    
+    def test_bulk_ship(self):
+        """Test allowed orders move in one UPDATE and the others are reported"""
+        self.client.force_authenticate(user=self.staff)
+        order_ids = [
+            self.orders['pending'].id, self.orders['confirmed'].id, self.orders['delivered'].id, 999999
+        ]
+        
+        # SAVEPOINT, UPDATE ... RETURNING, outbox INSERT, RELEASE SAVEPOINT,
+        # then the status of the orders left behind
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, {'order_ids': order_ids, 'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated_count'], 2)
+        self.assertEqual(
+            [(result['outcome'], result['current_status']) for result in response.data['results']],
+            [('updated', 'shipped'), ('updated', 'shipped'), ('invalid_transition', 'delivered'), ('not_found', None)]
+        )
+        
+        pending = Order.objects.get(id=self.orders['pending'].id)
+        self.assertEqual(pending.status, 'shipped')
+        self.assertIsNotNone(pending.shipped_at)
+        self.assertEqual(Order.objects.get(id=self.orders['delivered'].id).status, 'delivered')
+        self.assertEqual(
+            sorted(OutboxEvent.objects.filter(topic='order.status_changed').values_list('aggregate_id', flat=True)),
+            sorted(str(order_id) for order_id in order_ids[:2])
+        )
+    
+    def test_bulk_deliver(self):
+        """Test delivery sets delivered_at and only applies to shipped orders"""
+        self.client.force_authenticate(user=self.staff)
+        order_ids = [order.id for order in self.orders.values()]
+        
+        response = self.client.post(self.url, {'order_ids': order_ids, 'status': 'delivered'}, format='json')
+        self.assertEqual(response.data['updated_count'], 1)
+        shipped = Order.objects.get(id=self.orders['shipped'].id)
+        self.assertEqual(shipped.status, 'delivered')
+        self.assertIsNotNone(shipped.delivered_at)
+    
+    def test_bulk_transition_validation(self):
+        """Test unknown statuses and oversized batches are rejected"""
+        self.client.force_authenticate(user=self.staff)
+        order_ids = [self.orders['pending'].id]
+        
+        response = self.client.post(self.url, {'order_ids': order_ids, 'status': 'lost'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        with override_settings(ORDER_BULK_TRANSITION_MAX_IDS=2):
+            response = self.client.post(self.url, {'order_ids': [1, 2, 3], 'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_transition_staff_only(self):
+        """Test customers cannot use the bulk endpoint"""
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(
+            self.url, {'order_ids': [self.orders['pending'].id], 'status': 'shipped'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Order.objects.get(id=self.orders['pending'].id).status, 'pending')
+
+
+class OrderTransitionTestCase(TestCase):
+    """Tests for compare-and-set order and payment transitions"""
+    
+    def setUp(self):
+        """Set up a pending order"""
+        self.user = CustomUser.objects.create_user(
+            username='stateuser',
+            email='state@example.com',
+            password='testpass123'
+        )
+        self.order = Order.objects.create(
+            user=self.user,
+            order_number=allocate_order_number(),
+            shipping_address='1 State Street',
+            shipping_city='Nantes',
+            shipping_postal_code='44000',
+            shipping_country='France'
+        )
+    
+    def test_transition_writes_changed_columns_only(self):
+        """Test a transition is one guarded UPDATE of the changed columns"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(transition_order(self.order, 'shipped'))
+        
+        # SAVEPOINT, UPDATE, outbox INSERT, RELEASE SAVEPOINT
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        sql = updates[0]
+        self.assertIn('shipped_at', sql)
+        self.assertNotIn('shipping_address', sql)
+        self.assertEqual(self.order.status, 'shipped')
+        self.assertIsNotNone(self.order.shipped_at)
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'shipped')
+        
+        event = OutboxEvent.objects.get(topic='order.status_changed')
+        self.assertEqual(event.aggregate_id, str(self.order.id))
+        self.assertEqual(event.payload['status'], 'shipped')
+        self.assertEqual(event.payload['order_number'], self.order.order_number)
+    
+    def test_concurrent_transitions_single_winner(self):
+        """Test two writers holding the same stale order cannot both win"""
+        other = Order.objects.get(id=self.order.id)
+        
+        self.assertTrue(transition_order(self.order, 'cancelled'))
+        self.assertFalse(transition_order(other, 'shipped'))
+        
+        # The loser's instance is left as it was read
+        self.assertEqual(other.status, 'pending')
+        self.assertIsNone(other.shipped_at)
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'cancelled')
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+    
+    def test_mark_order_paid(self):
+        """Test payment confirms a pending order but not a shipped one"""
+        self.assertTrue(mark_order_paid(self.order))
+        self.assertFalse(mark_order_paid(self.order))
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual((order.status, order.payment_status), ('confirmed', 'paid'))
+        
+        shipped = Order.objects.create(
+            user=self.user,
+            order_number=allocate_order_number(),
+            status='shipped',
+            shipping_address='1 State Street',
+            shipping_city='Nantes',
+            shipping_postal_code='44000',
+            shipping_country='France'
+        )
+        self.assertTrue(mark_order_paid(shipped))
+        shipped = Order.objects.get(id=shipped.id)
+        self.assertEqual((shipped.status, shipped.payment_status), ('shipped', 'paid'))
+    
+    def test_late_payment_failure_ignored(self):
+        """Test a failure arriving after success does not override it"""
+        payment = Payment.objects.create(
+            order=self.order,
+            user=self.user,
+            amount=Decimal('10.00'),
+            stripe_payment_intent_id='pi_transition_test'
+        )
+        
+        self.assertTrue(transition_payment(payment, 'succeeded', stripe_charge_id='ch_1'))
+        self.assertFalse(transition_payment(payment, 'failed', error_message='Card declined'))
+        
+        payment = Payment.objects.get(id=payment.id)
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertEqual(payment.stripe_charge_id, 'ch_1')
+        self.assertIsNotNone(payment.paid_at)
+        self.assertIsNone(payment.error_message)
+    
+    def test_update_goes_through_transitions(self):
+        """Test PATCH on an order applies compare-and-set transitions with their events"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('order-detail', kwargs={'pk': self.order.id})
+        
+        response = client.patch(url, {'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'shipped')
+        self.assertIsNotNone(response.data['shipped_at'])
+        self.assertTrue(OutboxEvent.objects.filter(topic='order.status_changed').exists())
+        
+        # Refused moves change nothing, including the valid part of the request
+        response = client.patch(url, {'status': 'delivered', 'payment_status': 'refunded'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual((order.status, order.payment_status), ('shipped', 'pending'))
+        
+        response = client.patch(url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @patch('stripe.PaymentIntent.retrieve')
+    def test_payment_retried_after_failure(self, mock_retrieve):
+        """Test a success webhook after a failure webhook still marks the order paid"""
+        Payment.objects.create(
+            order=self.order,
+            user=self.user,
+            amount=Decimal('10.00'),
+            stripe_payment_intent_id='pi_retry_test'
+        )
+        
+        def webhook(event_id, event_type, **intent):
+            event = Mock(id=event_id, type=event_type)
+            event.data.object = Mock(id='pi_retry_test', **intent)
+            event.data.to_dict.return_value = {}
+            return StripeWebhookService.handle_event(event)
+        
+        webhook('evt_failed', 'payment_intent.payment_failed', last_payment_error={'message': 'Card declined'})
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(order.payment_status, 'failed')
+        
+        mock_retrieve.return_value = Mock(id='pi_retry_test', status='succeeded', latest_charge='ch_retry')
+        self.assertTrue(webhook('evt_succeeded', 'payment_intent.succeeded').processed)
+        
+        payment = Payment.objects.get(stripe_payment_intent_id='pi_retry_test')
+        self.assertEqual((payment.status, payment.stripe_charge_id), ('succeeded', 'ch_retry'))
+        self.assertIsNotNone(payment.paid_at)
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual((order.status, order.payment_status), ('confirmed', 'paid'))
+
+
+class ArchiveOrdersTestCase(TestCase):
+    """Tests for the archive_orders command"""
+    
+    def setUp(self):
+        """Set up an order from three years ago and a recent one"""
+        self.user = CustomUser.objects.create_user(
+            username='archiveuser',
+            email='archive@example.com',
+            password='testpass123'
+        )
+        product = Product.objects.create(
+            id=700,
+            product_display_name="Archived Product",
+            gender="Men",
+            master_category="Apparel",
+            sub_category="Topwear",
+            article_type="Shirts",
+            base_colour="Blue",
+            season="Summer",
+            year=2022,
+            usage="Casual",
+            price=10.00
+        )
+        self.orders = []
+        for age in [timedelta(days=3 * 365), timedelta(days=1)]:
+            order = Order.objects.create(
+                user=self.user,
+                order_number=allocate_order_number(),
+                status='delivered',
+                shipping_address='1 Archive Street',
+                shipping_city='Rennes',
+                shipping_postal_code='35000',
+                shipping_country='France'
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=2, price_per_unit=Decimal('10.00'))
+            Order.objects.filter(id=order.id).update(created_at=timezone.now() - age)
+            self.orders.append(order)
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+    
+    def test_archive_old_months(self):
+        """Test old orders are exported with their items, then deleted"""
+        old, recent = self.orders
+        out = StringIO()
+        call_command('archive_orders', '--keep-months', '24', '--output-dir', self.output_dir.name, stdout=out)
+        self.assertIn('Archived 1 orders', out.getvalue())
+        
+        month = Order.objects.filter(id=recent.id).values_list('created_at', flat=True).get()
+        self.assertFalse(Order.objects.filter(id=old.id).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id=old.id).exists())
+        self.assertEqual(month.date(), (timezone.now() - timedelta(days=1)).date())
+        
+        archives = os.listdir(os.path.join(self.output_dir.name, 'orders'))
+        self.assertEqual(len(archives), 1)
+        with gzip.open(os.path.join(self.output_dir.name, 'orders', archives[0]), 'rt', encoding='utf-8') as archive:
+            lines = [json.loads(line) for line in archive]
+        self.assertEqual([line['order_number'] for line in lines], [old.order_number])
+        self.assertEqual(lines[0]['items'][0]['quantity'], 2)
+        self.assertIsNone(lines[0]['payment'])
+    
+    def read_archives(self):
+        directory = os.path.join(self.output_dir.name, 'orders')
+        archives = {}
+        for name in sorted(os.listdir(directory)):
+            with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as archive:
+                archives[name] = [json.loads(line) for line in archive]
+        return archives
+    
+    def test_refunds_and_redemptions_archived(self):
+        """Test records deleted by the cascade are part of the archive"""
+        old = self.orders[0]
+        payment = Payment.objects.create(
+            order=old, user=self.user, stripe_payment_intent_id='pi_archived', amount=Decimal('20.00'), status='refunded'
+        )
+        Refund.objects.create(payment=payment, stripe_refund_id='re_archived', amount=Decimal('5.00'), status='succeeded')
+        promotion = Promotion.objects.create(name="Old sale", code='OLDSALE', rate='0.10')
+        PromotionRedemption.objects.create(order=old, promotion=promotion, discount_amount=Decimal('2.00'))
+        
+        call_command('archive_orders', '--output-dir', self.output_dir.name, stdout=StringIO())
+        self.assertFalse(Refund.objects.exists())
+        self.assertFalse(PromotionRedemption.objects.exists())
+        
+        [order] = next(iter(self.read_archives().values()))
+        self.assertEqual(order['payment']['refunds'][0]['stripe_refund_id'], 're_archived')
+        self.assertEqual(order['payment']['refunds'][0]['amount'], '5.00')
+        self.assertEqual(order['promotion_redemptions'][0]['promotion_code'], 'OLDSALE')
+        self.assertEqual(order['promotion_redemptions'][0]['discount_amount'], '2.00')
+    
+    def test_rerun_writes_part_file(self):
+        """Test archiving a month again never overwrites its earlier archive"""
+        old = self.orders[0]
+        old_created_at = Order.objects.filter(id=old.id).values_list('created_at', flat=True).get()
+        call_command('archive_orders', '--output-dir', self.output_dir.name, stdout=StringIO())
+        
+        late = Order.objects.create(
+            user=self.user,
+            order_number=allocate_order_number(),
+            shipping_address='1 Archive Street',
+            shipping_city='Rennes',
+            shipping_postal_code='35000',
+            shipping_country='France'
+        )
+        Order.objects.filter(id=late.id).update(created_at=old_created_at)
+        call_command('archive_orders', '--output-dir', self.output_dir.name, stdout=StringIO())
+        
+        archives = self.read_archives()
+        month = f"{timezone.localtime(old_created_at):%Y-%m}"
+        self.assertEqual(sorted(archives), [f"orders-{month}.ndjson.gz", f"orders-{month}.part-2.ndjson.gz"])
+        self.assertEqual(archives[f"orders-{month}.ndjson.gz"][0]['id'], old.id)
+        self.assertEqual(archives[f"orders-{month}.part-2.ndjson.gz"][0]['id'], late.id)
+    
+    def test_dry_run(self):
+        """Test --dry-run lists months without touching the orders"""
+        out = StringIO()
+        call_command('archive_orders', '--dry-run', '--output-dir', self.output_dir.name, stdout=out)
+        self.assertIn('12 months would be archived', out.getvalue())
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(os.listdir(self.output_dir.name))
+
+
+class OrderSearchTestCase(TestCase):
+    """Tests for the support order search (API and admin)"""
+    
+    def setUp(self):
+        """Set up staff user and customers with orders"""
+        self.client = APIClient()
+        self.url = reverse('order-search')
+        self.staff = CustomUser.objects.create_user(
+            username='support',
+            email='support@example.com',
+            password='testpass123',
+            is_staff=True,
+            is_superuser=True
+        )
+        self.alice = CustomUser.objects.create_user(
+            username='alice',
+            email='alice.martin@example.com',
+            password='testpass123'
+        )
+        self.bob = CustomUser.objects.create_user(
+            username='bob',
+            email='bob@example.org',
+            password='testpass123'
+        )
+        self.orders = [
+            Order.objects.create(
+                user=user,
+                order_number=allocate_order_number(),
+                shipping_address='1 Support Street',
+                shipping_city='Nantes',
+                shipping_postal_code='44000',
+                shipping_country='France'
+            )
+            for user in [self.alice, self.alice, self.bob]
+        ]
+    
+    def test_exact_order_number(self):
+        """Test an exact (case-insensitive) order number returns that order only"""
+        order = self.orders[0]
+        results, has_more = search_orders(order.order_number.lower())
+        self.assertEqual(results, [order])
+        self.assertFalse(has_more)
+    
+    def test_partial_email(self):
+        """Test a fragment of the email finds the user's orders, newest first"""
+        results, has_more = search_orders('MARTIN@')
+        self.assertEqual([order.id for order in results], [self.orders[1].id, self.orders[0].id])
+        self.assertFalse(has_more)
+        
+        results, has_more = search_orders('martin', limit=1)
+        self.assertEqual([order.id for order in results], [self.orders[1].id])
+        self.assertTrue(has_more)
+    
+    def test_partial_order_number_and_username(self):
+        """Test order number and username matches are merged without duplicates"""
+        prefix = self.orders[0].order_number[:4]
+        results, _ = search_orders(prefix)
+        self.assertEqual({order.id for order in results}, {order.id for order in self.orders})
+        
+        results, _ = search_orders('bob')
+        self.assertEqual(results, [self.orders[2]])
+    
+    def test_fragment_shared_by_many_users(self):
+        """Test a fragment matching more users than the limit still finds the newest orders"""
+        newest = []
+        for index in range(5):
+            user = CustomUser.objects.create_user(
+                username=f'bulkbuyer{index}',
+                email=f'bulkbuyer{index}@shared-domain.example',
+                password='testpass123'
+            )
+            newest.append(Order.objects.create(
+                user=user,
+                order_number=allocate_order_number(),
+                shipping_address='1 Support Street',
+                shipping_city='Nantes',
+                shipping_postal_code='44000',
+                shipping_country='France'
+            ))
+        results, has_more = search_orders('shared-domain', limit=2)
+        self.assertEqual([order.id for order in results], [newest[4].id, newest[3].id])
+        self.assertTrue(has_more)
+    
+    def test_short_fragment_not_searched(self):
+        """Test fragments under 3 characters only match exact order numbers"""
+        self.assertEqual(search_orders('al'), ([], False))
+        self.assertEqual(search_orders('  '), ([], False))
+    
+    def test_search_endpoint(self):
+        """Test the endpoint is staff only and returns has_more"""
+        self.client.force_authenticate(user=self.alice)
+        response = self.client.get(self.url, {'q': 'alice'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(self.url, {'q': 'alice', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data['results']], [self.orders[1].id])
+        self.assertEqual(response.data['results'][0]['user_username'], 'alice')
+        self.assertTrue(response.data['has_more'])
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'q': 'alice', 'limit': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_admin_search(self):
+        """Test the admin changelist search uses the indexed lookup"""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:orders_order_changelist'), {'q': 'bob@'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [order.id for order in response.context['cl'].result_list], [self.orders[2].id]
+        )
+
+
+class AccountingExportTestCase(TestCase):
+    """Tests for the streaming accounting export"""
+    
+    def setUp(self):
+        """Set up finance user and orders with lines and a payment"""
+        self.client = APIClient()
+        self.url = reverse('order-export')
+        self.staff = CustomUser.objects.create_user(
+            username='finance',
+            email='finance@example.com',
+            password='testpass123',
+            is_staff=True,
+            is_superuser=True
+        )
+        self.customer = CustomUser.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpass123'
+        )
+        self.product = Product.objects.create(
+            id=9101,
+            gender='Men',
+            master_category='Apparel',
+            sub_category='Topwear',
+            article_type='Tshirts',
+            base_colour='Blue',
+            season='Summer',
+            year=2024,
+            usage='Casual',
+            product_display_name='Ledger Tee',
+            price=Decimal('20.00')
+        )
+        self.orders = []
+        for days_ago in (3, 2, 1):
+            order = Order.objects.create(
+                user=self.customer,
+                order_number=allocate_order_number(),
+                final_amount=Decimal('40.00'),
+                shipping_address='1 Ledger Lane',
+                shipping_city='Paris',
+                shipping_postal_code='75002',
+                shipping_country='France'
+            )
+            for quantity in (1, 1):
+                OrderItem.objects.create(
+                    order=order, product=self.product, quantity=quantity, price_per_unit=Decimal('20.00')
+                )
+            Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+            self.orders.append(order)
+        Payment.objects.create(
+            order=self.orders[0],
+            user=self.customer,
+            stripe_payment_intent_id='pi_ledger',
+            amount=Decimal('40.00'),
+            status='succeeded'
+        )
+        self.client.force_authenticate(user=self.staff)
+    
+    def read_ndjson(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    
+    def test_requires_admin(self):
+        """Test customers cannot export"""
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_csv_rows_joined(self):
+        """Test one CSV row per order line, with order and payment columns"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('cursor,order_id,order_number'))
+        self.assertEqual(len(lines), 7)
+        self.assertIn('pi_ledger', lines[1])
+        self.assertIn('Ledger Tee', lines[1])
+    
+    def test_date_range(self):
+        """Test date_from/date_to keep the orders of those days only"""
+        day = (timezone.localtime() - timedelta(days=2)).date()
+        response = self.client.get(self.url, {
+            'date_from': day.isoformat(), 'date_to': day.isoformat(), 'export_format': 'ndjson'
+        })
+        rows = self.read_ndjson(response)
+        self.assertEqual({row['order_id'] for row in rows}, {self.orders[1].id})
+        self.assertIsNone(rows[0]['payment_intent_id'])
+        
+        response = self.client.get(self.url, {'date_from': '2026-02-01', 'date_to': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_resume_after_cursor(self):
+        """Test resuming after any row returns exactly the remaining rows"""
+        rows = self.read_ndjson(self.client.get(self.url, {'export_format': 'ndjson'}))
+        self.assertEqual(len(rows), 6)
+        for position, row in enumerate(rows):
+            resumed = self.read_ndjson(
+                self.client.get(self.url, {'export_format': 'ndjson', 'after': row['cursor']})
+            )
+            self.assertEqual(resumed, rows[position + 1:])
+        
+        response = self.client.get(self.url, {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_gzip(self):
+        """Test gzip exports decompress to the same NDJSON"""
+        plain = b''.join(self.client.get(self.url, {'export_format': 'ndjson'}).streaming_content)
+        response = self.client.get(self.url, {'export_format': 'ndjson', 'gzip': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.ndjson.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+    
+    def test_admin_export(self):
+        """Test the admin export view streams the same rows"""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('admin:orders_order_accounting_export'), {'export_format': 'ndjson'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.read_ndjson(response)), 6)
+
+
+class OrderListPaginationTestCase(TestCase):
+    """Tests for cursor-paginated, cached order lists"""
+    
+    def setUp(self):
+        """Set up a customer with orders of 0 to 4 items"""
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='b2buser',
+            email='b2b@example.com',
+            password='testpass123'
+        )
+        self.staff = CustomUser.objects.create_user(
+            username='b2bstaff',
+            email='b2bstaff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.product = Product.objects.create(
+            id=9201,
+            gender='Men',
+            master_category='Apparel',
+            sub_category='Topwear',
+            article_type='Tshirts',
+            base_colour='Grey',
+            season='Winter',
+            year=2024,
+            usage='Casual',
+            product_display_name='Bulk Tee',
+            price=Decimal('10.00')
+        )
+        self.orders = []
+        for item_count in range(5):
+            order = Order.objects.create(
+                user=self.user,
+                order_number=allocate_order_number(),
+                shipping_address='1 Wholesale Way',
+                shipping_city='Lille',
+                shipping_postal_code='59000',
+                shipping_country='France'
+            )
+            for _ in range(item_count):
+                OrderItem.objects.create(order=order, product=self.product, quantity=1, price_per_unit=Decimal('10.00'))
+            self.orders.append(order)
+        self.client.force_authenticate(user=self.user)
+    
+    def test_cursor_pages(self):
+        """Test pages follow next links newest first with annotated item counts"""
+        url = reverse('order-my-orders') + '?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        self.assertEqual([order['id'] for order in seen], [order.id for order in reversed(self.orders)])
+        self.assertEqual([order['item_count'] for order in seen], [4, 3, 2, 1, 0])
+    
+    def test_first_page_cached(self):
+        """Test the first page takes one query, then none until invalidated"""
+        for url in (reverse('order-list'), reverse('order-my-orders')):
+            with self.assertNumQueries(1):
+                first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+            self.assertEqual(len(first.data['results']), 5)
+    
+    def test_cache_invalidated_by_writes(self):
+        """Test status changes and new orders show up on the cached first page"""
+        url = reverse('order-my-orders')
+        self.client.get(url)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('order-cancel-order', args=[self.orders[0].id]))
+        statuses = {order['id']: order['status'] for order in self.client.get(url).data['results']}
+        self.assertEqual(statuses[self.orders[0].id], 'cancelled')
+        
+        self.client.force_authenticate(user=self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('order-bulk-transition'), {'order_ids': [self.orders[1].id], 'status': 'shipped'}, format='json'
+            )
+        self.client.force_authenticate(user=self.user)
+        statuses = {order['id']: order['status'] for order in self.client.get(url).data['results']}
+        self.assertEqual(statuses[self.orders[1].id], 'shipped')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                user=self.user,
+                order_number=allocate_order_number(),
+                shipping_address='1 Wholesale Way',
+                shipping_city='Lille',
+                shipping_postal_code='59000',
+                shipping_country='France'
+            )
+        self.assertEqual(self.client.get(url).data['results'][0]['id'], order.id)
+
+    def test_cache_invalidated_by_item_writes(self):
+        """Test items added or removed on their own update the cached item counts"""
+        url = reverse('order-my-orders')
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=self.orders[0], product=self.product, quantity=1, price_per_unit=Decimal('10.00'))
+        counts = {order['id']: order['item_count'] for order in self.client.get(url).data['results']}
+        self.assertEqual(counts[self.orders[0].id], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.get(pk=self.orders[1].items.get().pk).delete()
+        counts = {order['id']: order['item_count'] for order in self.client.get(url).data['results']}
+        self.assertEqual(counts[self.orders[1].id], 0)
+
+
+class OrderItemSnapshotTestCase(TestCase):
+    """Tests for the product snapshot kept on order items"""
+    
+    def setUp(self):
+        """Set up user, product and an order placed through the API"""
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='snapshotuser',
+            email='snapshot@example.com',
+            password='testpass123'
+        )
+        self.product = Product.objects.create(
+            id=9301,
+            gender='Women',
+            master_category='Footwear',
+            sub_category='Shoes',
+            article_type='Sandals',
+            base_colour='Brown',
+            season='Summer',
+            year=2024,
+            usage='Casual',
+            product_display_name='Beach Sandal',
+            price=Decimal('25.00'),
+            image='products/9301.jpg'
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('order-list'), {
+            'items': [{'product_id': self.product.id, 'quantity': 2}],
+            'shipping_address': '1 Snapshot Street',
+            'shipping_city': 'Nice',
+            'shipping_postal_code': '06000',
+            'shipping_country': 'France'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.order = Order.objects.get(id=response.data['id'])
+    
+    def test_snapshot_captured(self):
+        """Test checkout stores name, image path and article type on the item"""
+        item = self.order.items.get()
+        self.assertEqual(item.product_name, 'Beach Sandal')
+        self.assertEqual(item.product_image, 'products/9301.jpg')
+        self.assertEqual(item.product_article_type, 'Sandals')
+    
+    def test_rendering_survives_product_changes(self):
+        """Test orders render from the snapshot without reading the catalog"""
+        Product.objects.filter(id=self.product.id).update(product_display_name='Renamed Sandal')
+        url = reverse('order-detail', args=[self.order.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.data['items'][0]['product_name'], 'Beach Sandal')
+        self.assertFalse(any('shop_product' in query['sql'] for query in queries.captured_queries))
+        
+        self.product.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['items'][0]['product'])
+        self.assertEqual(response.data['items'][0]['product_name'], 'Beach Sandal')
+        
+        item = OrderItem.objects.get(order=self.order)
+        self.assertEqual(str(item), f"Beach Sandal (Order #{self.order.order_number})")
@@ -0,0 +1,207 @@
+"""
+Order and payment state machine.
+
+Each transition table lists, for each target status, the statuses a row
+may move from and the timestamp set on arrival:
+
+    ORDER_TRANSITIONS          Order.status
+    ORDER_PAYMENT_TRANSITIONS  Order.payment_status
+    PAYMENT_TRANSITIONS        Payment.status
+
+Transitions are compare-and-set: one UPDATE ... WHERE id = %s AND status
+IN (allowed sources) writing only the changed columns. The database
+validates the move, so a webhook and a user action racing on the same
+row cannot both win and neither needs a row lock or a re-read. Callers
+get a boolean telling whether their transition won; the in-memory
+instance is only updated when it did.
+
+Every winning transition records a '<model>.<field>_changed' outbox event
+in the same transaction (see the outbox app).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, transaction
+from django.utils import timezone
+
+from outbox.services import record_event, record_events
+
+from .caching import invalidate_order_lists
+from .models import Order
+
+ORDER_TRANSITIONS = {
+    'confirmed': {'from': ('pending',)},
+    'shipped': {'from': ('pending', 'confirmed'), 'timestamp': 'shipped_at'},
+    'delivered': {'from': ('shipped',), 'timestamp': 'delivered_at'},
+    'cancelled': {'from': ('pending',)},
+}
+
+ORDER_PAYMENT_TRANSITIONS = {
+    'paid': {'from': ('pending', 'failed')},
+    'failed': {'from': ('pending',)},
+    'refunded': {'from': ('paid',)},
+}
+
+PAYMENT_TRANSITIONS = {
+    'processing': {'from': ('pending',)},
+    # A failed attempt can be retried on the same PaymentIntent
+    'succeeded': {'from': ('pending', 'processing', 'failed'), 'timestamp': 'paid_at'},
+    'failed': {'from': ('pending', 'processing')},
+    'cancelled': {'from': ('pending', 'processing')},
+    'refunded': {'from': ('succeeded',)},
+}
+
+# Identifiers copied into change events, when the model has them
+EVENT_REFERENCE_FIELDS = ('order_number', 'order_id', 'user_id')
+
+# Outcomes of bulk_transition
+UPDATED = 'updated'
+INVALID_TRANSITION = 'invalid_transition'
+NOT_FOUND = 'not_found'
+
+
+def bulk_transition(order_ids, target):
+    """
+    Move several orders to a target status in one UPDATE.
+
+    Orders whose current status does not allow the transition are left
+    untouched. Uses UPDATE ... RETURNING (PostgreSQL, SQLite 3.35+) to
+    learn which orders moved and records their change events with one
+    INSERT in the same transaction; a second query reads the status of
+    the others, only when there are any.
+
+    Args:
+        order_ids: Order IDs (duplicates are ignored)
+        target: Key of ORDER_TRANSITIONS
+
+    Returns:
+        List of (order_id, outcome, current status or None) in request
+        order; outcome is UPDATED, INVALID_TRANSITION or NOT_FOUND
+    """
+    transition = ORDER_TRANSITIONS[target]
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return []
+
+    now = timezone.now()
+    quote = connection.ops.quote_name
+    assignments = {'status': target, 'updated_at': now}
+    if 'timestamp' in transition:
+        assignments[transition['timestamp']] = now
+
+    sql = (
+        f"UPDATE {quote(Order._meta.db_table)} "
+        f"SET {', '.join(f'{quote(column)} = %s' for column in assignments)} "
+        f"WHERE {quote('id')} IN ({', '.join(['%s'] * len(order_ids))}) "
+        f"AND {quote('status')} IN ({', '.join(['%s'] * len(transition['from']))}) "
+        f"RETURNING {quote('id')}, {quote('order_number')}, {quote('user_id')}"
+    )
+    params = [
+        Order._meta.get_field(column).get_db_prep_save(value, connection)
+        for column, value in assignments.items()
+    ]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + order_ids + list(transition['from']))
+            rows = cursor.fetchall()
+        record_events('order.status_changed', Order, [
+            (pk, {'id': pk, 'order_number': order_number, 'user_id': user_id, **assignments})
+            for pk, order_number, user_id in rows
+        ])
+        invalidate_order_lists(user_id for _, _, user_id in rows)
+    updated = {row[0] for row in rows}
+
+    current = {}
+    if len(updated) < len(order_ids):
+        current = dict(
+            Order.objects.filter(id__in=[pk for pk in order_ids if pk not in updated]).values_list('id', 'status')
+        )
+
+    results = []
+    for pk in order_ids:
+        if pk in updated:
+            results.append((pk, UPDATED, target))
+        elif pk in current:
+            results.append((pk, INVALID_TRANSITION, current[pk]))
+        else:
+            results.append((pk, NOT_FOUND, None))
+    return results
+
+
+def _has_field(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def compare_and_set(instance, field, transitions, target, **changes):
+    """
+    Move one row to a target state if its current state allows it.
+
+    Args:
+        instance: Model instance (only its pk is used in the WHERE clause)
+        field: State column, e.g. 'status'
+        transitions: Transition table for that column
+        target: Key of the transition table
+        **changes: Other columns written by the same UPDATE
+
+    Returns:
+        True if this call made the transition, False if the row was
+        missing or in a state the transition does not start from
+    """
+    transition = transitions[target]
+    model = type(instance)
+    now = timezone.now()
+    values = {field: target, **changes}
+    if 'timestamp' in transition:
+        values.setdefault(transition['timestamp'], now)
+    # update() bypasses auto_now
+    if _has_field(model, 'updated_at'):
+        values['updated_at'] = now
+
+    with transaction.atomic():
+        won = model._default_manager.filter(
+            pk=instance.pk, **{f'{field}__in': transition['from']}
+        ).update(**values) == 1
+        if won:
+            for name, value in values.items():
+                setattr(instance, name, value)
+            record_event(f"{model._meta.model_name}.{field}_changed", instance, {
+                'id': instance.pk,
+                **{name: getattr(instance, name) for name in EVENT_REFERENCE_FIELDS if hasattr(instance, name)},
+                **values,
+            })
+            if model is Order:
+                invalidate_order_lists([instance.user_id])
+    return won
+
+
+def transition_order(order, target, **changes):
+    """Compare-and-set Order.status (see ORDER_TRANSITIONS)."""
+    return compare_and_set(order, 'status', ORDER_TRANSITIONS, target, **changes)
+
+
+def transition_order_payment(order, target, **changes):
+    """Compare-and-set Order.payment_status (see ORDER_PAYMENT_TRANSITIONS)."""
+    return compare_and_set(order, 'payment_status', ORDER_PAYMENT_TRANSITIONS, target, **changes)
+
+
+def transition_payment(payment, target, **changes):
+    """Compare-and-set Payment.status (see PAYMENT_TRANSITIONS)."""
+    return compare_and_set(payment, 'status', PAYMENT_TRANSITIONS, target, **changes)
+
+
+def mark_order_paid(order):
+    """
+    Record a successful payment: payment_status becomes paid and a pending
+    order is confirmed. An order that moved on meanwhile (shipped,
+    cancelled) keeps its status.
+
+    Returns:
+        True if the order was not already marked paid
+    """
+    with transaction.atomic():
+        paid = transition_order_payment(order, 'paid')
+        if paid:
+            transition_order(order, 'confirmed')
+    return paid
@@ -1,14 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet, OrderItemViewSet
+from .views import CartViewSet, OrderViewSet, OrderItemViewSet
 
 # URL routing configuration for orders app
 # DefaultRouter automatically generates CRUD endpoints for registered ViewSets
-# Plus custom actions defined in ViewSets (my_orders, cancel_order, mark_as_shipped, confirm_delivery)
+# Plus custom actions defined in ViewSets (my_orders, quote, cancel_order, mark_as_shipped, confirm_delivery, bulk_transition, search, export)
+# The Redis-backed cart lives at cart/ (list, add, cart/<product_id>/ update/remove, clear)
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'order-items', OrderItemViewSet, basename='order-item')
+router.register(r'cart', CartViewSet, basename='cart')
 
 urlpatterns = [
     path('', include(router.urls)),
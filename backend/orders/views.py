@@ -1,44 +1,115 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.utils import timezone
-import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 import logging
 
-from .models import Order, OrderItem
+from core.idempotency import IdempotencyMixin
+from core.pagination import CreatedAtCursorPagination
+from outbox.services import record_event
+from promotions.services import PromotionError, redeem_promotions
+
+from . import cart
+from .accounting import accounting_export_response
+from .caching import first_page_cache_key, get_cache_timeout
+from .models import Order, OrderItem, product_snapshot
+from .numbering import allocate_order_number
+from .pricing import fetch_products, price_cart
+from .search import search_orders
+from .services import with_item_count
+from .transitions import UPDATED, bulk_transition, transition_order, transition_order_payment
 from .serializers import (
+    CartLineSerializer,
+    OrderBulkTransitionSerializer,
+    OrderExportSerializer,
     OrderSerializer,
     OrderListSerializer,
     OrderCreateSerializer,
+    OrderQuoteSerializer,
     OrderUpdateSerializer,
-    OrderItemSerializer
+    OrderItemSerializer,
+    QuoteSerializer
 )
 from shop.models import Product
 
 logger = logging.getLogger('orders')
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(IdempotencyMixin, viewsets.ModelViewSet):
     """
     ViewSet for order management.
     Provides CRUD operations for orders with custom actions.
     Only authenticated users can access their own orders.
+    Order creation honours the Idempotency-Key header.
+    Order lists are cursor-paginated and their first page is cached per user.
     """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    idempotent_actions = ('create',)
     
     def get_queryset(self):
         """
         Return only orders belonging to the current user.
-        Optimized with select_related for user and prefetch_related for items.
+        Optimized with select_related for user and prefetch_related for items
+        (rendered from their product snapshot, without the product table);
+        lists get an item_count annotation instead of the items.
         """
-        return Order.objects.filter(
+        orders = Order.objects.filter(
             user=self.request.user
         ).select_related(
             'user'
-        ).prefetch_related(
-            'items__product'
         )
+        if self.action in ('list', 'my_orders'):
+            return with_item_count(orders)
+        return orders.prefetch_related('items')
+    
+    def _cached_first_page(self, request, build):
+        """
+        Serve the user's first page from the cache (see orders/caching.py).
+        Later pages, addressed by cursor, always come from the database.
+        """
+        if request.query_params.get(self.paginator.cursor_query_param):
+            return build()
+        key = first_page_cache_key(request.user.id, self.action, self.paginator.get_page_size(request))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, get_cache_timeout())
+        return response
+    
+    def list(self, request, *args, **kwargs):
+        """List the user's orders, newest first (cursor-paginated)"""
+        return self._cached_first_page(request, lambda: super(OrderViewSet, self).list(request, *args, **kwargs))
+    
+    def update(self, request, *args, **kwargs):
+        """
+        Change status and/or payment_status. Each change is a compare-and-set
+        transition (orders.transitions) that records its outbox event; both
+        are applied or neither. Other fields cannot be changed.
+        """
+        order = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic():
+            for field, transition in (('status', transition_order), ('payment_status', transition_order_payment)):
+                target = serializer.validated_data.get(field)
+                if target is None or target == getattr(order, field):
+                    continue
+                current = getattr(order, field)
+                if not transition(order, target):
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': f'Cannot change {field} from {current} to {target}'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+        return Response(OrderSerializer(order).data)
     
     def get_serializer_class(self):
         """Use appropriate serializer based on action"""
@@ -46,14 +117,22 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderListSerializer
         elif self.action == 'create':
             return OrderCreateSerializer
+        elif self.action == 'bulk_transition':
+            return OrderBulkTransitionSerializer
+        elif self.action == 'export':
+            return OrderExportSerializer
+        elif self.action == 'quote':
+            return OrderQuoteSerializer
         elif self.action in ['partial_update', 'update']:
             return OrderUpdateSerializer
         return OrderSerializer
     
     def create(self, request, *args, **kwargs):
         """
-        Create a new order from cart items.
-        Optimized to fetch all products at once to avoid N+1 queries.
+        Create a new order from cart items in a single pass:
+        one product fetch shared by validation and pricing, one order INSERT
+        with its final totals, one bulk INSERT of the items, and a response
+        rendered from the objects in memory, all in one transaction.
         """
         logger.info(f"Order creation initiated by user {request.user.id} ({request.user.email})")
         
@@ -61,64 +140,84 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         try:
-            # Fetch all products at once to avoid N+1 queries
-            product_ids = [item['product_id'] for item in serializer.validated_data['items']]
-            products = {
-                p.id: p for p in Product.objects.filter(id__in=product_ids)
-            }
+            from_cart = serializer.validated_data['from_cart']
+            if from_cart:
+                cart_key = cart.user_cart_key(request.user.id)
+                cart_lines = cart.get_cart(cart_key)
+                items = [
+                    {'product_id': product_id, 'quantity': quantity}
+                    for product_id, quantity in sorted(cart_lines.items())
+                ]
+                if not items:
+                    return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                items = serializer.validated_data['items']
             
-            # Verify all products exist
-            if len(products) != len(product_ids):
-                missing_ids = set(product_ids) - set(products.keys())
-                logger.warning(
-                    f"Order creation failed for user {request.user.id}: "
-                    f"Products not found: {missing_ids}"
-                )
-                return Response(
-                    {'error': f'Products not found: {missing_ids}'},
-                    status=status.HTTP_400_BAD_REQUEST
+            with transaction.atomic():
+                # The only product query: existence check and pricing
+                products, missing_ids = fetch_products(item['product_id'] for item in items)
+                if missing_ids:
+                    logger.warning(
+                        f"Order creation failed for user {request.user.id}: "
+                        f"Products not found: {missing_ids}"
+                    )
+                    return Response(
+                        {'error': f'Products not found: {missing_ids}'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                # Same pricing code as the quote endpoint
+                quote = price_cart(
+                    items,
+                    products,
+                    serializer.validated_data['shipping_country'],
+                    serializer.validated_data.get('coupon_code')
                 )
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
-                shipping_address=serializer.validated_data['shipping_address'],
-                shipping_city=serializer.validated_data['shipping_city'],
-                shipping_postal_code=serializer.validated_data['shipping_postal_code'],
-                shipping_country=serializer.validated_data['shipping_country'],
-            )
-            
-            logger.info(f"Order {order.order_number} created with ID {order.id}")
-            
-            total_amount = 0
-            order_items = []
-            
-            # Prepare order items for bulk creation
-            for item_data in serializer.validated_data['items']:
-                product = products[item_data['product_id']]
-                quantity = item_data['quantity']
-                price_per_unit = product.price
-                item_total_price = quantity * price_per_unit
                 
-                order_item = OrderItem(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price_per_unit=price_per_unit,
-                    total_price=item_total_price,  # Calculate manually
+                order = Order.objects.create(
+                    user=request.user,
+                    order_number=allocate_order_number(),
+                    shipping_address=serializer.validated_data['shipping_address'],
+                    shipping_city=serializer.validated_data['shipping_city'],
+                    shipping_postal_code=serializer.validated_data['shipping_postal_code'],
+                    shipping_country=serializer.validated_data['shipping_country'],
+                    total_amount=quote['total_amount'],
+                    discount_amount=quote['discount_amount'],
+                    tax_amount=quote['tax_amount'],
+                    final_amount=quote['final_amount'],
                 )
-                total_amount += item_total_price
-                order_items.append(order_item)
-            
-            # Bulk create order items
-            OrderItem.objects.bulk_create(order_items)
-            logger.debug(f"Created {len(order_items)} items for order {order.order_number}")
+                
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=products[line['product_id']],
+                        quantity=line['quantity'],
+                        price_per_unit=line['unit_price'],
+                        total_price=line['line_total'],
+                        **product_snapshot(products[line['product_id']]),
+                    )
+                    for line in quote['lines']
+                ])
+                
+                # Conditional usage counter UPDATE: rolls the order back if a
+                # limited promotion was used up by a concurrent checkout
+                redeem_promotions(order, quote['promotions'])
+                
+                # Published to downstream consumers by the outbox relay
+                record_event('order.created', order, {
+                    'id': order.id,
+                    'order_number': order.order_number,
+                    'user_id': order.user_id,
+                    'status': order.status,
+                    'payment_status': order.payment_status,
+                    'final_amount': order.final_amount,
+                    'item_count': len(order_items),
+                    'created_at': order.created_at,
+                })
             
-            # Update order amounts
-            order.total_amount = total_amount
-            order.calculate_final_amount()
-            order.save()
+            if from_cart:
+                # Lines added or changed during checkout stay in the cart
+                cart.remove_ordered_lines(cart_key, cart_lines)
             
             logger.info(
                 f"Order {order.order_number} completed: "
@@ -126,39 +225,69 @@ class OrderViewSet(viewsets.ModelViewSet):
                 f"User: {request.user.email}"
             )
             
-            # Fetch order with related data for response
-            order = Order.objects.select_related('user').prefetch_related(
-                'items__product'
-            ).get(id=order.id)
-            
+            # Render from memory instead of re-fetching the order and its items
+            order._prefetched_objects_cache = {'items': order_items}
             return Response(
                 OrderSerializer(order).data,
                 status=status.HTTP_201_CREATED
             )
         
+        except PromotionError as e:
+            # Coupon not applicable, or a limited promotion used up meanwhile
+            logger.warning(f"Order creation refused for user {request.user.id}: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            # Left to become a 500: it must not be stored as a replayable
+            # Idempotency-Key answer, nor show internal error text
             logger.error(
                 f"Order creation failed for user {request.user.id}: {str(e)}",
                 exc_info=True
             )
+            raise
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    def quote(self, request):
+        """
+        Price cart lines without creating an order.
+        Uses one product query and the same pricing code as order creation,
+        so the cart page can re-quote on every quantity change.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        items = serializer.validated_data['items']
+        products, missing_ids = fetch_products(item['product_id'] for item in items)
+        if missing_ids:
             return Response(
-                {'error': str(e)},
+                {'error': f'Products not found: {missing_ids}', 'missing': missing_ids},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        try:
+            quote = price_cart(
+                items,
+                products,
+                serializer.validated_data.get('country'),
+                serializer.validated_data.get('coupon_code')
+            )
+        except PromotionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(QuoteSerializer(quote).data)
     
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
-        """Get all orders for the current user"""
-        orders = self.get_queryset().order_by('-created_at')
-        serializer = OrderListSerializer(orders, many=True)
-        return Response(serializer.data)
+        """Get the current user's orders, newest first (cursor-paginated)"""
+        def build():
+            page = self.paginate_queryset(self.get_queryset())
+            return self.get_paginated_response(OrderListSerializer(page, many=True).data)
+        return self._cached_first_page(request, build)
     
     @action(detail=True, methods=['post'])
     def cancel_order(self, request, pk=None):
-        """Cancel an order if it's still pending"""
+        """Cancel an order if it's still pending (compare-and-set on status)"""
         order = self.get_object()
         
-        if order.status != 'pending':
+        if not transition_order(order, 'cancelled'):
             logger.warning(
                 f"Cancel order failed: Order {order.order_number} "
                 f"has status {order.status}, cannot cancel"
@@ -168,9 +297,6 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = 'cancelled'
-        order.save()
-        
         logger.info(
             f"Order {order.order_number} cancelled by user {request.user.email}"
         )
@@ -185,42 +311,219 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Mark order as shipped (admin only)"""
         order = self.get_object()
         
-        if order.status not in ['confirmed', 'pending']:
+        if not transition_order(order, 'shipped'):
             return Response(
                 {'error': 'Only confirmed orders can be shipped'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = 'shipped'
-        order.shipped_at = timezone.now()
-        order.save()
-        
         return Response(
             {'message': 'Order marked as shipped', 'order': OrderSerializer(order).data},
             status=status.HTTP_200_OK
         )
     
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_transition(self, request):
+        """
+        Move many orders to a new status at once (warehouse staff only).
+        
+        Body: {"order_ids": [...], "status": "shipped"}
+        
+        Allowed transitions are checked by a single conditional UPDATE,
+        which also sets shipped_at/delivered_at. Each order gets an outcome:
+        updated, invalid_transition (with its current status) or not_found.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data['status']
+        
+        results = bulk_transition(serializer.validated_data['order_ids'], target)
+        updated_count = sum(1 for _, outcome, _ in results if outcome == UPDATED)
+        logger.info(
+            f"Bulk transition to {target} by {request.user.email}: "
+            f"{updated_count}/{len(results)} orders updated"
+        )
+        
+        return Response({
+            'status': target,
+            'updated_count': updated_count,
+            'results': [
+                {'id': order_id, 'outcome': outcome, 'current_status': current_status}
+                for order_id, outcome, current_status in results
+            ],
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """
+        Stream order lines joined with their order and payment (finance staff only).
+        
+        Query params:
+            date_from, date_to: Order days exported (inclusive, YYYY-MM-DD)
+            export_format: 'csv' (default) or 'ndjson'
+            gzip: 'true' to receive a gzip-compressed file
+            after: cursor column of the last row received, to resume an
+                interrupted export right after that row
+        """
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        
+        logger.info(
+            f"Accounting export {params.get('date_from')}..{params.get('date_to')} "
+            f"by {request.user.email}" + (" (resumed)" if params.get('after') else "")
+        )
+        return accounting_export_response(
+            params.get('date_from'),
+            params.get('date_to'),
+            params.get('after'),
+            export_format=params['export_format'],
+            compress=params['gzip']
+        )
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def search(self, request):
+        """
+        Find any user's orders by order number, email or username (support staff only).
+        
+        Query params: q (exact order number or a fragment of at least
+        3 characters), limit (default and maximum ORDER_SEARCH_LIMIT).
+        Returns newest orders first and has_more instead of a total count.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_limit = getattr(settings, 'ORDER_SEARCH_LIMIT', 50)
+        try:
+            limit = min(int(request.query_params.get('limit', max_limit)), max_limit)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1:
+            return Response(
+                {'error': 'limit must be positive'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        orders, has_more = search_orders(query, limit)
+        return Response({
+            'results': OrderListSerializer(orders, many=True).data,
+            'has_more': has_more,
+        })
+    
     @action(detail=True, methods=['post'])
     def confirm_delivery(self, request, pk=None):
         """Confirm order delivery"""
         order = self.get_object()
         
-        if order.status != 'shipped':
+        if not transition_order(order, 'delivered'):
             return Response(
                 {'error': 'Only shipped orders can be delivered'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = 'delivered'
-        order.delivered_at = timezone.now()
-        order.save()
-        
         return Response(
             {'message': 'Order marked as delivered', 'order': OrderSerializer(order).data},
             status=status.HTTP_200_OK
         )
 
 
+class CartViewSet(viewsets.ViewSet):
+    """
+    Server-side cart stored in Redis (see orders.cart).
+    Authenticated users get their own cart; anonymous visitors are given a
+    cart id in the X-Cart-Id response header and send it back on every call.
+    Every response contains the cart priced like an order.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def _get_cart_key(self, request, create=False):
+        """Return (redis key, anonymous cart id) for the current visitor."""
+        if request.user.is_authenticated:
+            return cart.user_cart_key(request.user.id), None
+        cart_id = request.headers.get(cart.CART_ID_HEADER)
+        if not cart.is_valid_cart_id(cart_id):
+            if not create:
+                return None, None
+            cart_id = cart.new_cart_id()
+        return cart.anonymous_cart_key(cart_id), cart_id
+    
+    def _cart_response(self, key, cart_id, status_code=status.HTTP_200_OK):
+        lines = cart.get_cart(key) if key else {}
+        products, missing_ids = fetch_products(lines)
+        if missing_ids:
+            # Products removed from the catalog drop out of the cart
+            cart.remove_lines(key, missing_ids)
+        items = [
+            {'product_id': product_id, 'quantity': lines[product_id]}
+            for product_id in sorted(lines) if product_id in products
+        ]
+        
+        data = {'cart_id': cart_id, **QuoteSerializer(price_cart(items, products)).data}
+        response = Response(data, status=status_code)
+        if cart_id:
+            response[cart.CART_ID_HEADER] = cart_id
+        return response
+    
+    def list(self, request):
+        """Return the priced cart"""
+        return self._cart_response(*self._get_cart_key(request))
+    
+    def create(self, request):
+        """Add a quantity of a product to the cart"""
+        serializer = CartLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data['product_id']
+        quantity = serializer.validated_data['quantity']
+        
+        if quantity < 1:
+            return Response({'error': 'Quantity must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Product.objects.filter(id=product_id).exists():
+            return Response({'error': f'Product {product_id} does not exist'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        key, cart_id = self._get_cart_key(request, create=True)
+        try:
+            cart.add_line(key, product_id, quantity)
+        except cart.CartFullError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._cart_response(key, cart_id, status.HTTP_201_CREATED)
+    
+    def update(self, request, pk=None):
+        """Set the quantity of a cart line (0 removes it)"""
+        serializer = CartLineSerializer(data={'product_id': pk, 'quantity': request.data.get('quantity')})
+        serializer.is_valid(raise_exception=True)
+        
+        key, cart_id = self._get_cart_key(request, create=True)
+        try:
+            cart.set_line(key, serializer.validated_data['product_id'], serializer.validated_data['quantity'])
+        except cart.CartFullError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._cart_response(key, cart_id)
+    
+    def partial_update(self, request, pk=None):
+        return self.update(request, pk)
+    
+    def destroy(self, request, pk=None):
+        """Remove a line from the cart"""
+        key, cart_id = self._get_cart_key(request)
+        if key:
+            cart.remove_lines(key, [pk])
+        return self._cart_response(key, cart_id)
+    
+    @action(detail=False, methods=['post'])
+    def clear(self, request):
+        """Empty the cart"""
+        key, cart_id = self._get_cart_key(request)
+        if key:
+            cart.clear_cart(key)
+        return self._cart_response(key, cart_id)
+
+
 class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing order items.
@@ -232,12 +535,8 @@ class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """
         Return order items only from user's orders.
-        Optimized with select_related for order and product.
+        Items carry their product snapshot, so the product is not joined.
         """
         return OrderItem.objects.filter(
             order__user=self.request.user
-        ).select_related(
-            'order',
-            'order__user',
-            'product'
         )
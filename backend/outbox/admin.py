@@ -0,0 +1,27 @@
+from django.contrib import admin
+from core.pagination import ApproximateCountPaginator
+from .models import OutboxEvent
+from .relay import requeue_dead_letters
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Admin interface for OutboxEvent inspection (read-only)"""
+    list_display = [
+        'id', 'topic', 'aggregate_type', 'aggregate_id', 'created_at', 'published_at', 'attempts', 'dead_lettered_at'
+    ]
+    list_filter = ['topic', 'aggregate_type', ('dead_lettered_at', admin.EmptyFieldListFilter)]
+    search_fields = ['aggregate_id']
+    readonly_fields = [
+        'topic', 'aggregate_type', 'aggregate_id', 'payload',
+        'created_at', 'published_at', 'attempts', 'last_error', 'dead_lettered_at'
+    ]
+    ordering = ['-id']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected dead-lettered events')
+    def requeue(self, request, queryset):
+        requeued = requeue_dead_letters(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"{requeued} dead-lettered events requeued.")
@@ -0,0 +1,70 @@
+"""
+Django management command running a local stand-in for an HTTP event consumer.
+Usage: python manage.py outbox_http_receiver [--port 8090] [--output received.ndjson] [--fail-rate 0.0]
+
+Accepts the NDJSON batches POSTed by outbox.sinks.HTTPSink, counts
+duplicate event ids (at-least-once delivery) and optionally appends the
+events to a file. --fail-rate answers a share of requests with 503 to
+exercise the relay's retries.
+"""
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run a local HTTP receiver for outbox events (development stand-in)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8090, help='Port to listen on (localhost)')
+        parser.add_argument('--output', default=None, help='Append received events to this NDJSON file')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of batches answered with 503')
+
+    def handle(self, *args, **options):
+        stdout = self.stdout
+        lock = threading.Lock()
+        seen = set()
+        counters = {'events': 0, 'duplicates': 0}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if random.random() < options['fail_rate']:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                events = [json.loads(line) for line in body.decode('utf-8').splitlines() if line]
+                with lock:
+                    for event in events:
+                        counters['events'] += 1
+                        if event['id'] in seen:
+                            counters['duplicates'] += 1
+                        seen.add(event['id'])
+                    if options['output']:
+                        with open(options['output'], 'ab') as output:
+                            output.write(body)
+                    stdout.write(
+                        f"Received {len(events)} events "
+                        f"(total {counters['events']}, duplicates {counters['duplicates']})"
+                    )
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Listening on http://127.0.0.1:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Received {counters['events']} events, {counters['duplicates']} duplicates"
+        ))
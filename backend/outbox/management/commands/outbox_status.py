@@ -0,0 +1,57 @@
+"""
+Django management command to show outbox lag metrics.
+Usage: python manage.py outbox_status [--minutes 5]
+"""
+import statistics
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from outbox.models import OutboxEvent
+from outbox.relay import dead_letters, outbox_lag, pending_events
+
+
+class Command(BaseCommand):
+    help = 'Show the outbox backlog, dead-lettered events and the delivery lag of recently published events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=5, help='Window of published events for delivery lag'
+        )
+
+    def handle(self, *args, **options):
+        lag = outbox_lag()
+        self.stdout.write(f"Backlog: {lag['backlog']} events, oldest unpublished {lag['lag_seconds']:.1f}s ago")
+
+        failing = pending_events().filter(attempts__gt=0)
+        max_attempts = failing.aggregate(max_attempts=Max('attempts'))['max_attempts']
+        if max_attempts:
+            last_error = failing.order_by('id').values_list('last_error', flat=True).first()
+            self.stdout.write(self.style.WARNING(
+                f"Failing head: up to {max_attempts} attempts, last error: {last_error}"
+            ))
+
+        dead = list(dead_letters().order_by('id').values_list('id', 'topic', 'last_error')[:10])
+        if dead:
+            self.stdout.write(self.style.ERROR(
+                f"Dead-lettered: {dead_letters().count()} events (not relayed until requeued)"
+            ))
+            for event_id, topic, last_error in dead:
+                self.stdout.write(f"  #{event_id} {topic}: {last_error}")
+
+        since = timezone.now() - timedelta(minutes=options['minutes'])
+        delays = sorted(
+            (published_at - created_at).total_seconds()
+            for created_at, published_at in OutboxEvent.objects.filter(
+                published_at__gte=since
+            ).values_list('created_at', 'published_at').iterator()
+        )
+        if delays:
+            p99 = delays[min(len(delays) - 1, int(len(delays) * 0.99))]
+            self.stdout.write(
+                f"Published in the last {options['minutes']} min: {len(delays)} events, "
+                f"delivery lag p50 {statistics.median(delays):.3f}s, p99 {p99:.3f}s, max {delays[-1]:.3f}s"
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Outbox status collected'))
@@ -0,0 +1,55 @@
+"""
+Django management command to publish outbox events to the configured sinks.
+Usage: python manage.py run_outbox_relay [--once] [--batch-size 500] [--poll-interval 1.0]
+
+Runs until interrupted; with --once, drains the outbox and exits.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from outbox.relay import OutboxRelay, outbox_lag
+
+
+class Command(BaseCommand):
+    help = 'Relay outbox events (order and payment changes) to NDJSON, Redis streams or HTTP sinks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox and exit')
+        parser.add_argument('--batch-size', type=int, default=None, help='Events per batch')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'OUTBOX_RELAY_POLL_INTERVAL', 1.0),
+            help='Seconds between polls when the outbox is empty'
+        )
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(batch_size=options['batch_size'])
+        if not relay.sinks:
+            raise CommandError('No outbox sinks configured (settings.OUTBOX_SINKS)')
+        self.stdout.write(f"Relaying to {', '.join(str(sink) for sink in relay.sinks)}")
+
+        if options['once']:
+            published = relay.drain()
+            lag = outbox_lag()
+            if relay.failures:
+                raise CommandError(
+                    f"Published {published} events, then a sink failed; "
+                    f"{lag['backlog']} events left (lag {lag['lag_seconds']:.1f}s)"
+                )
+            self.stdout.write(self.style.SUCCESS(f'✓ Published {published} outbox events'))
+            return
+
+        retention_days = getattr(settings, 'OUTBOX_RETENTION_DAYS', 7)
+        try:
+            relay.run(
+                poll_interval=options['poll_interval'],
+                retention=timedelta(days=retention_days) if retention_days else None
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Relay stopped after publishing {relay.published} outbox events'
+        ))
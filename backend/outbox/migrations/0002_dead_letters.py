@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboxevent',
+            name='outbox_unpublished_idx',
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='dead_lettered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(condition=models.Q(('dead_lettered_at__isnull', True), ('published_at__isnull', True)), fields=['id'], name='outbox_unpublished_idx'),
+        ),
+    ]
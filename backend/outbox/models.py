@@ -0,0 +1,40 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+
+
+class OutboxEvent(models.Model):
+    """
+    Change event written in the same transaction as the change itself.
+    The relay (outbox.relay) publishes unpublished events to the sinks in
+    id order and then sets published_at, or sets dead_lettered_at once an
+    event has failed too many times.
+    """
+    topic = models.CharField(max_length=100)
+    aggregate_type = models.CharField(max_length=100)
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+
+    # Delivery tracking
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            # The relay only ever scans the unpublished head of the table
+            models.Index(
+                fields=['id'],
+                condition=Q(published_at__isnull=True, dead_lettered_at__isnull=True),
+                name='outbox_unpublished_idx'
+            ),
+            models.Index(fields=['aggregate_type', 'aggregate_id'], name='outbox_aggregate_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.aggregate_type}#{self.aggregate_id}"
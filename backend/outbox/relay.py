@@ -0,0 +1,201 @@
+"""
+Outbox relay: drains unpublished events to the sinks in batches.
+
+Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED in id order,
+published to every sink, then marked published in the same transaction.
+If a sink fails, the batch stays unpublished (attempts and last_error are
+recorded) and is retried after a backoff, so delivery is at-least-once
+and a sink that already received part of a batch may see it again.
+
+A batch failing again is retried at half its size (down to a single
+event) and the size doubles back after each success, so an event a sink
+always rejects (a poison event) cannot hold back the events before it.
+When it fails alone with OUTBOX_RELAY_MAX_ATTEMPTS failed attempts
+behind it, it is dead-lettered: dead_lettered_at is set, the relay skips
+it, and outbox_status reports it until requeue_dead_letters() (or the
+admin action) puts it back in line.
+
+One relay keeps the global event order. Extra relays can run for
+throughput: SKIP LOCKED hands them disjoint batches, at the cost of
+ordering across batches.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .sinks import get_sinks
+
+logger = logging.getLogger('outbox')
+
+MAX_ERROR_LENGTH = 1000
+
+
+def get_batch_size():
+    """Events claimed per batch (settings.OUTBOX_RELAY_BATCH_SIZE)."""
+    return getattr(settings, 'OUTBOX_RELAY_BATCH_SIZE', 500)
+
+
+def get_max_attempts():
+    """Failed deliveries before an event is dead-lettered (0 retries forever)."""
+    return getattr(settings, 'OUTBOX_RELAY_MAX_ATTEMPTS', 20)
+
+
+def pending_events():
+    """Events the relay still has to publish (neither published nor dead-lettered)."""
+    return OutboxEvent.objects.filter(published_at__isnull=True, dead_lettered_at__isnull=True)
+
+
+def dead_letters():
+    """Events given up on after OUTBOX_RELAY_MAX_ATTEMPTS failures."""
+    return OutboxEvent.objects.filter(published_at__isnull=True, dead_lettered_at__isnull=False)
+
+
+def requeue_dead_letters(ids=None):
+    """
+    Give dead-lettered events (all, or those in ids) a fresh set of attempts.
+
+    Returns:
+        Number of events requeued
+    """
+    events = dead_letters()
+    if ids is not None:
+        events = events.filter(id__in=ids)
+    return events.update(dead_lettered_at=None, attempts=0)
+
+
+def outbox_lag():
+    """
+    Backlog metrics read from the table.
+
+    Returns:
+        Dict with backlog (events left to publish) and lag_seconds (age of
+        the oldest of them, 0 when the outbox is drained); dead letters are
+        left out
+    """
+    stats = pending_events().aggregate(
+        backlog=Count('id'), oldest=Min('created_at')
+    )
+    oldest = stats['oldest']
+    return {
+        'backlog': stats['backlog'],
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+def purge_published(older_than):
+    """Delete events published before now - older_than (a timedelta)."""
+    deleted, _ = OutboxEvent.objects.filter(
+        published_at__isnull=False, published_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
+
+
+class OutboxRelay:
+    """Publishes outbox events to sinks, batch by batch."""
+
+    def __init__(self, sinks=None, batch_size=None, max_attempts=None):
+        self.sinks = get_sinks() if sinks is None else sinks
+        self.batch_size = batch_size or get_batch_size()
+        self.max_attempts = get_max_attempts() if max_attempts is None else max_attempts
+        # Shrinks after a failed batch to isolate a poison event
+        self.batch_limit = self.batch_size
+        self.published = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        # Seconds between commit and publication of the oldest event of the last batch
+        self.last_delivery_lag = None
+
+    def drain_once(self):
+        """
+        Publish one batch.
+
+        Returns:
+            Number of events published (0 when idle or on sink failure)
+        """
+        with transaction.atomic():
+            events = list(
+                pending_events().select_for_update(skip_locked=True)
+                .order_by('id')[:self.batch_limit]
+            )
+            if not events:
+                return 0
+            ids = [event.id for event in events]
+
+            try:
+                for sink in self.sinks:
+                    sink.publish(events)
+            except Exception as e:
+                self.failures += 1
+                error = f"{e.__class__.__name__}: {e}"[:MAX_ERROR_LENGTH]
+                OutboxEvent.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, last_error=error)
+                logger.error(f"Outbox batch {ids[0]}-{ids[-1]} failed on {sink}: {e}")
+                # A head failing again is no blip: retry the batch at half size
+                if events[0].attempts:
+                    self.batch_limit = max(len(events) // 2, 1)
+                # Only an event failing on its own is known to be the culprit
+                if len(events) == 1 and self.max_attempts and events[0].attempts + 1 >= self.max_attempts:
+                    OutboxEvent.objects.filter(id=ids[0]).update(dead_lettered_at=timezone.now())
+                    self.dead_lettered += 1
+                    logger.error(
+                        f"Outbox event {ids[0]} dead-lettered after {self.max_attempts} attempts: {error}"
+                    )
+                return 0
+
+            now = timezone.now()
+            OutboxEvent.objects.filter(id__in=ids).update(
+                published_at=now, attempts=F('attempts') + 1, last_error=''
+            )
+
+        self.batch_limit = min(self.batch_limit * 2, self.batch_size)
+        self.published += len(events)
+        self.last_delivery_lag = (now - events[0].created_at).total_seconds()
+        return len(events)
+
+    def drain(self):
+        """Publish batches until the outbox is empty or a sink fails."""
+        total = 0
+        while True:
+            published = self.drain_once()
+            if not published:
+                return total
+            total += published
+
+    def run(self, poll_interval=1.0, max_backoff=60.0, retention=None, stop=lambda: False):
+        """
+        Relay forever (management command run_outbox_relay).
+
+        Args:
+            poll_interval: Seconds to sleep when the outbox is empty
+            max_backoff: Upper bound of the exponential backoff after failures
+            retention: timedelta after which published events are purged
+            stop: Callable returning True to exit (tests, signal handlers)
+        """
+        backoff = poll_interval
+        next_purge = timezone.now()
+        while not stop():
+            failures = self.failures
+            published = self.drain()
+            if published:
+                logger.info(
+                    f"Published {published} outbox events "
+                    f"(delivery lag {self.last_delivery_lag:.3f}s)"
+                )
+            if retention is not None and timezone.now() >= next_purge:
+                purged = purge_published(retention)
+                if purged:
+                    logger.info(f"Purged {purged} published outbox events")
+                next_purge = timezone.now() + timedelta(hours=1)
+
+            if self.failures > failures:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+            else:
+                backoff = poll_interval
+                if not published:
+                    time.sleep(poll_interval)
@@ -0,0 +1,45 @@
+"""
+Recording outbox events.
+
+Call record_event() inside the transaction that makes the change, so the
+event exists if and only if the change was committed. Publishing happens
+later in the relay worker (outbox.relay), never in the request.
+"""
+from .models import OutboxEvent
+
+
+def record_event(topic, instance, payload):
+    """
+    Record a change of a model instance.
+
+    Args:
+        topic: Event name, e.g. 'order.status_changed'
+        instance: Changed model instance (the aggregate)
+        payload: JSON-serializable dict (dates and decimals are allowed)
+    """
+    return OutboxEvent.objects.create(
+        topic=topic,
+        aggregate_type=instance._meta.label_lower,
+        aggregate_id=str(instance.pk),
+        payload=payload,
+    )
+
+
+def record_events(topic, model, changes):
+    """
+    Record changes of several rows of a model with one INSERT.
+
+    Args:
+        topic: Event name
+        model: Model class of the aggregates
+        changes: Iterable of (primary key, payload)
+    """
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            topic=topic,
+            aggregate_type=model._meta.label_lower,
+            aggregate_id=str(pk),
+            payload=payload,
+        )
+        for pk, payload in changes
+    ])
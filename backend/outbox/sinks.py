@@ -0,0 +1,120 @@
+"""
+Outbox sinks: where the relay publishes events.
+
+Configured with settings.OUTBOX_SINKS, a list of
+{'BACKEND': dotted path, 'OPTIONS': {...}} entries like CACHES:
+
+    OUTBOX_SINKS = [
+        {'BACKEND': 'outbox.sinks.NDJSONFileSink', 'OPTIONS': {'path': '/var/log/shop/changes.ndjson'}},
+        {'BACKEND': 'outbox.sinks.RedisStreamSink', 'OPTIONS': {'stream': 'shop:changes'}},
+        {'BACKEND': 'outbox.sinks.HTTPSink', 'OPTIONS': {'url': 'http://localhost:8090/events'}},
+    ]
+
+A sink receives a batch of events and must raise if any of them was not
+delivered; the relay then retries the whole batch. Delivery is therefore
+at-least-once: consumers deduplicate on the event id.
+"""
+import json
+import os
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+from core.exports import iter_ndjson
+
+EVENT_FIELDS = ['id', 'topic', 'aggregate_type', 'aggregate_id', 'payload', 'created_at']
+
+
+def event_record(event):
+    """Wire format of an OutboxEvent."""
+    return {field: getattr(event, field) for field in EVENT_FIELDS}
+
+
+class Sink:
+    """Base class of outbox sinks."""
+
+    def publish(self, events):
+        raise NotImplementedError
+
+    def __str__(self):
+        return type(self).__name__
+
+
+class NDJSONFileSink(Sink):
+    """Appends one JSON document per event to a local change-log file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def publish(self, events):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as change_log:
+            change_log.writelines(iter_ndjson((event_record(event) for event in events), EVENT_FIELDS))
+            change_log.flush()
+            # Events are marked published right after: make them durable first
+            os.fsync(change_log.fileno())
+
+    def __str__(self):
+        return f"NDJSONFileSink({self.path})"
+
+
+class RedisStreamSink(Sink):
+    """XADDs each event to a Redis stream, capped to about maxlen entries."""
+
+    def __init__(self, stream='outbox', maxlen=100000, alias='default'):
+        self.stream = stream
+        self.maxlen = maxlen
+        self.alias = alias
+
+    def publish(self, events):
+        encoder = DjangoJSONEncoder()
+        pipeline = get_redis_connection(self.alias).pipeline(transaction=False)
+        for event in events:
+            record = event_record(event)
+            pipeline.xadd(
+                self.stream,
+                {'id': record['id'], 'topic': record['topic'], 'event': encoder.encode(record)},
+                maxlen=self.maxlen,
+                approximate=True
+            )
+        pipeline.execute()
+
+    def __str__(self):
+        return f"RedisStreamSink({self.stream})"
+
+
+class HTTPSink(Sink):
+    """POSTs each batch as an NDJSON body; any non-2xx answer fails the batch."""
+
+    def __init__(self, url, timeout=5, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/x-ndjson', **(headers or {})}
+        self.session = requests.Session()
+
+    def publish(self, events):
+        body = ''.join(iter_ndjson((event_record(event) for event in events), EVENT_FIELDS))
+        response = self.session.post(
+            self.url, data=body.encode('utf-8'), headers=self.headers, timeout=self.timeout
+        )
+        response.raise_for_status()
+
+    def __str__(self):
+        return f"HTTPSink({self.url})"
+
+
+def get_sinks():
+    """Sinks configured in settings.OUTBOX_SINKS."""
+    return [
+        import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        for config in getattr(settings, 'OUTBOX_SINKS', [])
+    ]
+
+
+def decode_stream_entry(fields):
+    """Event dict from a RedisStreamSink entry (for consumers and tests)."""
+    value = fields.get(b'event', fields.get('event'))
+    return json.loads(value)
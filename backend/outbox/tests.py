@@ -0,0 +1,228 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+
+from orders.models import Order
+from orders.numbering import allocate_order_number
+from outbox.models import OutboxEvent
+from outbox.relay import OutboxRelay, dead_letters, outbox_lag, requeue_dead_letters
+from outbox.services import record_event
+from outbox.sinks import HTTPSink, NDJSONFileSink, RedisStreamSink, Sink, decode_stream_entry
+from users.models import CustomUser
+
+
+def redis_available():
+    """The Redis stream sink needs a real Redis behind the default cache."""
+    try:
+        get_redis_connection('default').ping()
+        return True
+    except Exception:
+        return False
+
+
+class MemorySink(Sink):
+    """Collects published event ids; fails while fail is set"""
+
+    def __init__(self):
+        self.received = []
+        self.fail = False
+
+    def publish(self, events):
+        if self.fail:
+            raise ConnectionError("sink down")
+        self.received.extend(event.id for event in events)
+
+
+class PoisonSink(MemorySink):
+    """Rejects every batch containing one of the poison event ids"""
+
+    def __init__(self, poison_ids):
+        super().__init__()
+        self.poison_ids = set(poison_ids)
+
+    def publish(self, events):
+        if self.poison_ids.intersection(event.id for event in events):
+            raise ValueError("payload rejected")
+        super().publish(events)
+
+
+class OutboxTestCase(TestCase):
+    """Tests for recording and relaying outbox events"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='outboxuser',
+            email='outbox@example.com',
+            password='testpass123'
+        )
+        self.order = Order.objects.create(
+            user=self.user,
+            order_number=allocate_order_number(),
+            shipping_address='1 Outbox Street',
+            shipping_city='Lille',
+            shipping_postal_code='59000',
+            shipping_country='France'
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def record(self, count):
+        return [
+            record_event('order.status_changed', self.order, {'id': self.order.id, 'sequence': sequence})
+            for sequence in range(count)
+        ]
+
+    def test_event_rolled_back_with_change(self):
+        """Test an event only exists if its transaction commits"""
+        try:
+            with transaction.atomic():
+                self.record(1)
+                raise RuntimeError("checkout failed")
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_batches_in_order(self):
+        """Test the relay publishes in id order, batch by batch"""
+        events = self.record(5)
+        sink = MemorySink()
+        relay = OutboxRelay(sinks=[sink], batch_size=2)
+
+        self.assertEqual(relay.drain_once(), 2)
+        self.assertEqual(relay.drain(), 3)
+        self.assertEqual(sink.received, [event.id for event in events])
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(outbox_lag(), {'backlog': 0, 'lag_seconds': 0.0})
+        self.assertIsNotNone(relay.last_delivery_lag)
+
+    def test_failed_batch_retried(self):
+        """Test a sink failure leaves the batch unpublished and it is redelivered"""
+        self.record(2)
+        first, second = MemorySink(), MemorySink()
+        second.fail = True
+        relay = OutboxRelay(sinks=[first, second])
+
+        self.assertEqual(relay.drain(), 0)
+        self.assertEqual(relay.failures, 1)
+        self.assertEqual(outbox_lag()['backlog'], 2)
+        event = OutboxEvent.objects.first()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('sink down', event.last_error)
+
+        second.fail = False
+        self.assertEqual(relay.drain(), 2)
+        # At-least-once: the first sink saw the batch twice
+        self.assertEqual(len(first.received), 4)
+        self.assertEqual(len(second.received), 2)
+        self.assertEqual(OutboxEvent.objects.first().last_error, '')
+
+    def test_poison_event_dead_lettered(self):
+        """Test an event a sink always rejects is isolated, dead-lettered and skipped"""
+        events = self.record(6)
+        sink = PoisonSink([events[2].id])
+        relay = OutboxRelay(sinks=[sink], batch_size=4, max_attempts=3)
+
+        while relay.failures < 10 and not relay.dead_lettered:
+            relay.drain()
+        self.assertEqual(relay.dead_lettered, 1)
+        # Events before the poison one got through while it was being isolated
+        self.assertEqual(sink.received, [events[0].id, events[1].id])
+
+        self.assertEqual(relay.drain(), 3)
+        self.assertEqual(sink.received, [event.id for event in events if event.id != events[2].id])
+        self.assertEqual(list(dead_letters().values_list('id', flat=True)), [events[2].id])
+        self.assertEqual(outbox_lag()['backlog'], 0)
+
+        out = StringIO()
+        call_command('outbox_status', stdout=out)
+        self.assertIn('Dead-lettered: 1 events', out.getvalue())
+        self.assertIn('payload rejected', out.getvalue())
+
+        # Requeued, it gets a fresh set of attempts
+        self.assertEqual(requeue_dead_letters(), 1)
+        self.assertEqual(outbox_lag()['backlog'], 1)
+        sink.poison_ids.clear()
+        self.assertEqual(relay.drain(), 1)
+
+    def test_ndjson_file_sink(self):
+        """Test the change log gets one JSON document per event"""
+        events = self.record(3)
+        path = os.path.join(self.directory.name, 'changes.ndjson')
+
+        OutboxRelay(sinks=[NDJSONFileSink(path)]).drain()
+        with open(path, encoding='utf-8') as change_log:
+            lines = [json.loads(line) for line in change_log]
+        self.assertEqual([line['id'] for line in lines], [event.id for event in events])
+        self.assertEqual(lines[0]['topic'], 'order.status_changed')
+        self.assertEqual(lines[0]['aggregate_type'], 'orders.order')
+        self.assertEqual(lines[2]['payload']['sequence'], 2)
+
+    def test_http_sink(self):
+        """Test batches are POSTed as NDJSON and non-2xx answers fail the batch"""
+        received = []
+        responses = [503, 204]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                received.append(body.decode('utf-8').splitlines())
+                self.send_response(responses.pop(0))
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.record(2)
+        relay = OutboxRelay(sinks=[HTTPSink(f'http://127.0.0.1:{server.server_port}/events')])
+        self.assertEqual(relay.drain(), 0)
+        self.assertEqual(relay.drain(), 2)
+        self.assertEqual(len(received), 2)
+        self.assertEqual(received[0], received[1])
+        self.assertEqual(json.loads(received[1][0])['topic'], 'order.status_changed')
+
+    @skipUnless(redis_available(), "Redis is not available")
+    def test_redis_stream_sink(self):
+        """Test each event is appended to the Redis stream"""
+        events = self.record(2)
+        stream = 'test-outbox-stream'
+        client = get_redis_connection('default')
+        client.delete(stream)
+        self.addCleanup(client.delete, stream)
+
+        OutboxRelay(sinks=[RedisStreamSink(stream=stream)]).drain()
+        entries = client.xrange(stream)
+        self.assertEqual(
+            [decode_stream_entry(fields)['id'] for _, fields in entries],
+            [event.id for event in events]
+        )
+
+    def test_relay_command_once(self):
+        """Test run_outbox_relay --once drains to the configured sinks"""
+        self.record(3)
+        path = os.path.join(self.directory.name, 'changes.ndjson')
+        out = StringIO()
+
+        with override_settings(OUTBOX_SINKS=[
+            {'BACKEND': 'outbox.sinks.NDJSONFileSink', 'OPTIONS': {'path': path}},
+        ]):
+            call_command('run_outbox_relay', '--once', stdout=out)
+        self.assertIn('Published 3 outbox events', out.getvalue())
+
+        out = StringIO()
+        call_command('outbox_status', stdout=out)
+        self.assertIn('Backlog: 0 events', out.getvalue())
+        self.assertIn('Published in the last 5 min: 3 events', out.getvalue())
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from core.pagination import ApproximateCountPaginator
 from .models import Payment, StripeWebhookEvent, Refund
 
 
@@ -73,6 +74,8 @@ class PaymentAdmin(admin.ModelAdmin):
     
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         """Disable manual creation of payments via admin."""
@@ -205,6 +208,8 @@ class StripeWebhookEventAdmin(admin.ModelAdmin):
     
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         """Disable manual creation of webhook events via admin."""
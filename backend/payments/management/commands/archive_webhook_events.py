@@ -0,0 +1,73 @@
+"""
+Django management command to archive processed Stripe webhook events.
+Usage: python manage.py archive_webhook_events [--keep-months 6] [--output-dir archive/] [--dry-run]
+
+Each month older than --keep-months is exported to
+<output-dir>/webhook-events/webhook-events-YYYY-MM.ndjson.gz, then its
+processed events are deleted in batches; see core.partitioning. Events
+that failed processing are kept for investigation.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.partitioning import add_months, archive_month, months_to_archive
+from payments.models import StripeWebhookEvent
+
+EVENT_FIELDS = [
+    'id', 'stripe_event_id', 'event_type', 'data', 'processed',
+    'processing_error', 'created_at', 'processed_at',
+]
+
+
+def serialize_event(event):
+    return {field: getattr(event, field) for field in EVENT_FIELDS}
+
+
+class Command(BaseCommand):
+    help = 'Export processed Stripe webhook events older than the retention period and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=getattr(settings, 'WEBHOOK_EVENT_ARCHIVE_KEEP_MONTHS', 6),
+            help='Months of webhook events kept in the database'
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=getattr(settings, 'ARCHIVE_ROOT', 'archive'),
+            help='Directory receiving the archive files'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Events deleted per batch')
+        parser.add_argument('--dry-run', action='store_true', help='List the months without archiving')
+
+    def handle(self, *args, **options):
+        oldest = StripeWebhookEvent.objects.order_by('id').values_list('created_at', flat=True).first()
+        months = months_to_archive(oldest, options['keep_months'])
+
+        total = 0
+        for month in months:
+            events = StripeWebhookEvent.objects.filter(
+                created_at__gte=month, created_at__lt=add_months(month, 1), processed=True
+            )
+            if options['dry_run']:
+                self.stdout.write(f"{month:%Y-%m}: {events.count()} events")
+                continue
+            path = os.path.join(
+                options['output_dir'], 'webhook-events', f"webhook-events-{month:%Y-%m}.ndjson.gz"
+            )
+            exported, _, path = archive_month(
+                events,
+                month,
+                path,
+                serialize_event,
+                tables=[StripeWebhookEvent._meta.db_table],
+                batch_size=options['batch_size']
+            )
+            total += exported
+            if exported:
+                self.stdout.write(f"{month:%Y-%m}: {exported} events archived to {path}")
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Archived {total} webhook events from {len(months)} months'))
@@ -9,6 +9,12 @@ from decimal import Decimal
 from typing import Dict, Optional
 from .models import Payment, Refund, StripeWebhookEvent
 from orders.models import Order
+from orders.transitions import (
+    mark_order_paid,
+    transition_order,
+    transition_order_payment,
+    transition_payment,
+)
 
 logger = logging.getLogger('payments')
 
@@ -25,7 +31,8 @@ class StripePaymentService:
     def create_payment_intent(
         order_id: int,
         user,
-        payment_method: str = 'card'
+        payment_method: str = 'card',
+        idempotency_key: Optional[str] = None
     ) -> Dict:
         """
         Create a Stripe Payment Intent for an order.
@@ -34,6 +41,8 @@ class StripePaymentService:
             order_id: The ID of the order to create payment for
             user: The user making the payment
             payment_method: Payment method type (default: 'card')
+            idempotency_key: Client Idempotency-Key, forwarded to Stripe so
+                retried requests never create a second intent or customer
             
         Returns:
             Dict containing payment intent details and client_secret
@@ -60,7 +69,10 @@ class StripePaymentService:
             logger.debug(f"Order {order.order_number}: Amount €{order.final_amount} ({amount_in_cents} cents)")
             
             # Create or retrieve Stripe customer
-            stripe_customer = StripePaymentService._get_or_create_customer(user)
+            stripe_customer = StripePaymentService._get_or_create_customer(
+                user,
+                idempotency_key=StripePaymentService._stripe_idempotency_key('customer', user, idempotency_key)
+            )
             logger.debug(f"Stripe customer ID: {stripe_customer.id}")
             
             # Create payment intent
@@ -76,7 +88,10 @@ class StripePaymentService:
                 },
                 automatic_payment_methods={
                     'enabled': True,
-                }
+                },
+                idempotency_key=StripePaymentService._stripe_idempotency_key(
+                    'payment-intent', user, idempotency_key
+                )
             )
             
             logger.info(f"Stripe payment intent created: {payment_intent.id}")
@@ -119,12 +134,23 @@ class StripePaymentService:
             raise ValueError(f"Stripe error: {str(e)}")
     
     @staticmethod
-    def _get_or_create_customer(user):
+    def _stripe_idempotency_key(operation: str, user, idempotency_key: Optional[str]) -> Optional[str]:
+        """
+        Stripe idempotency key derived from the client's key.
+        Scoped by operation and user: Stripe keys are shared by the whole account.
+        """
+        if not idempotency_key:
+            return None
+        return f"{operation}:{user.id}:{idempotency_key}"
+    
+    @staticmethod
+    def _get_or_create_customer(user, idempotency_key: Optional[str] = None):
         """
         Get or create a Stripe customer for the user.
         
         Args:
             user: CustomUser instance
+            idempotency_key: Stripe idempotency key for the customer creation
             
         Returns:
             Stripe Customer object
@@ -148,7 +174,8 @@ class StripePaymentService:
             metadata={
                 'user_id': user.id,
                 'username': user.username,
-            }
+            },
+            idempotency_key=idempotency_key
         )
         
         return customer
@@ -158,6 +185,10 @@ class StripePaymentService:
         """
         Confirm a payment and update the payment status.
         
+        Safe to call concurrently (client confirmation and webhook): every
+        status change is a compare-and-set, so only one caller confirms the
+        order.
+        
         Args:
             payment_intent_id: Stripe Payment Intent ID
             
@@ -165,30 +196,26 @@ class StripePaymentService:
             Updated Payment instance
         """
         try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
+            payment = Payment.objects.select_related('order').get(stripe_payment_intent_id=payment_intent_id)
             
             # Retrieve payment intent from Stripe
             payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
             
             if payment_intent.status == 'succeeded':
-                payment.status = 'succeeded'
-                payment.paid_at = timezone.now()
-                payment.stripe_charge_id = payment_intent.latest_charge
-                
-                # Update order payment status
-                payment.order.payment_status = 'paid'
-                payment.order.status = 'confirmed'
-                payment.order.save()
-                
+                if transition_payment(payment, 'succeeded', stripe_charge_id=payment_intent.latest_charge):
+                    # Update order payment status
+                    mark_order_paid(payment.order)
             elif payment_intent.status == 'processing':
-                payment.status = 'processing'
+                transition_payment(payment, 'processing')
             elif payment_intent.status == 'canceled':
-                payment.status = 'cancelled'
+                transition_payment(payment, 'cancelled')
             else:
-                payment.status = 'failed'
-                payment.error_message = payment_intent.cancellation_reason or 'Payment failed'
+                transition_payment(
+                    payment,
+                    'failed',
+                    error_message=payment_intent.cancellation_reason or 'Payment failed'
+                )
             
-            payment.save()
             return payment
             
         except Payment.DoesNotExist:
@@ -216,7 +243,7 @@ class StripePaymentService:
             Refund instance
         """
         try:
-            payment = Payment.objects.get(id=payment_id)
+            payment = Payment.objects.select_related('order').get(id=payment_id)
             
             if payment.status != 'succeeded':
                 raise ValueError("Can only refund succeeded payments")
@@ -249,11 +276,8 @@ class StripePaymentService:
             )
             
             # Update payment status if full refund
-            if refund_amount >= payment.amount:
-                payment.status = 'refunded'
-                payment.order.payment_status = 'refunded'
-                payment.order.save()
-                payment.save()
+            if refund_amount >= payment.amount and transition_payment(payment, 'refunded'):
+                transition_order_payment(payment.order, 'refunded')
             
             return refund
             
@@ -372,7 +396,7 @@ class StripeWebhookService:
                 exc_info=True
             )
         
-        webhook_event.save()
+        webhook_event.save(update_fields=['processed', 'processed_at', 'processing_error'])
         return webhook_event
     
     @staticmethod
@@ -387,15 +411,16 @@ class StripeWebhookService:
         payment_intent = event.data.object
         
         try:
-            payment = Payment.objects.get(
+            payment = Payment.objects.select_related('order').get(
                 stripe_payment_intent_id=payment_intent.id
             )
-            payment.status = 'failed'
-            payment.error_message = payment_intent.last_payment_error.get('message', 'Payment failed')
-            payment.save()
-            
-            payment.order.payment_status = 'failed'
-            payment.order.save()
+            # A late failure event must not override a succeeded payment
+            if transition_payment(
+                payment,
+                'failed',
+                error_message=payment_intent.last_payment_error.get('message', 'Payment failed')
+            ):
+                transition_order_payment(payment.order, 'failed')
         except Payment.DoesNotExist:
             pass
     
@@ -405,15 +430,13 @@ class StripeWebhookService:
         payment_intent = event.data.object
         
         try:
-            payment = Payment.objects.get(
+            payment = Payment.objects.select_related('order').get(
                 stripe_payment_intent_id=payment_intent.id
             )
-            payment.status = 'cancelled'
-            payment.save()
-            
-            payment.order.payment_status = 'failed'
-            payment.order.status = 'cancelled'
-            payment.order.save()
+            if transition_payment(payment, 'cancelled'):
+                transition_order_payment(payment.order, 'failed')
+                # Only a pending order is cancelled; a shipped one is left to support
+                transition_order(payment.order, 'cancelled')
         except Payment.DoesNotExist:
             pass
     
@@ -422,18 +445,11 @@ class StripeWebhookService:
         """Handle charge.refunded event."""
         charge = event.data.object
         
-        try:
-            payment = Payment.objects.get(stripe_charge_id=charge.id)
-            
-            # Update refund status if exists
-            for refund_data in charge.refunds.data:
-                try:
-                    refund = Refund.objects.get(stripe_refund_id=refund_data.id)
-                    refund.status = 'succeeded'
-                    refund.refunded_at = timezone.now()
-                    refund.save()
-                except Refund.DoesNotExist:
-                    pass
-                    
-        except Payment.DoesNotExist:
-            pass
+        if not Payment.objects.filter(stripe_charge_id=charge.id).exists():
+            return
+        
+        # Pending refunds of the charge succeed in one guarded UPDATE
+        Refund.objects.filter(
+            stripe_refund_id__in=[refund_data.id for refund_data in charge.refunds.data],
+            status='pending'
+        ).update(status='succeeded', refunded_at=timezone.now(), updated_at=timezone.now())
@@ -10,6 +10,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django_ratelimit.decorators import ratelimit
+from core.idempotency import IdempotencyMixin
 from .models import Payment, Refund, StripeWebhookEvent
 from .serializers import (
     PaymentSerializer,
@@ -22,13 +23,15 @@ from .serializers import (
 from .services import StripePaymentService, StripeWebhookService
 
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentViewSet(IdempotencyMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing payment records.
     Only the payment owner can view their payments.
+    Payment creation honours the Idempotency-Key header.
     """
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    idempotent_actions = ('create_payment_intent', 'demo_payment')
     
     def get_queryset(self):
         """Return payments for the current user only."""
@@ -42,6 +45,7 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Create a new Stripe Payment Intent for an order.
         Rate limit: 20 payment intents per hour per user.
+        An Idempotency-Key header is also passed to Stripe.
         
         Request body:
         {
@@ -56,7 +60,8 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
             result = StripePaymentService.create_payment_intent(
                 order_id=serializer.validated_data['order_id'],
                 user=request.user,
-                payment_method=serializer.validated_data.get('payment_method', 'card')
+                payment_method=serializer.validated_data.get('payment_method', 'card'),
+                idempotency_key=self.get_idempotency_key(request)
             )
             
             return Response(result, status=status.HTTP_201_CREATED)
@@ -122,6 +127,9 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         }
         """
         from orders.models import Order
+        from orders.transitions import mark_order_paid
+        from outbox.services import record_event
+        from django.db import transaction
         from django.utils import timezone
         
         serializer = DemoPaymentSerializer(data=request.data)
@@ -141,23 +149,29 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create demo payment record
-            payment = Payment.objects.create(
-                order=order,
-                user=request.user,
-                amount=order.final_amount,
-                currency='eur',
-                status='succeeded',
-                payment_method='card',
-                description=f'Demo payment for order {order.order_number}',
-                stripe_payment_intent_id=f'demo_pi_{order.id}_{timezone.now().timestamp()}',
-                paid_at=timezone.now()
-            )
-            
-            # Update order status
-            order.status = 'confirmed'
-            order.payment_status = 'paid'
-            order.save()
+            with transaction.atomic():
+                # Create demo payment record
+                payment = Payment.objects.create(
+                    order=order,
+                    user=request.user,
+                    amount=order.final_amount,
+                    currency='eur',
+                    status='succeeded',
+                    payment_method='card',
+                    description=f'Demo payment for order {order.order_number}',
+                    stripe_payment_intent_id=f'demo_pi_{order.id}_{timezone.now().timestamp()}',
+                    paid_at=timezone.now()
+                )
+                record_event('payment.status_changed', payment, {
+                    'id': payment.id,
+                    'order_id': order.id,
+                    'user_id': request.user.id,
+                    'status': payment.status,
+                    'paid_at': payment.paid_at,
+                })
+                
+                # Update order status
+                mark_order_paid(order)
             
             response_serializer = PaymentSerializer(payment)
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,37 @@
+from django.contrib import admin
+from .models import Promotion, PromotionRedemption
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    """Admin interface for Promotion management"""
+    list_display = ['name', 'code', 'target_type', 'target_value', 'rate', 'is_active', 'usage_count', 'usage_limit', 'ends_at']
+    list_filter = ['is_active', 'target_type']
+    search_fields = ['name', 'code', 'target_value']
+    readonly_fields = ['usage_count', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+
+    fieldsets = (
+        ('Promotion', {
+            'fields': ('name', 'code', 'rate')
+        }),
+        ('Eligibility', {
+            'fields': ('target_type', 'target_value', 'min_subtotal')
+        }),
+        ('Availability', {
+            'fields': ('is_active', 'starts_at', 'ends_at', 'usage_limit', 'usage_count')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at')
+        }),
+    )
+
+
+@admin.register(PromotionRedemption)
+class PromotionRedemptionAdmin(admin.ModelAdmin):
+    """Admin interface for PromotionRedemption (read-only history)"""
+    list_display = ['promotion', 'order', 'discount_amount', 'created_at']
+    list_filter = ['promotion']
+    search_fields = ['promotion__name', 'promotion__code', 'order__order_number']
+    readonly_fields = ['promotion', 'order', 'discount_amount', 'created_at']
+    ordering = ['-created_at']
@@ -0,0 +1,55 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0003_order_number_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('code', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('target_type', models.CharField(choices=[('all', 'Whole catalog'), ('product', 'Product'), ('master_category', 'Master category'), ('sub_category', 'Sub category'), ('article_type', 'Article type')], default='all', max_length=20)),
+                ('target_value', models.CharField(blank=True, help_text='Product id or category name', max_length=100)),
+                ('min_subtotal', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('rate', models.DecimalField(decimal_places=4, help_text='Discount as a fraction, e.g. 0.15 for 15%', max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)])),
+                ('is_active', models.BooleanField(default=True)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('usage_limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Promotion',
+                'verbose_name_plural': 'Promotions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['is_active', 'ends_at'], name='promotion_active_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PromotionRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discount_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promotion_redemptions', to='orders.order')),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='redemptions', to='promotions.promotion')),
+            ],
+            options={
+                'verbose_name': 'Promotion Redemption',
+                'verbose_name_plural': 'Promotion Redemptions',
+                'constraints': [models.UniqueConstraint(fields=('promotion', 'order'), name='unique_promotion_per_order')],
+            },
+        ),
+    ]
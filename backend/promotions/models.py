@@ -0,0 +1,89 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+class Promotion(models.Model):
+    """
+    Percentage discount on eligible cart lines.
+    Promotions with a code are coupons the customer has to enter;
+    promotions without a code apply automatically.
+    """
+    TARGET_CHOICES = [
+        ('all', 'Whole catalog'),
+        ('product', 'Product'),
+        ('master_category', 'Master category'),
+        ('sub_category', 'Sub category'),
+        ('article_type', 'Article type'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    code = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    
+    # Eligibility: lines whose product matches target_type/target_value
+    target_type = models.CharField(max_length=20, choices=TARGET_CHOICES, default='all')
+    target_value = models.CharField(max_length=100, blank=True, help_text="Product id or category name")
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    rate = models.DecimalField(
+        max_digits=5,
+        decimal_places=4,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        help_text="Discount as a fraction, e.g. 0.15 for 15%"
+    )
+    
+    # Availability
+    is_active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    usage_limit = models.PositiveIntegerField(null=True, blank=True)
+    usage_count = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Promotion'
+        verbose_name_plural = 'Promotions'
+        indexes = [
+            models.Index(fields=['is_active', 'ends_at'], name='promotion_active_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.code})" if self.code else self.name
+    
+    def is_available(self, now):
+        """Active, within its dates and not used up"""
+        return (
+            self.is_active
+            and (self.starts_at is None or self.starts_at <= now)
+            and (self.ends_at is None or now < self.ends_at)
+            and (self.usage_limit is None or self.usage_count < self.usage_limit)
+        )
+
+
+class PromotionRedemption(models.Model):
+    """A promotion applied to an order, with the discount it granted."""
+    promotion = models.ForeignKey(Promotion, on_delete=models.PROTECT, related_name='redemptions')
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='promotion_redemptions')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Promotion Redemption'
+        verbose_name_plural = 'Promotion Redemptions'
+        constraints = [
+            models.UniqueConstraint(fields=['promotion', 'order'], name='unique_promotion_per_order'),
+        ]
+    
+    def __str__(self):
+        return f"{self.promotion} on order {self.order_id}"
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_promotion_index(sender, **kwargs):
+    """Signal handler: make every worker rebuild its promotion index"""
+    from .services import bump_index_version
+    bump_index_version()
@@ -0,0 +1,225 @@
+"""
+Promotion evaluation and redemption.
+
+Available promotions are kept in a per-process PromotionIndex keyed by
+eligibility target (product id, master_category, sub_category,
+article_type or the whole catalog), each bucket sorted by rate. Pricing a
+cart looks up five keys per line, so the cost depends on the cart size,
+not on the number of active promotions.
+
+The index is rebuilt when a promotion is saved or deleted (a version
+counter in the shared cache), when a promotion gets used up, and when the
+next start or end date of an indexed promotion passes.
+
+Usage counters are redeemed at checkout with a conditional UPDATE, so a
+limited promotion can never be used more than usage_limit times.
+"""
+import logging
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Promotion, PromotionRedemption
+
+logger = logging.getLogger('promotions')
+
+INDEX_VERSION_KEY = 'promotions:index_version'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class PromotionError(ValueError):
+    """A coupon cannot be applied, or a promotion was used up meanwhile."""
+
+
+def get_index_version():
+    return cache.get(INDEX_VERSION_KEY, 0)
+
+
+def bump_index_version():
+    """Make every worker rebuild its promotion index."""
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 1, None)
+
+
+def _line_keys(product):
+    return (
+        ('product', str(product.id)),
+        ('master_category', product.master_category),
+        ('sub_category', product.sub_category),
+        ('article_type', product.article_type),
+        ('all', ''),
+    )
+
+
+def _matches(promotion, product):
+    if promotion.target_type == 'all':
+        return True
+    if promotion.target_type == 'product':
+        return promotion.target_value == str(product.id)
+    return getattr(product, promotion.target_type) == promotion.target_value
+
+
+class PromotionIndex:
+    """Automatic promotions by eligibility key, coupons by code."""
+
+    def __init__(self, promotions, version, now):
+        self.version = version
+        self.automatic = defaultdict(list)
+        self.coupons = {}
+        boundaries = []
+        for promotion in sorted(promotions, key=lambda promotion: promotion.rate, reverse=True):
+            if promotion.code:
+                self.coupons[promotion.code.upper()] = promotion
+            else:
+                value = '' if promotion.target_type == 'all' else promotion.target_value
+                self.automatic[(promotion.target_type, value)].append(promotion)
+            boundaries.extend(
+                date for date in (promotion.starts_at, promotion.ends_at) if date is not None and date > now
+            )
+        # The set of available promotions changes at the next start or end date
+        self.expires_at = min(boundaries) if boundaries else None
+
+    @classmethod
+    def build(cls):
+        now = timezone.now()
+        version = get_index_version()
+        promotions = (
+            Promotion.objects.filter(is_active=True)
+            .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+            .exclude(usage_limit__isnull=False, usage_count__gte=F('usage_limit'))
+        )
+        return cls(list(promotions), version, now)
+
+    def is_stale(self, now):
+        return (
+            (self.expires_at is not None and now >= self.expires_at)
+            or get_index_version() != self.version
+        )
+
+    def best_automatic(self, product, subtotal, now):
+        """Highest-rate available automatic promotion for a product."""
+        best = None
+        for key in _line_keys(product):
+            for promotion in self.automatic.get(key, ()):
+                if promotion.min_subtotal <= subtotal and promotion.is_available(now):
+                    if best is None or promotion.rate > best.rate:
+                        best = promotion
+                    # Buckets are sorted by rate: the rest cannot beat this one
+                    break
+        return best
+
+    def get_coupon(self, code, now):
+        promotion = self.coupons.get(code.strip().upper())
+        if promotion is None or not promotion.is_available(now):
+            return None
+        return promotion
+
+
+def get_promotion_index():
+    """The current process's promotion index, rebuilt when stale."""
+    global _index
+    now = timezone.now()
+    index = _index
+    if index is None or index.is_stale(now):
+        with _index_lock:
+            if _index is None or _index.is_stale(now):
+                _index = PromotionIndex.build()
+            index = _index
+    return index
+
+
+def reset_promotion_index():
+    """Drop the cached index (tests)."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def match_promotions(lines, coupon_code=None):
+    """
+    Best promotion for each cart line.
+
+    Args:
+        lines: Sequence of (unit_price, quantity, product or None)
+        coupon_code: Coupon entered by the customer, if any
+
+    Returns:
+        List with the Promotion applying to each line, or None
+
+    Raises:
+        PromotionError: unknown, expired or inapplicable coupon
+    """
+    now = timezone.now()
+    index = get_promotion_index()
+    subtotal = sum((Decimal(str(price)) * quantity for price, quantity, _ in lines), Decimal('0'))
+    matched = [
+        index.best_automatic(product, subtotal, now) if product is not None else None
+        for _, _, product in lines
+    ]
+
+    if coupon_code:
+        coupon = index.get_coupon(coupon_code, now)
+        if coupon is None:
+            raise PromotionError("Invalid or expired coupon code")
+        if subtotal < coupon.min_subtotal:
+            raise PromotionError(f"This coupon requires a subtotal of at least {coupon.min_subtotal}")
+        eligible = False
+        for position, (_, _, product) in enumerate(lines):
+            if product is not None and _matches(coupon, product):
+                eligible = True
+                if matched[position] is None or coupon.rate > matched[position].rate:
+                    matched[position] = coupon
+        if not eligible:
+            raise PromotionError("This coupon does not apply to any item in the cart")
+
+    return matched
+
+
+def redeem_promotions(order, applied):
+    """
+    Count the promotions applied to an order, inside its transaction.
+
+    Args:
+        order: The new Order
+        applied: List of dicts with promotion and discount_amount
+
+    Raises:
+        PromotionError: a limited promotion was used up meanwhile
+    """
+    used_up = False
+    for entry in applied:
+        promotion = entry['promotion']
+        updated = Promotion.objects.filter(
+            Q(usage_limit__isnull=True) | Q(usage_count__lt=F('usage_limit')),
+            pk=promotion.pk,
+        ).update(usage_count=F('usage_count') + 1)
+        if not updated:
+            # Used up by other checkouts: this process's index is stale
+            bump_index_version()
+            raise PromotionError(f"Promotion {promotion.name} is no longer available")
+        if promotion.usage_limit is not None:
+            # The indexed instance keeps the usage_count it was loaded with
+            usage_count, usage_limit = Promotion.objects.filter(pk=promotion.pk).values_list(
+                'usage_count', 'usage_limit'
+            ).get()
+            if usage_limit is not None and usage_count >= usage_limit:
+                used_up = True
+
+    PromotionRedemption.objects.bulk_create([
+        PromotionRedemption(order=order, promotion=entry['promotion'], discount_amount=entry['discount_amount'])
+        for entry in applied
+    ])
+    if used_up:
+        # Drop the used up promotions from every index once the count is
+        # committed, so no worker rebuilds from the previous count
+        transaction.on_commit(bump_index_version)
+        logger.info(f"Promotion usage limit reached with order {order.order_number}")
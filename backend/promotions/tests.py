@@ -0,0 +1,220 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from promotions.models import Promotion, PromotionRedemption
+from promotions.services import get_promotion_index, reset_promotion_index
+from shop.models import Product
+from users.models import CustomUser
+
+
+class PromotionTestMixin:
+    """Products shared by the promotion tests"""
+
+    def create_products(self):
+        # Earlier tests may have left promotions in the per-process index
+        reset_promotion_index()
+        self.addCleanup(reset_promotion_index)
+        for product_id, master_category, article_type, price in [
+            (600, 'Footwear', 'Sneakers', '50.00'),
+            (601, 'Apparel', 'Shirts', '20.00'),
+        ]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Promo Product {product_id}",
+                gender="Men",
+                master_category=master_category,
+                sub_category="Shoes" if master_category == 'Footwear' else "Topwear",
+                article_type=article_type,
+                base_colour="Black",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=price
+            )
+        self.items = [
+            {'product_id': 600, 'quantity': 1},
+            {'product_id': 601, 'quantity': 2},
+        ]
+
+
+class PromotionQuoteTestCase(PromotionTestMixin, TestCase):
+    """Tests for promotions applied by the quote endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order-quote')
+        self.create_products()
+
+    def quote(self, **extra):
+        return self.client.post(self.url, {'items': self.items, **extra}, format='json')
+
+    def test_automatic_category_promotion(self):
+        """Test an automatic promotion discounts matching lines only"""
+        promotion = Promotion.objects.create(
+            name="Footwear week", target_type='master_category', target_value='Footwear', rate='0.10'
+        )
+
+        response = self.quote()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([line['discount_amount'] for line in response.data['lines']], ['5.00', '0.00'])
+        self.assertEqual(response.data['final_amount'], '85.00')
+        self.assertEqual(response.data['promotions'], [
+            {'id': promotion.id, 'name': "Footwear week", 'code': None, 'discount_amount': '5.00'}
+        ])
+
+    def test_best_promotion_wins_without_stacking(self):
+        """Test the best rate of a line applies, promotions and rules never add up"""
+        Promotion.objects.create(name="Everything", target_type='all', rate='0.05')
+        Promotion.objects.create(name="Sneakers", target_type='article_type', target_value='Sneakers', rate='0.20')
+
+        with override_settings(PRICING_RULES={
+            'line_discounts': [{'field': 'master_category', 'value': 'Apparel', 'rate': '0.30'}],
+        }):
+            response = self.quote()
+
+        # Sneakers line: 20% promotion; shirts line: 30% rule beats the 5% promotion
+        self.assertEqual([line['discount_amount'] for line in response.data['lines']], ['10.00', '12.00'])
+        self.assertEqual([promotion['name'] for promotion in response.data['promotions']], ["Sneakers"])
+
+    def test_unavailable_promotions_ignored(self):
+        """Test inactive, expired, future, used up and below-threshold promotions"""
+        now = timezone.now()
+        Promotion.objects.create(name="Inactive", rate='0.50', is_active=False)
+        Promotion.objects.create(name="Expired", rate='0.50', ends_at=now - timedelta(days=1))
+        Promotion.objects.create(name="Future", rate='0.50', starts_at=now + timedelta(days=1))
+        Promotion.objects.create(name="Used up", rate='0.50', usage_limit=1, usage_count=1)
+        Promotion.objects.create(name="Big carts", rate='0.50', min_subtotal='500.00')
+
+        response = self.quote()
+        self.assertEqual(response.data['discount_amount'], '0.00')
+        self.assertEqual(response.data['promotions'], [])
+
+    def test_index_rebuilt_after_change(self):
+        """Test saving a promotion refreshes the index of this process"""
+        promotion = Promotion.objects.create(name="Everything", rate='0.10')
+        self.assertEqual(self.quote().data['discount_amount'], '9.00')
+
+        promotion.is_active = False
+        promotion.save()
+        self.assertEqual(self.quote().data['discount_amount'], '0.00')
+
+    def test_index_lookup_queries(self):
+        """Test quotes do not query promotions once the index is built"""
+        Promotion.objects.create(name="Everything", rate='0.10')
+        get_promotion_index()
+
+        # Product fetch only
+        with self.assertNumQueries(1):
+            response = self.quote()
+        self.assertEqual(response.data['discount_amount'], '9.00')
+
+    def test_coupon(self):
+        """Test a coupon applies to its target, case-insensitively"""
+        Promotion.objects.create(
+            name="Shirts coupon", code='SHIRTS15', target_type='article_type', target_value='Shirts', rate='0.15'
+        )
+
+        self.assertEqual(self.quote().data['discount_amount'], '0.00')
+        response = self.quote(coupon_code='shirts15')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['discount_amount'], '6.00')
+        self.assertEqual(response.data['promotions'][0]['code'], 'SHIRTS15')
+
+    def test_invalid_coupons(self):
+        """Test unknown, inapplicable and below-threshold coupons are rejected"""
+        Promotion.objects.create(
+            name="Bags", code='BAGS', target_type='master_category', target_value='Accessories', rate='0.10'
+        )
+        Promotion.objects.create(name="Big carts", code='BIG', rate='0.10', min_subtotal='500.00')
+
+        for code in ['NOPE', 'BAGS', 'BIG']:
+            response = self.quote(coupon_code=code)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.data)
+
+
+class PromotionRedemptionTestCase(PromotionTestMixin, TestCase):
+    """Tests for promotion redemption at checkout"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username='promouser',
+            email='promo@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('order-list')
+        self.create_products()
+        self.coupon = Promotion.objects.create(name="Launch", code='LAUNCH', rate='0.10', usage_limit=1)
+
+    def order(self, **extra):
+        return self.client.post(self.url, {
+            'items': self.items,
+            'shipping_address': '1 Promo Street',
+            'shipping_city': 'Paris',
+            'shipping_postal_code': '75001',
+            'shipping_country': 'France',
+            **extra
+        }, format='json')
+
+    def test_coupon_redeemed_with_order(self):
+        """Test the order stores the discount and the coupon usage is counted"""
+        response = self.order(coupon_code='LAUNCH')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['discount_amount'], '9.00')
+        self.assertEqual(response.data['final_amount'], '81.00')
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage_count, 1)
+        redemption = PromotionRedemption.objects.get()
+        self.assertEqual(redemption.order.order_number, response.data['order_number'])
+        self.assertEqual(redemption.discount_amount, Decimal('9.00'))
+
+    def test_usage_limit(self):
+        """Test a used up coupon is refused and no order is created"""
+        self.assertEqual(self.order(coupon_code='LAUNCH').status_code, status.HTTP_201_CREATED)
+
+        response = self.order(coupon_code='LAUNCH')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_concurrent_redemption_rolls_back(self):
+        """Test a coupon used up after pricing rolls the order back"""
+        get_promotion_index()
+        # Another checkout takes the last use; this process's index still offers it
+        Promotion.objects.filter(pk=self.coupon.pk).update(usage_count=1)
+
+        response = self.order(coupon_code='LAUNCH')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.filter(user=self.user).exists())
+        self.assertFalse(PromotionRedemption.objects.exists())
+
+    def test_automatic_promotion_used_up(self):
+        """Test an automatic promotion stops applying once its limit is reached"""
+        Promotion.objects.create(name="First buyers", rate='0.10', usage_limit=2)
+        discounts = []
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.order()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            discounts.append(response.data['discount_amount'])
+        self.assertEqual(discounts, ['9.00', '9.00', '0.00'])
+
+    def test_used_up_elsewhere_refreshes_index(self):
+        """Test a checkout refused by the limit makes the next one skip the promotion"""
+        promotion = Promotion.objects.create(name="First buyers", rate='0.10', usage_limit=2)
+        get_promotion_index()
+        Promotion.objects.filter(pk=promotion.pk).update(usage_count=2)
+
+        self.assertEqual(self.order().status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.order()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['discount_amount'], '0.00')
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count, Sum, Avg
+from core.db_router import use_replica
+from core.pagination import ApproximateCountPaginator
 from .models import Product
 
 
@@ -64,6 +66,8 @@ class ProductAdmin(admin.ModelAdmin):
     )
     
     list_per_page = 50
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     
     date_hierarchy = 'created_at'
     
@@ -132,19 +136,21 @@ class ProductAdmin(admin.ModelAdmin):
         """Add statistics to the changelist view."""
         extra_context = extra_context or {}
         
-        # Calculate statistics
-        stats = Product.objects.aggregate(
-            total_products=Count('id'),
-            avg_price=Avg('price'),
-            total_value=Sum('price'),
-        )
-        
-        # Products by category
-        by_category = dict(
-            Product.objects.values('master_category')
-            .annotate(count=Count('id'))
-            .values_list('master_category', 'count')
-        )
+        # Reporting queries can tolerate replica lag
+        with use_replica():
+            # Calculate statistics
+            stats = Product.objects.aggregate(
+                total_products=Count('id'),
+                avg_price=Avg('price'),
+                total_value=Sum('price'),
+            )
+            
+            # Products by category
+            by_category = dict(
+                Product.objects.values('master_category')
+                .annotate(count=Count('id'))
+                .values_list('master_category', 'count')
+            )
         
         extra_context['stats'] = stats
         extra_context['by_category'] = by_category
@@ -0,0 +1,20 @@
+import django_filters
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filters for the public product list.
+    Exact matches on categorical fields plus inclusive price/year ranges.
+    """
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    year_min = django_filters.NumberFilter(field_name='year', lookup_expr='gte')
+    year_max = django_filters.NumberFilter(field_name='year', lookup_expr='lte')
+
+    # Range filters excluded when computing the price histogram
+    PRICE_RANGE_PARAMS = ('price_min', 'price_max')
+
+    class Meta:
+        model = Product
+        fields = ['gender', 'master_category', 'sub_category', 'season', 'usage']
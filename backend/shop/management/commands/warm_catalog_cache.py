@@ -0,0 +1,54 @@
+"""
+Django management command to pre-populate the cache for hot catalog pages.
+Usage: python manage.py warm_catalog_cache [--workers 8] [--top-products 50] [--url /api/shop/products/?usage=Sports]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.services import get_hot_catalog_urls, warm_catalog_cache
+
+
+class Command(BaseCommand):
+    help = 'Warm the cache for the first catalog pages and top product details'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of parallel requests (default: CATALOG_WARM_WORKERS)'
+        )
+        parser.add_argument(
+            '--top-products',
+            type=int,
+            default=None,
+            help='Number of best-selling product detail pages to warm'
+        )
+        parser.add_argument(
+            '--url',
+            action='append',
+            default=[],
+            help='Extra URL to warm (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        urls = get_hot_catalog_urls(top_products=options['top_products'])
+        urls.extend(url for url in options['url'] if url not in urls)
+
+        self.stdout.write(f'Warming {len(urls)} catalog URLs...')
+        start = time.perf_counter()
+        results = warm_catalog_cache(urls, workers=options['workers'])
+        elapsed = time.perf_counter() - start
+
+        for result in results:
+            line = f"{result['status'] or 'ERR':>4}  {result['seconds'] * 1000:8.1f} ms  {result['url']}"
+            if result['status'] == 200:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.WARNING(line))
+
+        warmed = sum(1 for result in results if result['status'] == 200)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Warmed {warmed}/{len(results)} URLs in {elapsed:.2f}s'
+        ))
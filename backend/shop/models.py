@@ -57,6 +57,11 @@ class Product(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Product'      
         verbose_name_plural = 'Products'
+        indexes = [
+            # Range filters (price_min/price_max, year_min/year_max) and histograms
+            models.Index(fields=['price'], name='shop_product_price_idx'),
+            models.Index(fields=['year'], name='shop_product_year_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product_display_name} ({self.id})"
\ No newline at end of file
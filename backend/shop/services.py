@@ -0,0 +1,286 @@
+"""
+Catalog services: category tree, price histogram and cache warm-up for hot
+product pages.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Count, Sum
+from django.test import Client
+from django.urls import reverse
+
+from core.db_router import PIN_COOKIE_NAME
+
+from .models import Product
+
+logger = logging.getLogger('shop')
+
+WARMUP_LOCK_KEY = 'catalog_warmup_lock'
+
+DEFAULT_HISTOGRAM_BUCKETS = 20
+MAX_HISTOGRAM_BUCKETS = 100
+
+PRICE_HISTOGRAM_SQL = """
+    WITH filtered AS ({filtered}),
+    bounds AS (SELECT MIN(price) AS low, MAX(price) AS high FROM filtered)
+    SELECT
+        CASE WHEN bounds.low = bounds.high THEN 1
+             ELSE LEAST(width_bucket(filtered.price, bounds.low, bounds.high, %s), %s)
+        END AS bucket,
+        COUNT(*),
+        MIN(bounds.low),
+        MIN(bounds.high)
+    FROM filtered CROSS JOIN bounds
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+CATEGORY_TREE_SQL = """
+    SELECT master_category, sub_category, article_type, COUNT(*),
+           GROUPING(master_category, sub_category, article_type)
+    FROM {table}
+    GROUP BY ROLLUP (master_category, sub_category, article_type)
+    ORDER BY master_category NULLS FIRST, sub_category NULLS FIRST, article_type NULLS FIRST
+"""
+
+# GROUPING() bitmask of a ROLLUP row: which trailing columns are aggregated
+ROLLUP_ARTICLE_TYPE = 0
+ROLLUP_SUB_CATEGORY = 1
+ROLLUP_MASTER_CATEGORY = 3
+ROLLUP_TOTAL = 7
+
+
+def _category_rollup_rows():
+    """
+    (master, sub, article_type, count, grouping) rows of the catalog hierarchy,
+    including subtotals, from a single query.
+    """
+    # Routed like any catalog read, so the raw query can reach a replica
+    db = connections[router.db_for_read(Product)]
+    if db.vendor == 'postgresql':
+        with db.cursor() as cursor:
+            cursor.execute(CATEGORY_TREE_SQL.format(table=db.ops.quote_name(Product._meta.db_table)))
+            return cursor.fetchall()
+
+    # No ROLLUP: group by the leaves and derive the subtotals in Python
+    leaves = (
+        Product.objects.order_by('master_category', 'sub_category', 'article_type')
+        .values_list('master_category', 'sub_category', 'article_type')
+        .annotate(count=Count('id'))
+    )
+    rows = []
+    subtotals = {}
+    for master, sub, article_type, count in leaves:
+        rows.append((master, sub, article_type, count, ROLLUP_ARTICLE_TYPE))
+        for key in (
+            (master, sub, None, ROLLUP_SUB_CATEGORY),
+            (master, None, None, ROLLUP_MASTER_CATEGORY),
+            (None, None, None, ROLLUP_TOTAL),
+        ):
+            subtotals[key] = subtotals.get(key, 0) + count
+    rows.extend((master, sub, article_type, count, grouping)
+                for (master, sub, article_type, grouping), count in subtotals.items())
+    return rows
+
+
+def build_category_tree():
+    """
+    Catalog navigation tree master_category -> sub_category -> article_type
+    with product counts at every level, sorted by name.
+    """
+    total = 0
+    masters = {}
+    for master, sub, article_type, count, grouping in _category_rollup_rows():
+        if grouping == ROLLUP_TOTAL:
+            total = count
+            continue
+        master_node = masters.setdefault(master, {'name': master, 'count': 0, 'sub_categories': {}})
+        if grouping == ROLLUP_MASTER_CATEGORY:
+            master_node['count'] = count
+            continue
+        sub_node = master_node['sub_categories'].setdefault(
+            sub, {'name': sub, 'count': 0, 'article_types': []}
+        )
+        if grouping == ROLLUP_SUB_CATEGORY:
+            sub_node['count'] = count
+        else:
+            sub_node['article_types'].append({'name': article_type, 'count': count})
+
+    categories = []
+    for master in sorted(masters):
+        master_node = masters[master]
+        sub_nodes = master_node['sub_categories']
+        for sub_node in sub_nodes.values():
+            sub_node['article_types'].sort(key=lambda item: item['name'])
+        master_node['sub_categories'] = [sub_nodes[sub] for sub in sorted(sub_nodes)]
+        categories.append(master_node)
+    return {'count': total, 'categories': categories}
+
+
+def _bucket_counts_in_python(prices, buckets):
+    """Fallback for databases without width_bucket (one query, bucketed in memory)."""
+    prices = list(prices)
+    if not prices:
+        return {}, None, None
+    low, high = min(prices), max(prices)
+    counts = {}
+    for price in prices:
+        if low == high:
+            bucket = 1
+        else:
+            bucket = min(int((price - low) * buckets / (high - low)) + 1, buckets)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts, low, high
+
+
+def price_histogram(queryset, buckets=DEFAULT_HISTOGRAM_BUCKETS):
+    """
+    Count products per price bucket in a single query.
+
+    The range [min price, max price] of the queryset is split into equal
+    width buckets; the maximum price falls in the last one. On PostgreSQL
+    the bucketing is done by width_bucket(), elsewhere in Python.
+
+    Returns:
+        Dict with min, max and buckets: [{min, max, count}, ...] including
+        empty buckets (no buckets when the queryset is empty)
+    """
+    prices = queryset.order_by().values('price')
+    # The queryset's database, so the raw query follows replica routing
+    db = connections[prices.db]
+    if db.vendor == 'postgresql':
+        sql, params = prices.query.sql_with_params()
+        with db.cursor() as cursor:
+            cursor.execute(PRICE_HISTOGRAM_SQL.format(filtered=sql), (*params, buckets, buckets))
+            rows = cursor.fetchall()
+        counts = {row[0]: row[1] for row in rows}
+        low, high = (rows[0][2], rows[0][3]) if rows else (None, None)
+    else:
+        counts, low, high = _bucket_counts_in_python(
+            prices.values_list('price', flat=True), buckets
+        )
+
+    if low is None:
+        return {'min': None, 'max': None, 'buckets': []}
+    if low == high:
+        buckets = 1
+
+    width = (high - low) / buckets
+    cent = Decimal('0.01')
+    return {
+        'min': low,
+        'max': high,
+        'buckets': [
+            {
+                'min': (low + width * index).quantize(cent),
+                'max': (high if index == buckets - 1 else low + width * (index + 1)).quantize(cent),
+                'count': counts.get(index + 1, 0),
+            }
+            for index in range(buckets)
+        ],
+    }
+
+
+def get_hot_catalog_urls(top_products=None):
+    """
+    Build the list of catalog URLs worth pre-caching.
+
+    Includes the category tree, the first list page overall, per master_category and per gender,
+    the detail pages of the best-selling products, and any extra URLs listed
+    in settings.CATALOG_WARM_URLS.
+    """
+    from orders.models import OrderItem
+
+    if top_products is None:
+        top_products = getattr(settings, 'CATALOG_WARM_TOP_PRODUCTS', 50)
+
+    list_url = reverse('product-list')
+    urls = [list_url, reverse('product-categories')]
+
+    for field in ('master_category', 'gender'):
+        values = Product.objects.order_by(field).values_list(field, flat=True).distinct()
+        urls.extend(f"{list_url}?{urlencode({field: value})}" for value in values)
+
+    top_product_ids = (
+        OrderItem.objects.filter(product__isnull=False)
+        .values('product')
+        .annotate(sold=Sum('quantity'))
+        .order_by('-sold')
+        .values_list('product', flat=True)[:top_products]
+    )
+    urls.extend(reverse('product-detail', kwargs={'pk': pk}) for pk in top_product_ids)
+
+    urls.extend(getattr(settings, 'CATALOG_WARM_URLS', []))
+    return list(dict.fromkeys(urls))
+
+
+def _warm_url(url):
+    """Request a single URL anonymously, reading from the primary, and time it."""
+    client = Client(
+        HTTP_HOST=getattr(settings, 'CATALOG_WARM_HOST', 'localhost:8000'),
+        **getattr(settings, 'CATALOG_WARM_HEADERS', {}),
+    )
+    # Warm-ups follow catalog writes: a lagging replica would re-cache pre-write data
+    client.cookies[PIN_COOKIE_NAME] = '1'
+    start = time.perf_counter()
+    try:
+        status_code = client.get(url, secure=getattr(settings, 'CATALOG_WARM_SECURE', False)).status_code
+    except Exception as e:
+        logger.error(f"Cache warm-up failed for {url}: {str(e)}")
+        status_code = None
+    finally:
+        # Each worker thread opens its own connections (primary and replicas)
+        connections.close_all()
+    return {'url': url, 'status': status_code, 'seconds': time.perf_counter() - start}
+
+
+def warm_catalog_cache(urls=None, workers=None):
+    """
+    Replay hot catalog URLs in parallel so the first users hit a warm cache.
+
+    Returns:
+        List of dicts with url, status and seconds, in the order of urls
+    """
+    if urls is None:
+        urls = get_hot_catalog_urls()
+    if workers is None:
+        workers = getattr(settings, 'CATALOG_WARM_WORKERS', 4)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(_warm_url, urls))
+
+    warmed = sum(1 for result in results if result['status'] == 200)
+    logger.info(f"Catalog cache warm-up: {warmed}/{len(results)} URLs cached")
+    return results
+
+
+def _delayed_warmup(delay):
+    try:
+        time.sleep(delay)
+        warm_catalog_cache()
+    finally:
+        connections.close_all()
+
+
+def schedule_catalog_cache_warmup():
+    """
+    Warm the catalog cache in a background thread after an invalidation.
+
+    The warm-up starts CATALOG_WARM_DELAY seconds later; further writes in
+    that window are coalesced into the same run through a cache lock.
+    """
+    if not getattr(settings, 'CATALOG_WARM_ON_INVALIDATION', False):
+        return
+    delay = getattr(settings, 'CATALOG_WARM_DELAY', 5)
+    if not cache.add(WARMUP_LOCK_KEY, True, delay):
+        return
+    threading.Thread(
+        target=_delayed_warmup, args=(delay,), name='catalog-cache-warmup', daemon=True
+    ).start()
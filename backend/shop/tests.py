@@ -1,8 +1,20 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from shop.models import Product
+from shop.services import get_hot_catalog_urls, warm_catalog_cache
+from users.models import CustomUser
 
 
 class ProductModelTestCase(TestCase):
@@ -320,3 +332,340 @@ class ProductFilteringTestCase(TestCase):
         """Test that empty search returns all products"""
         response = self.client.get(self.list_url)
         self.assertEqual(len(response.data), 3)
+
+
+class ProductExportTestCase(TestCase):
+    """Tests for the streaming catalog export endpoint"""
+    
+    def setUp(self):
+        """Set up admin client and products"""
+        self.client = APIClient()
+        self.export_url = reverse('product-export')
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123'
+        )
+        
+        for product_id, name, gender in [(301, "Export Shirt", "Men"), (302, "Export Dress", "Women")]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=name,
+                gender=gender,
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=20.00
+            )
+    
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+    
+    def test_export_requires_admin(self):
+        """Test that anonymous users cannot export the catalog"""
+        response = self.client.get(self.export_url)
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+    
+    def test_export_csv(self):
+        """Test exporting the catalog as CSV"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        
+        rows = list(csv.DictReader(io.StringIO(self._content(response).decode('utf-8'))))
+        self.assertEqual([row['id'] for row in rows], ['301', '302'])
+        self.assertEqual(rows[0]['product_display_name'], "Export Shirt")
+        self.assertEqual(rows[0]['price'], "20.00")
+    
+    def test_export_ndjson_with_filter(self):
+        """Test exporting a filtered catalog as NDJSON"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.export_url, {'export_format': 'ndjson', 'gender': 'Women'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        lines = self._content(response).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['id'], 302)
+    
+    def test_export_gzip(self):
+        """Test that gzip exports decompress to the same CSV"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.export_url, {'gzip': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('products.csv.gz', response['Content-Disposition'])
+        
+        content = gzip.decompress(self._content(response)).decode('utf-8')
+        self.assertEqual(len(content.splitlines()), 3)
+    
+    def test_export_invalid_format(self):
+        """Test that an unknown export format is rejected"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.export_url, {'export_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CATALOG_WARM_HOST='testserver')
+class CatalogCacheWarmupTestCase(TransactionTestCase):
+    """
+    Tests for the catalog cache warm-up.
+    TransactionTestCase so worker threads see the committed products.
+    """
+    
+    def setUp(self):
+        """Set up products in two categories"""
+        for product_id, category, gender in [(401, "Apparel", "Men"), (402, "Footwear", "Women")]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Warm {category}",
+                gender=gender,
+                master_category=category,
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=20.00
+            )
+    
+    def test_hot_urls_cover_categories_and_genders(self):
+        """Test that the first page of every category and gender is listed"""
+        urls = get_hot_catalog_urls()
+        list_url = reverse('product-list')
+        self.assertEqual(urls[0], list_url)
+        for query in ['master_category=Apparel', 'master_category=Footwear', 'gender=Men', 'gender=Women']:
+            self.assertIn(f"{list_url}?{query}", urls)
+        self.assertEqual(len(urls), len(set(urls)))
+    
+    def test_warm_catalog_cache_reports_timings(self):
+        """Test that every URL is requested and timed"""
+        urls = [reverse('product-list'), reverse('product-detail', kwargs={'pk': 401})]
+        results = warm_catalog_cache(urls, workers=2)
+        self.assertEqual([result['url'] for result in results], urls)
+        for result in results:
+            self.assertEqual(result['status'], 200)
+            self.assertGreaterEqual(result['seconds'], 0)
+    
+    @patch('core.db_router.get_replica_aliases', return_value=['replica1'])
+    def test_warm_up_reads_from_primary(self, _aliases):
+        """Test that warm-up requests bypass replicas that may lag behind a write"""
+        results = warm_catalog_cache([reverse('product-list')], workers=1)
+        self.assertEqual(results[0]['status'], 200)
+    
+    def test_warm_catalog_cache_command(self):
+        """Test the management command output"""
+        out = StringIO()
+        call_command('warm_catalog_cache', '--workers', '1', stdout=out)
+        self.assertIn('Warmed 6/6 URLs', out.getvalue())
+
+
+class ProductRangeFilterTestCase(TestCase):
+    """Tests for price/year range filters and the price histogram"""
+    
+    def setUp(self):
+        """Set up products spread over prices and years"""
+        caches['catalog'].clear()
+        self.client = APIClient()
+        self.list_url = reverse('product-list')
+        self.histogram_url = reverse('product-price-histogram')
+        
+        for product_id, price, year, gender in [
+            (501, '10.00', 2019, 'Men'),
+            (502, '20.00', 2020, 'Men'),
+            (503, '45.00', 2021, 'Women'),
+            (504, '90.00', 2022, 'Women'),
+            (505, '110.00', 2023, 'Women'),
+        ]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Range Product {product_id}",
+                gender=gender,
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=year,
+                usage="Casual",
+                price=price
+            )
+    
+    def _ids(self, response):
+        return sorted(product['id'] for product in response.data['results'])
+    
+    def test_filter_by_price_range(self):
+        """Test that price bounds are inclusive"""
+        response = self.client.get(self.list_url, {'price_min': '20', 'price_max': '90'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._ids(response), [502, 503, 504])
+    
+    def test_filter_by_year_range(self):
+        """Test filtering by year range combined with another filter"""
+        response = self.client.get(self.list_url, {'year_min': '2021', 'gender': 'Women'})
+        self.assertEqual(self._ids(response), [503, 504, 505])
+        
+        response = self.client.get(self.list_url, {'year_max': '2020'})
+        self.assertEqual(self._ids(response), [501, 502])
+    
+    def test_invalid_range_value(self):
+        """Test that a non-numeric bound is rejected"""
+        response = self.client.get(self.list_url, {'price_min': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_price_histogram(self):
+        """Test bucket counts over the full price range"""
+        response = self.client.get(self.histogram_url, {'buckets': '4'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(response.data['min']), Decimal('10.00'))
+        self.assertEqual(Decimal(response.data['max']), Decimal('110.00'))
+        
+        buckets = response.data['buckets']
+        self.assertEqual([bucket['count'] for bucket in buckets], [2, 1, 0, 2])
+        self.assertEqual(Decimal(buckets[1]['min']), Decimal('35.00'))
+        self.assertEqual(Decimal(buckets[-1]['max']), Decimal('110.00'))
+    
+    def test_price_histogram_ignores_price_range(self):
+        """Test that the histogram follows filters but not the price slider itself"""
+        response = self.client.get(self.histogram_url, {
+            'buckets': '2', 'gender': 'Women', 'price_min': '100'
+        })
+        self.assertEqual(Decimal(response.data['min']), Decimal('45.00'))
+        self.assertEqual(sum(bucket['count'] for bucket in response.data['buckets']), 3)
+    
+    def test_price_histogram_single_query(self):
+        """Test that the histogram is computed in one query whatever the bucket count"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.histogram_url, {'buckets': '50'})
+        self.assertEqual(len(response.data['buckets']), 50)
+    
+    def test_price_histogram_empty_and_invalid(self):
+        """Test empty results and invalid bucket counts"""
+        response = self.client.get(self.histogram_url, {'gender': 'Unisex'})
+        self.assertEqual(response.data['buckets'], [])
+        
+        for value in ['0', '1000', 'many']:
+            response = self.client.get(self.histogram_url, {'buckets': value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CategoryTreeTestCase(TestCase):
+    """Tests for the category navigation tree endpoint"""
+    
+    def setUp(self):
+        """Set up products in a small category hierarchy"""
+        caches['catalog'].clear()
+        self.client = APIClient()
+        self.url = reverse('product-categories')
+        
+        for product_id, master, sub, article_type in [
+            (601, "Apparel", "Topwear", "Tshirts"),
+            (602, "Apparel", "Topwear", "Tshirts"),
+            (603, "Apparel", "Topwear", "Shirts"),
+            (604, "Apparel", "Bottomwear", "Jeans"),
+            (605, "Footwear", "Shoes", "Sports Shoes"),
+        ]:
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Tree Product {product_id}",
+                gender="Men",
+                master_category=master,
+                sub_category=sub,
+                article_type=article_type,
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=25.00
+            )
+    
+    def test_category_tree(self):
+        """Test the hierarchy and counts at every level"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        
+        apparel, footwear = response.data['categories']
+        self.assertEqual((apparel['name'], apparel['count']), ("Apparel", 4))
+        self.assertEqual((footwear['name'], footwear['count']), ("Footwear", 1))
+        
+        bottomwear, topwear = apparel['sub_categories']
+        self.assertEqual((bottomwear['name'], bottomwear['count']), ("Bottomwear", 1))
+        self.assertEqual(topwear['count'], 3)
+        self.assertEqual(
+            topwear['article_types'],
+            [{'name': "Shirts", 'count': 1}, {'name': "Tshirts", 'count': 2}]
+        )
+    
+    def test_category_tree_single_query_and_cached(self):
+        """Test that the tree takes one query and is then served from cache"""
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+    
+    def test_category_tree_invalidated_on_write(self):
+        """Test that catalog writes invalidate the cached tree"""
+        admin = CustomUser.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123'
+        )
+        self.client.get(self.url)
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.delete(reverse('product-detail', kwargs={'pk': 605}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([node['name'] for node in response.data['categories']], ["Apparel"])
+
+
+class ProductBatchTestCase(TestCase):
+    """Tests for the batch product lookup endpoint"""
+    
+    def setUp(self):
+        """Set up a few products"""
+        self.client = APIClient()
+        self.url = reverse('product-batch')
+        
+        for product_id in (701, 702, 703):
+            Product.objects.create(
+                id=product_id,
+                product_display_name=f"Batch Product {product_id}",
+                gender="Men",
+                master_category="Apparel",
+                sub_category="Topwear",
+                article_type="Shirts",
+                base_colour="Blue",
+                season="Summer",
+                year=2024,
+                usage="Casual",
+                price=15.00
+            )
+    
+    def test_batch_lookup(self):
+        """Test that products come back in request order with missing IDs listed"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'ids': '703,999,701,703'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['id'] for product in response.data['results']], [703, 701])
+        self.assertEqual(response.data['missing'], [999])
+    
+    def test_batch_invalid_ids(self):
+        """Test that missing or non-integer IDs are rejected"""
+        for params in [{}, {'ids': ''}, {'ids': '1,abc'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @override_settings(PRODUCT_BATCH_MAX_IDS=2)
+    def test_batch_size_capped(self):
+        """Test that too many IDs are rejected"""
+        response = self.client.get(self.url, {'ids': '701,702,703'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,27 +1,43 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
 from django.core.cache import cache
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_headers
+from django.db import transaction
+from core.caching import cached_view, get_view_cache
+from core.db_router import ReplicaReadMixin
+from core.exports import get_chunk_size, parse_bool, streaming_export_response
+from .filters import ProductFilter
 from .models import Product
 from .serializers import ProductSerializer
+from .services import (
+    DEFAULT_HISTOGRAM_BUCKETS,
+    MAX_HISTOGRAM_BUCKETS,
+    build_category_tree,
+    price_histogram,
+    schedule_catalog_cache_warmup,
+)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows products to be viewed or edited.
     Implements caching for list and retrieve operations.
     Cache is invalidated on create, update, and delete operations.
+    List and retrieve read from a replica when one is configured.
     """
     queryset = Product.objects.all().order_by('-created_at')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    replica_actions = ('list', 'retrieve', 'batch', 'categories', 'price_histogram')
     
     # Enable filtering and search
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['gender', 'master_category', 'sub_category', 'season', 'usage']
+    filterset_class = ProductFilter
     search_fields = ['product_display_name', 'article_type', 'base_colour']
     ordering_fields = ['price', 'created_at', 'year']
+    # Extra query params that change cached responses (see core.caching)
+    cache_query_params = ('buckets',)
     
     def get_queryset(self):
         """
@@ -36,6 +52,10 @@ class ProductViewSet(viewsets.ModelViewSet):
             self.request.query_params.get('sub_category'),
             self.request.query_params.get('season'),
             self.request.query_params.get('usage'),
+            self.request.query_params.get('price_min'),
+            self.request.query_params.get('price_max'),
+            self.request.query_params.get('year_min'),
+            self.request.query_params.get('year_max'),
             self.request.query_params.get('search'),
             self.request.query_params.get('ordering'),
         ])
@@ -46,22 +66,126 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
     
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
-    @method_decorator(vary_on_headers('Authorization'))
+    @cached_view('product-list', timeout=60 * 15, public=True)
     def list(self, request, *args, **kwargs):
         """
-        List all products with caching.
-        Cache varies based on query parameters and authorization.
+        List all products with caching (15 minutes, stampede-protected).
+        The catalog is public: one cache entry per normalized set of
+        filter/search/ordering/page params is shared by every user.
         """
         return super().list(request, *args, **kwargs)
     
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @cached_view('product-detail', timeout=60 * 15, public=True)
     def retrieve(self, request, *args, **kwargs):
         """
-        Retrieve a single product with caching.
+        Retrieve a single product with caching (15 minutes, stampede-protected).
         """
         return super().retrieve(request, *args, **kwargs)
     
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Fetch several products in one request (cart hydration).
+
+        Query params:
+            ids: comma-separated product IDs, at most PRODUCT_BATCH_MAX_IDS
+
+        Products are returned in the requested order; unknown IDs are
+        listed in 'missing'.
+        """
+        raw_ids = [value.strip() for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        if not raw_ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = list(dict.fromkeys(int(value) for value in raw_ids))
+        except ValueError:
+            return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_ids = getattr(settings, 'PRODUCT_BATCH_MAX_IDS', 100)
+        if len(ids) > max_ids:
+            return Response(
+                {'error': f'At most {max_ids} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = Product.objects.in_bulk(ids)
+        serializer = self.get_serializer([products[pk] for pk in ids if pk in products], many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in products],
+        })
+    
+    @action(detail=False, methods=['get'])
+    @cached_view('product-categories', timeout=60 * 60, public=True)
+    def categories(self, request):
+        """
+        Category navigation tree (master_category -> sub_category ->
+        article_type) with product counts, from a single ROLLUP query.
+        Cached for an hour and invalidated by catalog writes.
+        """
+        return Response(build_category_tree())
+    
+    @action(detail=False, methods=['get'])
+    @cached_view('product-histogram', timeout=60 * 15, public=True)
+    def price_histogram(self, request):
+        """
+        Price distribution of the products matching the current filters,
+        for the price slider. The price_min/price_max filters are ignored so
+        the slider always shows the full range.
+
+        Query params:
+            buckets: number of equal-width buckets (default 20, max 100)
+            Any list filter (gender, master_category, year_min, search, ...).
+        """
+        try:
+            buckets = int(request.query_params.get('buckets', DEFAULT_HISTOGRAM_BUCKETS))
+        except ValueError:
+            return Response({'error': 'buckets must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= buckets <= MAX_HISTOGRAM_BUCKETS:
+            return Response(
+                {'error': f'buckets must be between 1 and {MAX_HISTOGRAM_BUCKETS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        query_params = request.query_params.copy()
+        for param in ProductFilter.PRICE_RANGE_PARAMS:
+            query_params.pop(param, None)
+        filterset = ProductFilter(query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filters.SearchFilter().filter_queryset(request, filterset.qs, self)
+
+        return Response(price_histogram(queryset, buckets))
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """
+        Stream the whole catalog as CSV or NDJSON (admin only).
+        Rows are read through a server-side cursor so memory stays constant.
+
+        Query params:
+            export_format: 'csv' (default) or 'ndjson'
+            gzip: 'true' to receive a gzip-compressed file
+            Any list filter (gender, master_category, search, ...) narrows the export.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        compress = parse_bool(request.query_params.get('gzip', 'false'))
+        fields = [field.attname for field in Product._meta.concrete_fields]
+
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .order_by('id')
+            .values(*fields)
+            .iterator(chunk_size=get_chunk_size())
+        )
+
+        try:
+            return streaming_export_response(
+                rows, fields, 'products', export_format=export_format, compress=compress
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     def perform_create(self, serializer):
         """Clear cache when creating a new product."""
         super().perform_create(serializer)
@@ -78,6 +202,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         self._clear_product_cache()
     
     def _clear_product_cache(self):
-        """Helper method to clear all product-related caches."""
-        cache.delete_pattern('*product*')
-        cache.delete_pattern('*shop*')
\ No newline at end of file
+        """Helper method to clear all product-related caches and re-warm hot pages."""
+        # Also drops the per-worker copies of the two-tier catalog cache
+        get_view_cache().delete_pattern('view_cache:product-*')
+        cache.delete_pattern('*shop*')
+        transaction.on_commit(schedule_catalog_cache_warmup)
\ No newline at end of file
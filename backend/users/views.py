@@ -6,6 +6,7 @@ from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
+from orders import cart
 from users.models import CustomUser, UserProfile
 from users.serializers import (
     UserSerializer,
@@ -15,6 +16,9 @@ from users.serializers import (
     ChangePasswordSerializer,
     UpdateProfileSerializer,
 )
+import logging
+
+logger = logging.getLogger('users')
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -56,6 +60,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             token, created = Token.objects.get_or_create(user=user)
+            self._merge_anonymous_cart(request, user)
             return Response({
                 'user': UserSerializer(user).data,
                 'token': token.key,
@@ -63,6 +68,19 @@ class UserViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _merge_anonymous_cart(self, request, user):
+        """Move the anonymous cart (cart_id or X-Cart-Id header) into the user's cart."""
+        cart_id = request.data.get('cart_id') or request.headers.get(cart.CART_ID_HEADER)
+        if not cart.is_valid_cart_id(cart_id):
+            return
+        try:
+            merged = cart.merge_carts(cart.anonymous_cart_key(cart_id), cart.user_cart_key(user.id))
+            if merged:
+                logger.info(f"Merged {merged} anonymous cart lines into cart of user {user.id}")
+        except Exception as e:
+            # A cart problem must never block logging in
+            logger.error(f"Cart merge failed for user {user.id}: {str(e)}")
+
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def logout(self, request):
         """Logout user by deleting their authentication token"""
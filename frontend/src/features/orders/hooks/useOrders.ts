@@ -1,4 +1,4 @@
-import { useMutation, useQuery, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQuery, useQueryClient } from '@tanstack/react-query';
 import { orderService } from '../services/orderService';
 import type { CreateOrderRequest } from '../types/order.types';
 
@@ -14,9 +14,11 @@ export const useCreateOrder = () => {
 };
 
 export const useMyOrders = () => {
-  return useQuery({
+  return useInfiniteQuery({
     queryKey: ['orders', 'my'],
-    queryFn: () => orderService.getMyOrders(),
+    queryFn: ({ pageParam }) => orderService.getMyOrders(pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
   });
 };
 
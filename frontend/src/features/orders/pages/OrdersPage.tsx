@@ -30,21 +30,10 @@ const statusColors = {
 };
 
 export default function OrdersPage() {
-  const { data: orders, isLoading, error } = useMyOrders();
+  const { data, isLoading, error, fetchNextPage, hasNextPage, isFetchingNextPage } = useMyOrders();
 
-  // Sort orders: paid first, then by date (most recent first)
-  const sortedOrders = useMemo(() => {
-    if (!orders) return [];
-    
-    return [...orders].sort((a, b) => {
-      // First by payment status (paid before pending)
-      if (a.payment_status === 'paid' && b.payment_status !== 'paid') return -1;
-      if (a.payment_status !== 'paid' && b.payment_status === 'paid') return 1;
-      
-      // Then by date (most recent first)
-      return new Date(b.created_at).getTime() - new Date(a.created_at).getTime();
-    });
-  }, [orders]);
+  // Pages arrive newest first from the API; keep that order while loading more
+  const orders = useMemo(() => data?.pages.flatMap((page) => page.orders) ?? [], [data]);
 
   if (isLoading) {
     return (
@@ -68,7 +57,7 @@ export default function OrdersPage() {
     );
   }
 
-  if (!orders || orders.length === 0) {
+  if (orders.length === 0) {
     return (
       <div className="container mx-auto px-4 py-16">
         <div className="max-w-md mx-auto text-center">
@@ -94,7 +83,7 @@ export default function OrdersPage() {
         <h1 className="text-3xl font-bold mb-8">Mes Commandes</h1>
 
         <div className="space-y-4">
-          {sortedOrders.map((order) => (
+          {orders.map((order) => (
             <Link key={order.id} to={`/orders/${order.id}`}>
               <Card 
                 className="hover:shadow-lg transition-shadow border-l-4" 
@@ -120,36 +109,10 @@ export default function OrdersPage() {
                         {formatDate(order.created_at)}
                       </p>
                       
-                      {/* Product Preview */}
-                      {order.items && order.items.length > 0 && (
-                        <div className="flex items-center gap-2 flex-wrap">
-                          {order.items.slice(0, 3).map((item) => (
-                            <div key={item.id} className="relative">
-                              <div className="w-12 h-12 bg-gray-100 rounded overflow-hidden">
-                                {item.product_image ? (
-                                  <img 
-                                    src={item.product_image} 
-                                    alt={item.product_name || 'Produit'}
-                                    className="w-full h-full object-cover"
-                                  />
-                                ) : (
-                                  <Package className="w-full h-full p-2 text-gray-400" />
-                                )}
-                              </div>
-                              {item.quantity > 1 && (
-                                <span className="absolute -top-1 -right-1 bg-primary-600 text-white text-xs rounded-full w-4 h-4 flex items-center justify-center text-[10px]">
-                                  {item.quantity}
-                                </span>
-                              )}
-                            </div>
-                          ))}
-                          {order.items.length > 3 && (
-                            <div className="w-12 h-12 bg-gray-100 rounded flex items-center justify-center text-gray-600 text-xs font-medium">
-                              +{order.items.length - 3}
-                            </div>
-                          )}
-                        </div>
-                      )}
+                      <p className="text-sm text-gray-600 flex items-center gap-2">
+                        <Package className="h-4 w-4 text-gray-400" />
+                        {order.item_count} {order.item_count > 1 ? 'articles' : 'article'}
+                      </p>
                     </div>
                     
                     {/* Middle: Status */}
@@ -178,6 +141,19 @@ export default function OrdersPage() {
             </Link>
           ))}
         </div>
+
+        {hasNextPage && (
+          <div className="mt-8 text-center">
+            <button
+              type="button"
+              onClick={() => fetchNextPage()}
+              disabled={isFetchingNextPage}
+              className="px-6 py-3 border border-gray-300 rounded-lg text-gray-700 hover:bg-gray-50 disabled:opacity-50"
+            >
+              {isFetchingNextPage ? 'Chargement...' : 'Voir plus de commandes'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,5 +1,15 @@
 import api from '../../../lib/api';
-import type { Order, CreateOrderRequest } from '../types/order.types';
+import type {
+  Order,
+  CreateOrderRequest,
+  CursorPage,
+  OrderSummary,
+  MyOrdersPage,
+} from '../types/order.types';
+
+// The API returns the next page as a full URL; only its cursor is kept
+const getCursor = (url: string | null): string | null =>
+  url ? new URL(url).searchParams.get('cursor') : null;
 
 export const orderService = {
   createOrder: async (data: CreateOrderRequest): Promise<Order> => {
@@ -7,9 +17,14 @@ export const orderService = {
     return response.data;
   },
 
-  getMyOrders: async (): Promise<Order[]> => {
-    const response = await api.get<Order[]>('/api/orders/orders/my_orders/');
-    return response.data;
+  getMyOrders: async (cursor: string | null = null): Promise<MyOrdersPage> => {
+    const response = await api.get<CursorPage<OrderSummary>>('/api/orders/orders/my_orders/', {
+      params: cursor ? { cursor } : undefined,
+    });
+    return {
+      orders: response.data.results,
+      nextCursor: getCursor(response.data.next),
+    };
   },
 
   getOrder: async (orderId: number): Promise<Order> => {
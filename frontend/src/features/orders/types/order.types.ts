@@ -28,6 +28,30 @@ export interface Order {
   delivered_at?: string;
 }
 
+// Row of the order lists (my_orders): counts instead of nested items
+export interface OrderSummary {
+  id: number;
+  order_number: string;
+  user_username: string;
+  status: Order['status'];
+  payment_status: Order['payment_status'];
+  final_amount: string;
+  item_count: number;
+  created_at: string;
+}
+
+// Cursor-paginated list response
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface MyOrdersPage {
+  orders: OrderSummary[];
+  nextCursor: string | null;
+}
+
 export interface CreateOrderRequest {
   items: {
     product_id: number;